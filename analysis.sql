@@ -0,0 +1,264 @@
+-- Analiz fonksiyonları (Analiz sekmesinin özetleri veritabanında hesaplanır)
+-- supabase.sql (veya recreate_table.sql) sonrasında Supabase SQL Editor'de çalıştırın.
+-- Tekrar çalıştırmak güvenlidir. Düz bir PostgreSQL üzerinde de çalışır (yerel test için).
+--
+-- Kurallar uygulamadaki hesap motoruyla aynıdır (app.py: parse_euro_series, to_cents,
+-- apply_rate, price_catalog): tutarlar tam sayı sent, yüzdeler baz puan, yarımlar
+-- sıfırdan uzağa yuvarlanır; optimal rota eşitlikte kayıt sırasında önce gelendir.
+
+-- Metin euro değeri → numeric ("€1.234,56", "1,234.56", "12,5" ...); ayrıştırılamazsa 0
+create or replace function public.parse_euro(t text)
+returns numeric language sql immutable parallel safe as $$
+  select case when s ~ '^-?([0-9]+\.?[0-9]*|\.[0-9]+)$' then s::numeric else 0 end
+  from (
+    select regexp_replace(
+      -- Son görülen ayırıcı virgülse ondalıktır (yalnız virgül durumu dahil)
+      case when strpos(reverse(c), ',') > 0
+                and (strpos(reverse(c), '.') = 0 or strpos(reverse(c), ',') < strpos(reverse(c), '.'))
+           then replace(replace(c, '.', ''), ',', '.')
+           else replace(c, ',', '') end,
+      '[^0-9.-]', '', 'g') as s
+    from (select replace(replace(replace(coalesce(t, ''), '€', ''), '"', ''), ' ', '') as c) temiz
+  ) ayrik
+$$;
+
+-- Sent tutarına baz puan oranı uygular (app.py: apply_rate)
+create or replace function public.apply_rate_cents(cents bigint, bp bigint)
+returns bigint language sql immutable parallel safe as $$
+  select sign(cents) * sign(bp) * ((abs(cents) * abs(bp) + 5000) / 10000)
+$$;
+
+-- Sayısal (sent) kolonlar: metin kolonlardan türetilir, istemci yazmaz ve okumaz.
+alter table public.products
+  add column if not exists fiyat_cents bigint
+    generated always as (round(public.parse_euro(fiyat) * 100)::bigint) stored,
+  add column if not exists ham_maliyet_euro_cents bigint
+    generated always as (round(public.parse_euro(ham_maliyet_euro) * 100)::bigint) stored,
+  add column if not exists tr_ne_navlun_cents bigint
+    generated always as (round(public.parse_euro(tr_ne_navlun) * 100)::bigint) stored,
+  add column if not exists ne_de_navlun_cents bigint
+    generated always as (round(public.parse_euro(ne_de_navlun) * 100)::bigint) stored,
+  add column if not exists express_kargo_cents bigint
+    generated always as (round(public.parse_euro(express_kargo) * 100)::bigint) stored,
+  add column if not exists ddp_cents bigint
+    generated always as (round(public.parse_euro(ddp) * 100)::bigint) stored;
+
+-- Rota kaydı → navlun kolonu katsayıları (rota sırasıyla diziler).
+-- p_routes: uygulamadaki rota kaydı, örn. [{"label": "TR→NL→DE", "navlun": ["tr_ne_navlun", "ne_de_navlun"]}, ...]
+-- Navlun kolonları yukarıdaki sent kolonlarından biri olmalıdır (tr_ne_navlun, ne_de_navlun,
+-- express_kargo, ddp); yeni bir navlun kolonu eklenirse buraya da eklenir.
+create or replace function public.route_weights(p_routes jsonb)
+returns table (label text[], w_tr_ne bigint[], w_ne_de bigint[], w_express bigint[], w_ddp bigint[])
+language sql immutable as $$
+  select array_agg(r.rota ->> 'label' order by r.sira),
+         array_agg(w.tr_ne order by r.sira),
+         array_agg(w.ne_de order by r.sira),
+         array_agg(w.express order by r.sira),
+         array_agg(w.ddp order by r.sira)
+  from jsonb_array_elements(p_routes) with ordinality as r(rota, sira)
+  cross join lateral (
+    select count(*) filter (where k = 'tr_ne_navlun') as tr_ne,
+           count(*) filter (where k = 'ne_de_navlun') as ne_de,
+           count(*) filter (where k = 'express_kargo') as express,
+           count(*) filter (where k = 'ddp') as ddp
+    from jsonb_array_elements_text(r.rota -> 'navlun') as k
+  ) w
+$$;
+
+-- Tek ürün için optimal rota maliyeti ve kâr (app.py: price_catalog). Satır bazındadır;
+-- tüm tablo (product_margins) ve sayfalı liste (product_page) aynı hesabı kullanır.
+create or replace function public.product_margin(
+  p public.products, label text[], w_tr_ne bigint[], w_ne_de bigint[], w_express bigint[], w_ddp bigint[],
+  reklam bigint, komisyon_bp bigint, vergi_bp bigint
+)
+returns table (optimal_route text, optimal_cost_cents bigint, cost_difference_cents bigint,
+               kar_cents bigint, kar_yuzde double precision)
+language sql immutable as $$
+  select s.label, m.maliyet, s.fark, p.fiyat_cents - m.maliyet,
+         case when p.fiyat_cents > 0 then (p.fiyat_cents - m.maliyet)::float8 / p.fiyat_cents * 100 else 0 end
+  from (
+    -- Vergi, kesinti ve reklam tüm rotalarda aynı: seçim temel maliyete göre yapılır
+    select (array_agg(q.label order by q.temel, q.i))[1] as label,
+           min(q.temel) as temel1,
+           coalesce((array_agg(q.temel order by q.temel, q.i))[2] - min(q.temel), 0) as fark
+    from (
+      select i, label[i] as label,
+             p.ham_maliyet_euro_cents
+             + w_tr_ne[i] * p.tr_ne_navlun_cents + w_ne_de[i] * p.ne_de_navlun_cents
+             + w_express[i] * p.express_kargo_cents + w_ddp[i] * p.ddp_cents as temel
+      from generate_subscripts(label, 1) as i
+    ) q
+  ) s
+  cross join lateral (
+    select s.temel1 + reklam
+           + public.apply_rate_cents(p.fiyat_cents, vergi_bp)
+           + public.apply_rate_cents(p.fiyat_cents, komisyon_bp) as maliyet
+  ) m
+$$;
+
+-- Tüm ürünler için product_margin (analiz özetleri bunun üzerinden hesaplanır)
+create or replace function public.product_margins(
+  p_reklam numeric, p_komisyon numeric, p_vergi numeric, p_routes jsonb
+)
+returns table (
+  id uuid, title text, ean text, satis_cents bigint, optimal_route text,
+  optimal_cost_cents bigint, cost_difference_cents bigint, kar_cents bigint, kar_yuzde double precision
+)
+language sql stable as $$
+  select p.id, p.title, p.ean, p.fiyat_cents, m.*
+  from public.route_weights(p_routes) r
+  cross join public.products p
+  cross join lateral public.product_margin(
+    p, r.label, r.w_tr_ne, r.w_ne_de, r.w_express, r.w_ddp,
+    round(p_reklam * 100)::bigint, round(p_komisyon * 100)::bigint, round(p_vergi * 100)::bigint
+  ) m
+$$;
+
+-- Analiz sekmesi özeti: istemciye yalnızca bu JSON aktarılır.
+create or replace function public.analysis_summary(
+  p_reklam numeric, p_komisyon numeric, p_vergi numeric, p_routes jsonb, p_top int default 10
+)
+returns jsonb language sql stable as $$
+  with m as materialized (
+    select p.id, p.title, m.*
+    from public.route_weights(p_routes) r
+    cross join public.products p
+    cross join lateral public.product_margin(
+      p, r.label, r.w_tr_ne, r.w_ne_de, r.w_express, r.w_ddp,
+      round(p_reklam * 100)::bigint, round(p_komisyon * 100)::bigint, round(p_vergi * 100)::bigint
+    ) m
+  ), ozet as (
+    select count(*) as n,
+           coalesce(sum(kar_cents), 0) as kar,
+           count(*) filter (where kar_cents > 0) as karli,
+           count(*) filter (where kar_cents < 0) as zararli,
+           avg(kar_yuzde) as ortalama,
+           jsonb_build_object(
+             'cok_yuksek', count(*) filter (where kar_yuzde > 40),
+             'yuksek', count(*) filter (where kar_yuzde >= 30 and kar_yuzde <= 40),
+             'orta', count(*) filter (where kar_yuzde >= 20 and kar_yuzde < 30),
+             'dusuk', count(*) filter (where kar_yuzde >= 10 and kar_yuzde < 20),
+             'cok_dusuk', count(*) filter (where kar_yuzde >= 0 and kar_yuzde < 10),
+             'zararli', count(*) filter (where kar_yuzde < 0)) as dagilim
+    from m
+  ), rota_ozet as (
+    select optimal_route, sum(cost_difference_cents) as tasarruf, count(*) as adet
+    from m group by optimal_route
+  )
+  select jsonb_build_object(
+    'toplam', o.n,
+    'karli', o.karli,
+    'zararli', o.zararli,
+    'ortalama_kar_yuzde', o.ortalama,
+    'dagilim', o.dagilim,
+    'en_karli', (select coalesce(jsonb_agg(jsonb_build_object('title', title, 'kar_cents', kar_cents, 'kar_yuzde', kar_yuzde)
+                                           order by kar_cents desc, id), '[]'::jsonb)
+                 from (select * from m order by kar_cents desc, id limit p_top) ust),
+    'en_zararli', (select coalesce(jsonb_agg(jsonb_build_object('title', title, 'kar_cents', kar_cents, 'kar_yuzde', kar_yuzde)
+                                             order by kar_cents, id), '[]'::jsonb)
+                   from (select * from m order by kar_cents, id limit p_top) alt),
+    'toplam_kar_cents', o.kar,
+    'pareto_adet', greatest(1, floor(o.n * 0.2))::bigint,
+    'pareto_kar_cents', (select coalesce(sum(kar_cents), 0)
+                         from (select kar_cents from m order by kar_cents desc
+                               limit greatest(1, floor(o.n * 0.2))::bigint) p),
+    'rotalar', (select jsonb_agg(jsonb_build_object(
+                    'rota', r.rota ->> 'label',
+                    'tasarruf_cents', coalesce(ro.tasarruf, 0),
+                    'adet', coalesce(ro.adet, 0))
+                  order by r.sira)
+                from jsonb_array_elements(p_routes) with ordinality as r(rota, sira)
+                left join rota_ozet ro on ro.optimal_route = r.rota ->> 'label')
+  )
+  from ozet o
+$$;
+
+-- Ürün listesi filtresi (Ürün Listesi ve Fiyat Hesaplama sekmeleri; app.py: product_filter_mask
+-- ile aynı kurallar). p_arama başlıkta ya da EAN'da büyük/küçük harf duyarsız düz metin arar.
+-- p_kar_durumu: null | 'pozitif' | 'negatif' | 'sifira_yakin' (kâr % ±5 içinde).
+-- Kâr % karşılaştırmaları listede gösterilen 2 ondalıklı değer üzerindendir (float8
+-- round = rint; numpy ile aynı). null verilen filtreler uygulanmaz.
+create or replace function public.product_list_rows(
+  p_reklam numeric, p_komisyon numeric, p_vergi numeric, p_routes jsonb,
+  p_arama text default null, p_kar_durumu text default null,
+  p_fiyat_min numeric default null, p_fiyat_max numeric default null,
+  p_yuzde_min numeric default null, p_yuzde_max numeric default null,
+  p_rotalar text[] default null,
+  p_after_title text default null, p_after_id uuid default null
+)
+returns table (p public.products, satis_cents bigint, kar_cents bigint, kar_yuzde double precision)
+language sql stable as $$
+  select p, p.fiyat_cents, m.kar_cents, m.kar_yuzde
+  from public.route_weights(p_routes) r
+  cross join public.products p
+  cross join lateral public.product_margin(
+    p, r.label, r.w_tr_ne, r.w_ne_de, r.w_express, r.w_ddp,
+    round(p_reklam * 100)::bigint, round(p_komisyon * 100)::bigint, round(p_vergi * 100)::bigint
+  ) m
+  cross join (select '%' || replace(replace(replace(p_arama, '\', '\\'), '%', '\%'), '_', '\_') || '%' as desen) a
+  where (p_arama is null or p.title ilike a.desen or p.ean ilike a.desen)
+    and (p_after_title is null
+         or (coalesce(p.title, '') >= p_after_title and (coalesce(p.title, ''), p.id) > (p_after_title, p_after_id)))
+    and (p_fiyat_min is null or p.fiyat_cents >= p_fiyat_min * 100)
+    and (p_fiyat_max is null or p.fiyat_cents <= p_fiyat_max * 100)
+    and (p_yuzde_min is null or round(m.kar_yuzde * 100) / 100 >= p_yuzde_min)
+    and (p_yuzde_max is null or round(m.kar_yuzde * 100) / 100 <= p_yuzde_max)
+    and (p_rotalar is null or m.optimal_route = any(p_rotalar))
+    and (p_kar_durumu is null
+         or (p_kar_durumu = 'pozitif' and m.kar_cents > 0)
+         or (p_kar_durumu = 'negatif' and m.kar_cents < 0)
+         or (p_kar_durumu = 'sifira_yakin' and abs(round(m.kar_yuzde * 100) / 100) <= 5))
+$$;
+
+-- Ürün listesi sırası: başlıksız (NULL) ürünler boş başlık sayılır (app.py: _title_order ile
+-- aynı); böylece sayfalar product_list_stats'ın saydığı tüm ürünleri içerir.
+create index if not exists products_title_sort_idx on public.products ((coalesce(title, '')), id);
+
+-- Filtrelenmiş ürün listesinin bir sayfası: (coalesce(title, ''), id) üzerinde keyset sayfalama.
+-- products_title_sort_idx sırasıyla yürünür; yalnızca sayfa dolana kadar okunan satırlar
+-- fiyatlanır. Bir sonraki sayfa için son satırın (title, id) değerleri verilir (NULL başlık: '').
+create or replace function public.product_page(
+  p_reklam numeric, p_komisyon numeric, p_vergi numeric, p_routes jsonb,
+  p_arama text default null, p_kar_durumu text default null,
+  p_fiyat_min numeric default null, p_fiyat_max numeric default null,
+  p_yuzde_min numeric default null, p_yuzde_max numeric default null,
+  p_rotalar text[] default null,
+  p_after_title text default null, p_after_id uuid default null, p_limit int default 100
+)
+returns setof public.products
+language sql stable as $$
+  select (l.p).*
+  from public.product_list_rows(
+    p_reklam, p_komisyon, p_vergi, p_routes, p_arama, p_kar_durumu,
+    p_fiyat_min, p_fiyat_max, p_yuzde_min, p_yuzde_max, p_rotalar, p_after_title, p_after_id
+  ) l
+  order by coalesce((l.p).title, ''), (l.p).id
+  limit p_limit
+$$;
+
+-- Filtrelenmiş listenin özeti (ürün sayısı, ortalamalar, fiyat / kâr % sınırları).
+-- Filtresiz çağrı tüm kataloğun sınırlarını verir (filtre sürgüleri için).
+create or replace function public.product_list_stats(
+  p_reklam numeric, p_komisyon numeric, p_vergi numeric, p_routes jsonb,
+  p_arama text default null, p_kar_durumu text default null,
+  p_fiyat_min numeric default null, p_fiyat_max numeric default null,
+  p_yuzde_min numeric default null, p_yuzde_max numeric default null,
+  p_rotalar text[] default null
+)
+returns jsonb language sql stable as $$
+  select jsonb_build_object(
+    'adet', count(*),
+    'karli', count(*) filter (where kar_cents > 0),
+    'ort_fiyat', avg(satis_cents) / 100,
+    'ort_kar', avg(kar_cents) / 100,
+    'ort_yuzde', avg(round(kar_yuzde * 100) / 100),
+    'fiyat_min', min(satis_cents) / 100.0,
+    'fiyat_max', max(satis_cents) / 100.0,
+    'yuzde_min', min(round(kar_yuzde * 100) / 100),
+    'yuzde_max', max(round(kar_yuzde * 100) / 100)
+  )
+  from public.product_list_rows(
+    p_reklam, p_komisyon, p_vergi, p_routes, p_arama, p_kar_durumu,
+    p_fiyat_min, p_fiyat_max, p_yuzde_min, p_yuzde_max, p_rotalar
+  )
+$$;
@@ -1,13 +1,41 @@
 import streamlit as st
+import altair as alt
 import pandas as pd
+import numpy as np
 import json
 import os
 from datetime import datetime
 import io
 # requests kaldırıldı (kur fonksiyonu iptal edildi)
 import re
+import bisect
+import sqlite3
+import threading
+import queue
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from abc import ABC, abstractmethod
 from pathlib import Path
 from supabase import create_client, Client
+from bulk_loader import postgrest_in
+try:
+    import httpx
+    from supabase import ClientOptions
+except ImportError:  # eski supabase sürümleri
+    httpx = None
+    ClientOptions = None
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+except ImportError:  # yerel anlık görüntü katmanı, Parquet biçimi ve Arrow CSV okuyucu devre dışı
+    pa = None
+    pc = None
+    pacsv = None
+    pq = None
 
 # Sayfa yapılandırması
 st.set_page_config(
@@ -17,12 +45,26 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# JSON veritabanı dosya yolu
+# Ürün değişiklik günlüğü (JSONL, yalnızca ekleme; denetim için yeniden oynatılabilir).
+# Eski JSON yan deposu (JSON_FILE) varsa günlük ilk kez oluşturulurken içeri aktarılır.
+CHANGE_LOG_FILE = "product_changes.jsonl"
+CHANGE_LOG_COMPACT_BYTES = 5_000_000  # bu boyutu aşan günlük her ürünün son haline sıkıştırılır
 JSON_FILE = "kaufland_products.json"
+JSON_EXPORT_CHUNK = 5000  # JSON dışa aktarımında tek seferde kodlanan satır
 
 # CSV dosya yolu
 CSV_FILE = "kauflandurunler.csv"
 
+# Supabase yokken kullanılan yerel depo: "sqlite" (WAL, indeksli), "parquet" (sütunlu,
+# bellek eşlemeli okuma) ya da eski "csv" dosyası. Depo ilk açılışta boşsa CSV_FILE içeri aktarılır.
+LOCAL_STORAGE = "sqlite"
+SQLITE_FILE = "kaufland.db"
+PARQUET_FILE = "kaufland_catalog.parquet"
+
+# Supabase kataloğunun yerel anlık görüntüsü (soğuk başlangıç için)
+SNAPSHOT_FILE = "catalog_snapshot.parquet"
+WRITE_JOURNAL_FILE = "write_journal.jsonl"
+
 # Varsayılan parametreler
 DEFAULT_PARAMS = {
     "reklam_maliyeti": 5.25,
@@ -86,32 +128,179 @@ DB_COLUMNS = [
     'reklam'
 ]
 
-def _supabase_enabled():
+# Metin olarak saklanan ("€84,90") ve hesaplamada sayı olarak kullanılan kolonlar
+NUMERIC_COLUMNS = [
+    'fiyat', 'ham_maliyet_euro', 'desi',
+    'tr_ne_navlun', 'ne_de_navlun', 'kara_tr_de_navlun',
+    'express_kargo', 'ddp', 'hava_tr_de_navlun',
+    'reklam'
+]
+
+# Rota kayıt defteri: her rota, ham maliyete eklenen navlun kolonlarıyla tanımlanır.
+# Temel Maliyet = Ham + Σ(navlun kolonları); reklam, vergi ve pazaryeri tüm rotalarda ortaktır.
+# Yeni rota eklemek için `register_route` kullanın; hesap motoru ve tablolar otomatik uyar.
+# Eşit maliyette listede önce gelen rota seçilir.
+ROUTES = [
+    {
+        "key": "tr_nl_de", "label": "TR→NL→DE", "navlun": ["tr_ne_navlun", "ne_de_navlun"],
+        "baslik": "TR → NL → DE", "aciklama": "Hollanda üzerinden daha ekonomik",
+    },
+    {
+        "key": "tr_de", "label": "TR→DE", "navlun": ["express_kargo", "ddp"],
+        "baslik": "TR → DE (Direkt)", "aciklama": "Direkt rota daha ekonomik",
+    },
+]
+
+# Maliyet kolonlarının tablolarda görünen adları
+COST_COLUMN_LABELS = {
+    'tr_ne_navlun': 'TR-NL Navlun',
+    'ne_de_navlun': 'NL-DE Navlun',
+    'express_kargo': 'Express Kargo',
+    'ddp': 'DDP',
+    'reklam_maliyeti': 'Reklam',
+    'pazaryeri_kesintisi': 'Komisyon',
+}
+
+# Monte Carlo risk simülasyonunda desteklenen dağılımlar (oynaklık = göreli standart sapma)
+RISK_DISTRIBUTIONS = ["Normal", "Lognormal", "Üniform"]
+# Varsayılan göreli oynaklık (%): navlun kolonları için NAVLUN, diğerleri kendi anahtarıyla
+DEFAULT_RISK_VOLATILITY = {"navlun": 15.0, "reklam_maliyeti": 20.0, "pazaryeri_kesintisi": 5.0}
+
+def register_route(key, label, navlun_columns, baslik=None, aciklama=None):
+    """Kayıt defterine yeni bir rota ekler (veya aynı anahtarlı rotayı günceller)."""
+    route = {
+        "key": key, "label": label, "navlun": list(navlun_columns),
+        "baslik": baslik or label, "aciklama": aciklama or f"{label} rotası daha ekonomik",
+    }
+    for i, r in enumerate(ROUTES):
+        if r["key"] == key:
+            ROUTES[i] = route
+            return route
+    ROUTES.append(route)
+    return route
+
+def route_labels():
+    """Kayıtlı rota etiketleri (kayıt sırasıyla)."""
+    return [r["label"] for r in ROUTES]
+
+def route_key(label):
+    """Rota etiketinden anahtarını döndürür."""
+    return next(r["key"] for r in ROUTES if r["label"] == label)
+
+def _numeric_columns():
+    """Ayrıştırılacak kolonlar: NUMERIC_COLUMNS + rotaların kullandığı ek kolonlar."""
+    extra = [c for r in ROUTES for c in r["navlun"] if c not in NUMERIC_COLUMNS]
+    return NUMERIC_COLUMNS + list(dict.fromkeys(extra))
+
+@st.cache_resource(show_spinner=False)
+def _supabase_credentials():
+    """Supabase URL/anahtarını secrets'tan süreç başına bir kez okur: (url, key, hata)."""
     try:
         url = st.secrets.get("supabase_url") or st.secrets.get("SUPABASE_URL")
         key = st.secrets.get("supabase_key") or st.secrets.get("SUPABASE_ANON_KEY")
-        return bool(url and key)
+        return url, key, None
     except Exception as e:
-        # Debug için hata detaylarını log'la (production'da kaldırılabilir)
-        if st.session_state.get('debug_mode', False):
-            st.error(f"Supabase secrets yüklenemedi: {str(e)}")
+        return None, None, str(e)
+
+def _supabase_enabled():
+    url, key, hata = _supabase_credentials()
+    if hata and st.session_state.get('debug_mode', False):
+        # Debug için hata detaylarını göster (production'da kaldırılabilir)
+        st.error(f"Supabase secrets yüklenemedi: {hata}")
+    return bool(url and key)
+
+@st.cache_resource(show_spinner=False)
+def _supabase_pool():
+    """Süreç genelinde paylaşılan client durumu (tüm oturumlar ve iş parçacıkları)."""
+    return {"client": None, "lock": threading.Lock(), "checked_at": 0.0}
+
+def _create_supabase_client(url, key):
+    """Keep-alive bağlantı havuzlu bir client oluşturur (eski sürümlerde varsayılan client)."""
+    if httpx is not None and ClientOptions is not None:
+        try:
+            http = httpx.Client(
+                timeout=120,
+                limits=httpx.Limits(
+                    max_connections=SUPABASE_MAX_CONNECTIONS,
+                    max_keepalive_connections=SUPABASE_MAX_CONNECTIONS,
+                ),
+            )
+            return create_client(url, key, options=ClientOptions(httpx_client=http))
+        except TypeError:
+            pass
+    return create_client(url, key)
+
+def supabase_health_check(sb):
+    """Tek satırlık ucuz bir sorguyla bağlantıyı yoklar."""
+    try:
+        sb.table("products").select("id").limit(1).execute()
+        return True
+    except Exception:
         return False
 
+def mark_supabase_failed():
+    """Bir Supabase işlemi başarısız olduğunda çağrılır; sonraki istekte client yoklanır ve gerekirse yenilenir."""
+    pool = _supabase_pool()
+    with pool["lock"]:
+        pool["checked_at"] = 0.0
+
 def _get_supabase_client():
+    """Paylaşılan client'ı döndürür; ilk kullanımda oluşturur. SUPABASE_HEALTH_INTERVAL
+    dolduysa (veya bir hata bildirildiyse) yoklar, yanıt vermiyorsa yeniden kurar."""
     if not _supabase_enabled():
         return None
-    try:
-        url = st.secrets.get("supabase_url") or st.secrets.get("SUPABASE_URL")
-        key = st.secrets.get("supabase_key") or st.secrets.get("SUPABASE_ANON_KEY")
-        return create_client(url, key)
-    except Exception as e:
-        # Debug için hata detaylarını log'la
-        if st.session_state.get('debug_mode', False):
-            st.error(f"Supabase client oluşturulamadı: {str(e)}")
-        return None
+    url, key, _ = _supabase_credentials()
+    pool = _supabase_pool()
+    with pool["lock"]:
+        try:
+            now = time.monotonic()
+            sb = pool["client"]
+            if sb is not None and now - pool["checked_at"] < SUPABASE_HEALTH_INTERVAL:
+                return sb
+            if sb is None or not supabase_health_check(sb):
+                if sb is not None:
+                    logger.warning("Supabase client yanıt vermiyor, yeniden oluşturuluyor")
+                sb = _create_supabase_client(url, key)
+                pool["client"] = sb
+            pool["checked_at"] = now
+            return sb
+        except Exception as e:
+            # Debug için hata detaylarını göster
+            if st.session_state.get('debug_mode', False):
+                st.error(f"Supabase client oluşturulamadı: {str(e)}")
+            return pool["client"]
 
 ## Kur fonksiyonları kaldırıldı — yalnızca EUR kullanılmakta
 
+# Desi tablosu bir kez sıralı dizilere derlenir (toplu arama için)
+_DESI_KEYS = np.array(sorted(TR_DE_NAVLUN_BY_DESI), dtype=np.float64)
+_DESI_RATES = np.array([TR_DE_NAVLUN_BY_DESI[k] for k in sorted(TR_DE_NAVLUN_BY_DESI)], dtype=np.float64)
+
+def _nearest_desi_index(desi_array):
+    """Her desi için en yakın tablo anahtarının indeksini döndürür (geçersizler -1).
+
+    Beraberlikte (1e-9 toleransla) büyük anahtar seçilir, yani yukarı yuvarlanır.
+    """
+    d = np.asarray(desi_array)
+    if d.dtype.kind not in 'biuf':
+        d = pd.to_numeric(pd.Series(d.ravel()), errors='coerce').to_numpy(np.float64).reshape(d.shape)
+    d = d.astype(np.float64, copy=False)
+    n = len(_DESI_KEYS)
+    hi = np.clip(np.searchsorted(_DESI_KEYS, d, side='left'), 0, n - 1)
+    lo = np.clip(hi - 1, 0, n - 1)
+    diff_lo = np.abs(d - _DESI_KEYS[lo])
+    diff_hi = np.abs(_DESI_KEYS[hi] - d)
+    idx = np.where(diff_hi <= diff_lo + 1e-9, hi, lo)
+    return np.where(np.isfinite(d) & (d > 0), idx, -1)
+
+def lookup_navlun(desi_array):
+    """Desi dizisini tek seferde en yakın tablo değerinden TR→DE navluna (€) çevirir.
+
+    `get_tr_de_navlun_by_desi` ile aynı eşleme; geçersiz (boş, ≤ 0) desiler için NaN döner.
+    """
+    idx = _nearest_desi_index(desi_array)
+    return np.where(idx >= 0, _DESI_RATES[np.maximum(idx, 0)], np.nan)
+
 def find_nearest_desi_key(desi_value):
     """Girilen desiyi en yakın tablo anahtarına eşler. Beraberlikte yukarı yuvarlar."""
     try:
@@ -120,17 +309,10 @@ def find_nearest_desi_key(desi_value):
         d = float(desi_value)
     except Exception:
         return None
-    if d <= 0:
+    i = int(_nearest_desi_index(d))
+    if i < 0:
         return None
-    keys = list(TR_DE_NAVLUN_BY_DESI.keys())
-    best_k = None
-    best_diff = None
-    for k in keys:
-        diff = abs(k - d)
-        if best_diff is None or diff < best_diff - 1e-9 or (abs(diff - best_diff) <= 1e-9 and k > best_k):
-            best_diff = diff
-            best_k = k
-    return best_k
+    return float(_DESI_KEYS[i])
 
 def get_tr_de_navlun_by_desi(desi_value):
     """Desi'ye göre en yakın tablo değerinden TR→DE navlun (€) döndürür."""
@@ -139,187 +321,1743 @@ def get_tr_de_navlun_by_desi(desi_value):
         return None
     return TR_DE_NAVLUN_BY_DESI.get(k)
 
-@st.cache_data(show_spinner=False)
-def load_json_data():
-    """JSON dosyasından verileri yükler (cache'li)"""
-    if os.path.exists(JSON_FILE):
+@st.cache_resource(show_spinner=False)
+def _change_log():
+    """Süreç genelinde değişiklik günlüğü kilidi. İlk kullanımda eski JSON yan deposundaki
+    ürünler günlüğe aktarılır (günlük henüz yoksa)."""
+    log = {"lock": threading.Lock()}
+    if os.path.exists(JSON_FILE) and not os.path.exists(CHANGE_LOG_FILE):
+        try:
+            with open(JSON_FILE, encoding="utf-8") as f:
+                data = json.load(f)
+            urunler = data.get("products", [])
+            zaman = data.get("last_updated") or datetime.now().isoformat(timespec="seconds")
+            frame = _normalize_catalog(pd.DataFrame(urunler)) if urunler else pd.DataFrame(columns=DB_COLUMNS)
+            _append_change_log(_change_entries(frame, (), zaman))
+            logger.info("%s değişiklik günlüğüne aktarıldı: %d ürün", JSON_FILE, len(urunler))
+        except Exception as e:
+            logger.warning("Eski JSON deposu günlüğe aktarılamadı: %s", e)
+    return log
+
+def _change_entries(rows, deleted, zaman=None):
+    zaman = zaman or datetime.now().isoformat(timespec="seconds")
+    entries = [
+        {"zaman": zaman, "islem": "yaz", "anahtar": str(k), "urun": r}
+        for k, r in zip(product_keys(rows), rows.fillna("").to_dict(orient="records"))
+    ]
+    entries += [{"zaman": zaman, "islem": "sil", "anahtar": str(k)} for k in deleted]
+    return entries
+
+def _append_change_log(entries, path=CHANGE_LOG_FILE):
+    if entries:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries))
+
+def log_product_changes(rows, deleted=()):
+    """Yazılan satırları ve silinen anahtarları günlüğün sonuna ekler (tek yazım).
+    Günlük CHANGE_LOG_COMPACT_BYTES'ı aşınca `compact_change_log` ile sıkıştırılır."""
+    log = _change_log()
+    with log["lock"]:
+        _append_change_log(_change_entries(rows, deleted))
+        try:
+            if os.path.getsize(CHANGE_LOG_FILE) > CHANGE_LOG_COMPACT_BYTES:
+                compact_change_log()
+        except OSError as e:
+            logger.warning("Değişiklik günlüğü sıkıştırılamadı: %s", e)
+
+def replay_change_log(path=CHANGE_LOG_FILE):
+    """Günlükteki kayıtları yazıldıkları sırayla verir (denetim / yeniden oynatma).
+    Yarım kalmış son satır atlanır."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        return
+
+def compact_change_log(path=CHANGE_LOG_FILE):
+    """Günlüğü her ürünün son yazım kaydına indirger (silinen ürünler düşer) ve atomik
+    olarak yeniden yazar. Dönüş: kalan kayıt sayısı."""
+    son = OrderedDict()
+    for entry in replay_change_log(path):
+        son.pop(entry.get("anahtar"), None)
+        if entry.get("islem") == "yaz":
+            son[entry.get("anahtar")] = entry
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write("".join(json.dumps(e, ensure_ascii=False) + "\n" for e in son.values()))
+    os.replace(tmp, path)
+    return len(son)
+
+def iter_catalog_json(raw, chunk_rows=JSON_EXPORT_CHUNK):
+    """Katalogu `{"products": [...], "last_updated": ...}` JSON'u olarak parça parça kodlar;
+    tüm belge hiçbir zaman tek bir metin olarak bellekte tutulmaz."""
+    yield '{"products": ['
+    for i in range(0, len(raw.index), chunk_rows):
+        if i:
+            yield ","
+        yield raw.iloc[i:i + chunk_rows].to_json(orient="records", force_ascii=False)[1:-1]
+    yield '], "last_updated": ' + json.dumps(datetime.now().strftime("%Y-%m-%d %H:%M:%S")) + "}"
+
+def catalog_json_bytes(version=None):
+    """Geçerli katalog sürümünün JSON dışa aktarımı (dosya içeriği); parça parça kodlanır."""
+    raw = _catalog_snapshot(version)[1]["raw"]
+    return "".join(iter_catalog_json(raw)).encode("utf-8")
+
+# Cache'te tutulacak katalog sürümü ve fiyatlanmış katalog sayısı (LRU ile düşer)
+CATALOG_CACHE_VERSIONS = 4
+PRICED_CACHE_ENTRIES = 32
+SCENARIO_GRID_CACHE_ENTRIES = 8
+RISK_SIM_CACHE_ENTRIES = 8
+ANALYSIS_CACHE_ENTRIES = 8
+PRODUCT_LIST_CACHE_ENTRIES = 32
+PRODUCT_PAGE_SIZES = [50, 100, 250, 500]
+PRODUCT_SEARCH_LIMIT = 200  # Fiyat Hesaplama sekmesinde seçim listesine alınan en fazla ürün
+
+# Supabase sayfalı yükleme ayarları (PostgREST max-rows sınırının altında kalın)
+SUPABASE_PAGE_SIZE = 1000
+SUPABASE_LOAD_WORKERS = 4
+SUPABASE_MAX_RETRIES = 3
+SUPABASE_RETRY_BACKOFF = 0.5  # saniye; her denemede iki katına çıkar
+SUPABASE_HEALTH_INTERVAL = 60  # saniye; paylaşılan client en fazla bu sıklıkla yoklanır
+SUPABASE_MAX_CONNECTIONS = 10  # keep-alive havuzu (sayfalı yükleyici işçileri dahil)
+SYNC_UPSERT_BATCH = 500  # upsert isteği başına satır
+SYNC_DELETE_BATCH = 200  # silme isteği başına anahtar (URL uzunluğu sınırı)
+SQLITE_BATCH = 500  # SQLite IN (...) sorgusu başına anahtar (değişken sınırı)
+CSV_READ_BLOCK_BYTES = 4 << 20  # Arrow CSV okuyucusunda iş parçacığı başına blok
+CATALOG_PROBE_TTL = 5  # saniye; depo sürüm yoklaması süreç başına en fazla bu sıklıkla yapılır
+# saniye; filigrandan geriye okunan pay. updated_at tetikleyicide now() ile, yani işlem
+# başladığında atanır; bu yüzden pay en uzun yazım işleminden (PostgREST isteği:
+# statement_timeout, Supabase'de anon/authenticated için en çok 8 sn; bulk_loader partisi
+# ~TARGET_BATCH_SECONDS) uzun olmalıdır. Pay içindeki satırlar her yenilemede yeniden okunur,
+# içeriği değişmeyenler kirli sayılmaz. Filigran pay içindeyken imza değişmese de yenilenir
+# (geç commit edilen bir güncelleme satır sayısını ve en son updated_at'i değiştirmeyebilir).
+CATALOG_REFRESH_OVERLAP = max(120, 24 * CATALOG_PROBE_TTL)
+WRITE_QUEUE_MAX = 64  # bekleyen yazım sınırı; dolunca kaydeden oturum yer açılana dek bekler
+WRITE_COALESCE_DELAY = 0.5  # saniye; art arda gelen düzenlemeler tek toplu yazımda birleşir
+WRITE_MAX_ATTEMPTS = 5  # toplu yazım denemesi; sonrası "hata" (günlükte saklanır)
+WRITE_STATUS_KEEP = 100  # arayüzde izlenen son yazım sayısı (kuyruk sınırından büyük)
+
+logger = logging.getLogger(__name__)
+
+class CatalogLoadError(RuntimeError):
+    """Katalog depodan eksiksiz yüklenemediğinde fırlatılır (kısmi veri döndürülmez)."""
+
+@st.cache_resource(show_spinner=False)
+def _catalog_state():
+    """Süreç genelinde (tüm oturumlarda) paylaşılan katalog cache'i.
+    - versions: sürüm → {'raw', 'numeric', 'keys'} anlık görüntüsü (LRU)
+    - changes:  sürüm → o sürüme geçerken değişen satır anahtarları (None: tam yenileme)
+    - priced:   (sürüm, parametreler) → (fiyatlanmış tablo, anahtarlar) (LRU)
+    - watermark: depodan görülen en son değişiklik zamanı (Supabase updated_at/deleted_at)
+    - signature: cache'teki verinin ait olduğu depo imzası (bkz. `probe_catalog_signature`)
+    """
+    return {
+        "version": 0,
+        "lock": threading.RLock(),
+        "versions": OrderedDict(),
+        "changes": {},
+        "priced": OrderedDict(),
+        "watermark": None,
+        "signature": None,
+        "probed_at": 0.0,
+        "cold_started": False,
+        "reconciling": False,
+        "snapshot_dirty": False,
+        "snapshot_writer": False,
+    }
+
+def catalog_version():
+    """Geçerli katalog sürümünü döndürür; cache anahtarlarında kullanılır."""
+    return _catalog_state()["version"]
+
+def invalidate_catalog():
+    """Katalog sürümünü artırır; sonraki okuma depodan tam yükleme yapar.
+    Eski sürümlere ait girdiler diğer sürümlere dokunmadan LRU ile düşer.
+    """
+    state = _catalog_state()
+    with state["lock"]:
+        state["version"] += 1
+        state["changes"][state["version"]] = None
+        return state["version"]
+
+def params_key(params):
+    """Parametre sözlüğünü cache anahtarı olarak kullanılabilecek sıralı tuple'a çevirir."""
+    return tuple(sorted((k, float(v)) for k, v in params.items()))
+
+def _lru_put(cache, key, value, max_entries):
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > max_entries:
+        cache.popitem(last=False)
+
+def _make_snapshot(raw, numeric=None, keys=None):
+    return {
+        "raw": raw,
+        "numeric": build_numeric_catalog(raw) if numeric is None else numeric,
+        "keys": product_keys(raw).to_numpy() if keys is None else keys,
+    }
+
+def _catalog_snapshot(version=None):
+    """İstenen (yoksa geçerli) sürümün anlık görüntüsünü döndürür; gerekirse depodan yükler.
+    Cache'ten düşmüş eski bir sürüm istenirse geçerli sürüm verilir.
+    """
+    state = _catalog_state()
+    with state["lock"]:
+        v = state["version"] if version is None else version
+        if v not in state["versions"]:
+            v = state["version"]
+        snap = state["versions"].get(v)
+        yerel = False
+        if snap is None and not state["cold_started"]:
+            # Süreçteki ilk yükleme: varsa yerel anlık görüntüden hemen başla
+            state["cold_started"] = True
+            snap = _cold_start_snapshot()
+            yerel = snap is not None
+        if snap is None:
+            raw = _read_catalog()
+            snap = _make_snapshot(raw, _stored_numeric(raw))
+            _schedule_snapshot_write()
+        _lru_put(state["versions"], v, snap, CATALOG_CACHE_VERSIONS)
+    if yerel:
+        _reconcile_in_background()
+    return v, snap
+
+def _replace_rows(frame, pos, rows):
+    """`frame`'in `pos` konumlarındaki satırları `rows` ile değiştirilmiş kopyası. Yalnızca
+    değeri değişen kolonlar kopyalanır; diğerleri önceki sürümle paylaşılır."""
+    out = frame.copy(deep=False)
+    for c in frame.columns:
+        eski = frame[c].iloc[pos]
+        yeni = rows[c].set_axis(eski.index)
+        if eski.equals(yeni):
+            continue
+        col = frame[c].copy()
+        col.iloc[pos] = yeni.to_numpy()
+        out[c] = col
+    return out
+
+def _patch_rows(old_frame, old_keys, new_index, new_keys, dirty, compute):
+    """`old_frame` satırlarını anahtarla yeni sıraya taşır; yalnızca kirli veya yeni
+    satırları `compute(maske)` ile yeniden hesaplar. Anahtarlar tekil değilse None döner.
+    """
+    if len(old_frame.index) == 0:
+        return None
+    if old_keys is new_keys and old_frame.index.equals(new_index):
+        # Satırlar yerinde güncellendi (ekleme/silme yok): yalnızca kirli satırlar değişir
+        mask = pd.Index(new_keys).isin(list(dirty))
+        return _replace_rows(old_frame, np.flatnonzero(mask), compute(mask)) if mask.any() else old_frame
+    if not new_index.is_unique:
+        return None
+    if pd.Index(old_keys).has_duplicates or pd.Index(new_keys).has_duplicates:
+        return None
+    pos = pd.Index(old_keys).get_indexer(new_keys)
+    recompute = (pos < 0) | np.isin(new_keys, list(dirty))
+    kept = old_frame.iloc[pos[~recompute]]
+    kept.index = new_index[~recompute]
+    if recompute.any():
+        kept = pd.concat([kept, compute(recompute)])
+    return kept.reindex(new_index)
+
+def apply_catalog_changes(new_raw, dirty_keys, keys=None):
+    """Kaydedilen tabloyu yeni katalog sürümü olarak cache'e alır. Depodan yeniden
+    yüklemez; yalnızca `dirty_keys` (EAN/title) satırlarını yeniden ayrıştırır.
+    Fiyatlanmış tablolar bir sonraki istekte yalnızca kirli satırlar için güncellenir.
+    `keys` verilirse yeni tablonun satır anahtarları yeniden hesaplanmaz.
+    """
+    state = _catalog_state()
+    with state["lock"]:
+        cur = state["versions"].get(state["version"])
+        state["version"] += 1
+        new_v = state["version"]
+        raw = _normalize_catalog(new_raw)
+        dirty = frozenset(str(k) for k in dirty_keys)
+        numeric = None
+        keys = product_keys(raw).to_numpy() if keys is None else np.asarray(keys, dtype=object)
+        if cur is not None:
+            numeric = _patch_rows(
+                cur["numeric"], cur["keys"], raw.index, keys, dirty,
+                lambda mask: build_numeric_catalog(raw[mask]),
+            )
+        state["changes"][new_v] = dirty if numeric is not None else None
+        _lru_put(state["versions"], new_v, _make_snapshot(raw, numeric, keys), CATALOG_CACHE_VERSIONS)
+        # Artık hiçbir cache girdisinin ihtiyaç duymadığı değişiklik kayıtlarını at
+        oldest = min([v for v, _ in state["priced"]] + list(state["versions"]))
+        for v in [v for v in state["changes"] if v <= oldest]:
+            del state["changes"][v]
+    _schedule_snapshot_write()
+    return new_v
+
+def _install_catalog(raw):
+    """Depodan tam okunmuş tabloyu yeni sürüm olarak cache'e koyar (tam yenileme)."""
+    state = _catalog_state()
+    with state["lock"]:
+        state["version"] += 1
+        state["changes"][state["version"]] = None
+        _lru_put(state["versions"], state["version"], _make_snapshot(raw), CATALOG_CACHE_VERSIONS)
+    _schedule_snapshot_write()
+    return state["version"]
+
+# Sütunlu katalog biçimi (Parquet): NUMERIC_COLUMNS float64 (boş/geçersiz hücre null),
+# diğer kolonlar sözlük kodlu metin. Yerel Parquet deposu, anlık görüntü ve Parquet
+# dışa/içe aktarımı bu biçimi kullanır; okumalar bellek eşlemeli ve kolon seçimlidir.
+
+def catalog_arrow_table(raw):
+    """Metin kataloğu (DB_COLUMNS) sütunlu Arrow tablosuna çevirir."""
+    frame = _normalize_catalog(raw)
+    kolonlar = {}
+    for c in DB_COLUMNS:
+        if c in NUMERIC_COLUMNS:
+            values = parse_euro_series(frame[c], errors="coerce").to_numpy()
+            kolonlar[c] = pa.array(values, type=pa.float64(), from_pandas=True)
+        else:
+            values = frame[c].fillna("").astype(str).to_numpy(dtype=object)
+            kolonlar[c] = pa.array(values, type=pa.string()).dictionary_encode()
+    return pa.table(kolonlar)
+
+def write_catalog_parquet(raw, target, metadata=None, extra=None):
+    """Kataloğu sütunlu biçimde Parquet'e yazar; `target` dosya yoluysa yazım atomiktir.
+    `metadata` ({anahtar: JSON değer}) şema metadatasına eklenir; `extra` aynı satır
+    sırasıyla eklenecek hesap kolonlarıdır (dışa aktarım)."""
+    table = catalog_arrow_table(raw)
+    for c in ([] if extra is None else extra.columns):
+        kolon = pa.Array.from_pandas(extra[c].to_numpy())
+        if pa.types.is_string(kolon.type):
+            kolon = kolon.dictionary_encode()
+        table = table.append_column(str(c), kolon)
+    if metadata:
+        table = table.replace_schema_metadata({k.encode(): json.dumps(v).encode() for k, v in metadata.items()})
+    if not isinstance(target, (str, os.PathLike)):
+        pq.write_table(table, target)
+        return
+    tmp = f"{target}.tmp"
+    pq.write_table(table, tmp)
+    os.replace(tmp, target)
+
+def read_catalog_table(source, columns=None):
+    """Parquet kataloğu Arrow tablosu olarak okur (dosya yolları bellek eşlemeli).
+    `columns` verilirse yalnızca dosyada bulunan bu kolonlar okunur."""
+    if columns is not None:
+        mevcut = set(pq.read_schema(source).names)
+        columns = [c for c in columns if c in mevcut]
+    return pq.read_table(source, columns=columns, memory_map=True)
+
+def _arrow_text(col):
+    """Arrow kolonunu null değerleri "" olan metin Series'ine çevirir."""
+    if pa.types.is_dictionary(col.type):
+        col = col.cast(col.type.value_type)
+    return pc.fill_null(pc.cast(col, pa.string()), "").to_pandas()
+
+def _is_arrow_number(col):
+    return pa.types.is_floating(col.type) or pa.types.is_integer(col.type)
+
+def _format_cents_arrow(values):
+    """Float euro dizisini kayıt biçiminde (bkz. `format_cents`) Arrow metnine çevirir."""
+    cents = to_cents(values)
+    mutlak = np.abs(cents)
+    onek = pc.if_else(pa.array(cents < 0), pa.scalar("€-"), pa.scalar("€"))
+    tam = pc.binary_join_element_wise(onek, pc.cast(pa.array(mutlak // 100), pa.string()), "")
+    kurus = pc.utf8_lpad(pc.cast(pa.array(mutlak % 100), pa.string()), 2, "0")
+    return pc.binary_join_element_wise(tam, kurus, ".")
+
+def catalog_from_arrow(table):
+    """Sütunlu tabloyu metin kataloğuna çevirir (dosyada bulunan DB_COLUMNS, bu sırayla).
+    Sayısal kolonlar kayıt biçiminde yazılır (tutarlar "€12.17", desi düz sayı), null
+    hücreler boş kalır; metin saklanmış kolonlar (eski anlık görüntüler) olduğu gibi alınır."""
+    out = pd.DataFrame(index=pd.RangeIndex(table.num_rows))
+    for c in DB_COLUMNS:
+        if c not in table.column_names:
+            continue
+        col = table.column(c).combine_chunks()
+        if c in NUMERIC_COLUMNS and _is_arrow_number(col):
+            col = pc.cast(col, pa.float64())
+            values = col.to_numpy(zero_copy_only=False)
+            metin = pc.cast(col, pa.string()) if c == 'desi' else _format_cents_arrow(values)
+            col = pc.if_else(pa.array(~np.isnan(values)), metin, pa.scalar(""))
+        out[c] = _arrow_text(col)
+    return out
+
+def numeric_from_arrow(table):
+    """Sütunlu tablodan `build_numeric_catalog` biçiminde sayısal katalog kurar; tipli
+    kolonlar ayrıştırılmadan doğrudan float64 alınır (eksikler 0)."""
+    num = pd.DataFrame(index=pd.RangeIndex(table.num_rows))
+    for c in ('title', 'ean'):
+        num[c] = _arrow_text(table.column(c)) if c in table.column_names else ""
+    for c in _numeric_columns():
+        if c not in table.column_names:
+            num[c] = 0.0
+            continue
+        col = table.column(c)
+        if _is_arrow_number(col):
+            num[c] = np.nan_to_num(pc.cast(col, pa.float64()).to_numpy(), nan=0.0)
+        else:
+            num[c] = parse_euro_series(_arrow_text(col)).to_numpy()
+    return num
+
+def catalog_parquet_bytes(raw, extra=None):
+    """Sütunlu katalog dışa aktarımı (Parquet dosya içeriği)."""
+    buffer = io.BytesIO()
+    write_catalog_parquet(raw, buffer, extra=extra)
+    return buffer.getvalue()
+
+def save_catalog_snapshot(raw, watermark, signature, path=SNAPSHOT_FILE):
+    """Kataloğu sürüm bilgisiyle (filigran + depo imzası) sütunlu Parquet dosyasına atomik yazar."""
+    if pq is None:
+        return False
+    meta = {
+        "watermark": watermark.isoformat() if watermark is not None else None,
+        "signature": list(signature) if signature is not None else None,
+        "saved_at": datetime.now().isoformat(),
+    }
+    write_catalog_parquet(raw, path, metadata={"catalog": meta})
+    return True
+
+def load_catalog_snapshot(path=SNAPSHOT_FILE):
+    """Yerel anlık görüntüyü okur: (tablo, sayısal tablo, filigran, imza); yoksa/bozuksa None."""
+    if pq is None or not os.path.exists(path):
+        return None
+    try:
+        table = read_catalog_table(path)
+        meta = json.loads(table.schema.metadata[b"catalog"])
+        raw = _normalize_catalog(catalog_from_arrow(table))
+        numeric = numeric_from_arrow(table)
+        watermark = pd.Timestamp(meta["watermark"]) if meta.get("watermark") else None
+        signature = tuple(meta["signature"]) if meta.get("signature") else None
+        return raw, numeric, watermark, signature
+    except Exception as e:
+        logger.warning("Yerel katalog anlık görüntüsü okunamadı: %s", e)
+        return None
+
+def _schedule_snapshot_write():
+    """Geçerli Supabase kataloğunu arka planda diske yazar. Yazım sürerken gelen
+    istekler birleştirilir; her turda yalnızca en son sürüm yazılır."""
+    if pq is None or not _supabase_enabled():
+        return
+    state = _catalog_state()
+    with state["lock"]:
+        state["snapshot_dirty"] = True
+        if state["snapshot_writer"]:
+            return
+        state["snapshot_writer"] = True
+
+    def _writer():
+        while True:
+            with state["lock"]:
+                if not state["snapshot_dirty"]:
+                    state["snapshot_writer"] = False
+                    return
+                state["snapshot_dirty"] = False
+                snap = state["versions"].get(state["version"])
+                watermark, signature = state["watermark"], state["signature"]
+            if snap is not None:
+                try:
+                    save_catalog_snapshot(snap["raw"], watermark, signature)
+                except Exception as e:
+                    logger.warning("Katalog anlık görüntüsü yazılamadı: %s", e)
+
+    threading.Thread(target=_writer, name="catalog-snapshot", daemon=True).start()
+
+def _cold_start_snapshot():
+    """Supabase kullanılıyorsa yerel anlık görüntüden katalog anlık görüntüsü kurar."""
+    if not _supabase_enabled():
+        return None
+    yerel = load_catalog_snapshot()
+    if yerel is None:
+        return None
+    raw, numeric, watermark, signature = yerel
+    state = _catalog_state()
+    state["watermark"], state["signature"] = watermark, signature
+    logger.info("Katalog yerel anlık görüntüden açıldı: %d satır", len(raw.index))
+    return _make_snapshot(raw, numeric)
+
+def _reconcile_in_background():
+    """Yerel anlık görüntüden açılan kataloğu arka planda Supabase ile eşitler; veri
+    yalnızca depo imzası farklıysa (artımlı ya da tam) yeni sürüm olarak değiştirilir."""
+    state = _catalog_state()
+    state["reconciling"] = True
+
+    def _run():
         try:
-            with open(JSON_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {"products": [], "last_updated": ""}
-    return {"products": [], "last_updated": ""}
-
-def save_json_data(data):
-    """Verileri JSON dosyasına kaydeder"""
-    data["last_updated"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(JSON_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    # Cache'i temizle (bir sonraki okumada güncel veri yüklensin)
+            if state["watermark"] is not None:
+                validate_catalog(force=True)
+            else:
+                imza = probe_catalog_signature()
+                if imza is None or imza != state["signature"]:
+                    _install_catalog(_read_catalog())
+        except Exception as e:
+            logger.warning("Katalog arka plan eşitlemesi başarısız: %s", e)
+        finally:
+            state["reconciling"] = False
+
+    threading.Thread(target=_run, name="catalog-reconcile", daemon=True).start()
+
+def catalog_reconciling():
+    """Katalog yerel anlık görüntüden gösterilirken arka plan eşitlemesi sürüyorsa True."""
+    return _catalog_state()["reconciling"]
+
+def load_csv_data(version=None):
+    """Verileri yükler (Supabase varsa oradan; yoksa yerel CSV'den).
+    `version` verilmezse geçerli katalog sürümü kullanılır; dönen tablo bir kopyadır.
+    """
+    return _catalog_snapshot(version)[1]["raw"].copy()
+
+def _normalize_catalog(df):
+    """Eski kolonları eşler, eksik kolonları tamamlar ve DB_COLUMNS sırasını uygular."""
+    df = df.copy()
+    # Eski veriden yeni kolona geriye dönük eşleme
+    if 'hava_tr_de_navlun' not in df.columns and 'tr_de_navlun' in df.columns:
+        df['hava_tr_de_navlun'] = df['tr_de_navlun']
+    # Eksik kolonları tamamla ve sıralamayı koru
+    for c in DB_COLUMNS:
+        if c not in df.columns:
+            df[c] = ""
+    return df[DB_COLUMNS]
+
+def _with_retry(fn, what):
+    """`fn`'i üstel beklemeyle en fazla SUPABASE_MAX_RETRIES kez dener; son hatayı yükseltir."""
+    for attempt in range(SUPABASE_MAX_RETRIES):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == SUPABASE_MAX_RETRIES - 1:
+                raise
+            bekleme = SUPABASE_RETRY_BACKOFF * (2 ** attempt)
+            logger.warning("%s başarısız (deneme %d/%d): %s — %.1fs sonra tekrar", what, attempt + 1, SUPABASE_MAX_RETRIES, e, bekleme)
+            time.sleep(bekleme)
+
+def _fetch_products_page(sb, start, end, columns):
+    """[start, end] aralığını getirir. Sunucu max-rows sınırı sayfadan küçükse
+    kalan kısmı ardışık isteklerle tamamlar; boş yanıt gelirse eksik döner."""
+    rows = []
+    t0 = time.perf_counter()
+    while start + len(rows) <= end:
+        lo = start + len(rows)
+        data = _with_retry(
+            lambda: sb.table("products").select(columns).order("id").range(lo, end).execute().data or [],
+            f"products[{lo}-{end}]",
+        )
+        if not data:
+            break
+        rows.extend(data)
+    logger.info("products[%d-%d]: %d satır, %.0f ms", start, end, len(rows), (time.perf_counter() - t0) * 1000)
+    return rows
+
+def load_supabase_catalog(sb, page_size=SUPABASE_PAGE_SIZE, workers=SUPABASE_LOAD_WORKERS):
+    """Supabase'deki ürünleri sayfalara bölüp iş parçacığı havuzunda paralel getirir.
+    Önce satır sayısı alınır, her sayfa `range()` ile (id sırasına göre) istenir ve
+    yalnızca DB_COLUMNS seçilir. Toplam satır sayısı tutmazsa CatalogLoadError fırlatılır.
+    """
+    t0 = time.perf_counter()
+    total = _with_retry(
+        lambda: sb.table("products").select("id", count="exact").limit(1).execute().count,
+        "products sayımı",
+    )
+    total = int(total or 0)
+    if total == 0:
+        return pd.DataFrame(columns=DB_COLUMNS)
+
+    columns = ",".join(DB_COLUMNS)
+    pages = [(s, min(s + page_size, total) - 1) for s in range(0, total, page_size)]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pages)))) as ex:
+        results = list(ex.map(lambda p: _fetch_products_page(sb, p[0], p[1], columns), pages))
+
+    rows = [r for page in results for r in page]
+    logger.info("products: %d/%d satır, %d sayfa, %.0f ms", len(rows), total, len(pages), (time.perf_counter() - t0) * 1000)
+    if len(rows) != total:
+        raise CatalogLoadError(f"Kısmi yükleme: {total} satırdan {len(rows)} tanesi alınabildi")
+    return _normalize_catalog(pd.DataFrame(rows))
+
+def _read_catalog():
+    """Kataloğu kalıcı depodan (`storage_backend`) okur (cache'siz).
+    Supabase okuması başarısız olursa boş tablo yerine CatalogLoadError fırlatılır.
+    Depo imzası okumadan önce alınır (bkz. `validate_catalog`).
+    """
+    _catalog_state()["signature"] = probe_catalog_signature()
+    backend = storage_backend()
+    if isinstance(backend, SupabaseBackend):
+        try:
+            # Filigran yüklemeden önce alınır: yükleme sırasında gelen değişiklikler sonraki yoklamada tekrar okunur
+            watermark = _supabase_watermark(backend.client)
+            df = backend.load()
+            _catalog_state()["watermark"] = watermark
+            return df
+        except Exception as e:
+            mark_supabase_failed()
+            if isinstance(e, CatalogLoadError):
+                raise
+            raise CatalogLoadError(f"Supabase'den ürünler okunamadı: {e}") from e
+    # Yerel depo (SQLite / CSV)
     try:
-        load_json_data.clear()
+        return backend.load()
+    except Exception as e:
+        logger.warning("Yerel katalog deposu okunamadı: %s", e)
+        return pd.DataFrame(columns=DB_COLUMNS)
+
+def _stored_numeric(raw):
+    """Depo sayısal kolonları tipli saklıyorsa (Parquet) sayısal kataloğu yalnızca gereken
+    kolonları okuyarak, metni ayrıştırmadan kurar. Depo `raw` okunduktan sonra
+    değiştiyse ya da tipli okuma yoksa None (metinden ayrıştırılır)."""
+    try:
+        num = storage_backend().load_numeric()
+    except Exception as e:
+        logger.warning("Sayısal katalog depodan okunamadı: %s", e)
+        return None
+    if num is None or len(num.index) != len(raw.index):
+        return None
+    if not np.array_equal(product_keys(num).to_numpy(), product_keys(raw).to_numpy()):
+        return None
+    return num.set_axis(raw.index)
+
+def _supabase_watermark(sb):
+    """Tablodaki en son değişiklik zamanı (updated_at / tombstone deleted_at).
+    Şemada değişiklik takibi yoksa None döner; artımlı yenileme devre dışı kalır."""
+    try:
+        son = sb.table("products").select("updated_at").order("updated_at", desc=True).limit(1).execute().data or []
+        zamanlar = [pd.Timestamp(son[0]["updated_at"])] if son else []
+        silinen = sb.table("products_deleted").select("deleted_at").order("deleted_at", desc=True).limit(1).execute().data or []
+        zamanlar += [pd.Timestamp(silinen[0]["deleted_at"])] if silinen else []
+        return max(zamanlar) if zamanlar else pd.Timestamp(0, tz="UTC")
+    except Exception:
+        return None
+
+def _fetch_since(sb, table, columns, ts_column, since):
+    """`ts_column > since` olan satırları zaman sırasıyla sayfa sayfa getirir."""
+    rows = []
+    while True:
+        page = _with_retry(
+            lambda: sb.table(table).select(columns).gt(ts_column, since.isoformat())
+            .order(ts_column).range(len(rows), len(rows) + SUPABASE_PAGE_SIZE - 1).execute().data or [],
+            f"{table} değişiklikleri",
+        )
+        rows.extend(page)
+        if len(page) < SUPABASE_PAGE_SIZE:
+            return rows
+
+def merge_catalog_changes(raw, changed_rows, tombstones):
+    """Değişen satırları ve silme kayıtlarını (tombstone) katalog tablosuna uygular.
+    Değişiklik sorgusunda dönen satırlar depoda halen vardır, bu yüzden aynı anahtarlı
+    tombstone'lardan önceliklidir. İçeriği gerçekten değişmeyen satırlar kirli sayılmaz.
+    Dönüş: (yeni tablo, kirli anahtarlar).
+    """
+    keys = product_keys(raw)
+    out = raw.copy()
+    dirty = set()
+
+    changed = _normalize_catalog(pd.DataFrame(changed_rows)) if changed_rows else out.iloc[0:0]
+    changed_keys = product_keys(changed)
+    # Aynı anahtarda son gelen satır geçerlidir (sorgu zaman sıralıdır)
+    changed = changed[~changed_keys.duplicated(keep='last')]
+    changed_keys = changed_keys[changed.index]
+    pos = pd.Index(keys).get_indexer(changed_keys) if not keys.duplicated().any() else None
+    if pos is None:
+        return None, None
+
+    old_text = out.fillna("").astype(str)
+    new_rows = []
+    for (label, row), p, key in zip(changed.iterrows(), pos, changed_keys):
+        if p < 0:
+            new_rows.append(row)
+            dirty.add(key)
+        elif list(old_text.iloc[p]) != list(row.fillna("").astype(str)):
+            out.iloc[p] = row.to_numpy()
+            dirty.add(key)
+    if new_rows:
+        start = (int(out.index.max()) + 1) if len(out.index) else 0
+        eklenen = pd.DataFrame(new_rows, columns=DB_COLUMNS)
+        eklenen.index = pd.RangeIndex(start, start + len(new_rows))
+        out = pd.concat([out, eklenen])
+
+    if tombstones:
+        silinen = set(product_keys(pd.DataFrame(tombstones).reindex(columns=['title', 'ean']))) - set(changed_keys)
+        silinen &= set(keys)
+        if silinen:
+            out = out[~product_keys(out).isin(silinen)]
+            dirty |= silinen
+    return out, dirty
+
+def refresh_catalog():
+    """Depodaki son değişiklikleri (filigrandan bu yana) okuyup cache'teki kataloğa işler.
+    Maliyet katalog boyutuyla değil değişiklik sayısıyla orantılıdır.
+    Dönüş: işlenen değişiklik sayısı; artımlı yenileme mümkün değilse None.
+    """
+    state = _catalog_state()
+    with state["lock"]:
+        watermark = state["watermark"]
+        if watermark is None:
+            return None
+        version = state["version"]
+        snap = state["versions"].get(version)
+    if snap is None or not _supabase_enabled():
+        return None
+    sb = _get_supabase_client()
+    if sb is None:
+        return None
+    since = watermark - pd.Timedelta(seconds=CATALOG_REFRESH_OVERLAP)
+    try:
+        rows = _fetch_since(sb, "products", ",".join(DB_COLUMNS + ["updated_at"]), "updated_at", since)
+        tombstones = _fetch_since(sb, "products_deleted", "ean,title,deleted_at", "deleted_at", since)
+    except Exception:
+        mark_supabase_failed()
+        return 0
+    zamanlar = [pd.Timestamp(r["updated_at"]) for r in rows] + [pd.Timestamp(r["deleted_at"]) for r in tombstones]
+    if not zamanlar:
+        return 0
+
+    new_raw, dirty = merge_catalog_changes(snap["raw"], rows, tombstones)
+    with state["lock"]:
+        if state["version"] != version:
+            # Bu arada başka bir yazma/yenileme oldu; sonraki yoklama tekrar dener
+            state["signature"] = None
+            return 0
+        if new_raw is None:
+            invalidate_catalog()
+        elif dirty:
+            apply_catalog_changes(new_raw, dirty)
+        state["watermark"] = max([watermark] + zamanlar)
+    if dirty:
+        logger.info("Katalog artımlı yenilendi: %d değişiklik", len(dirty))
+    return len(dirty or ())
+
+def probe_catalog_signature():
+    """Deponun ucuz sürüm imzası (`StorageBackend.version`): Supabase için satır sayısı +
+    en son updated_at (tek istek), SQLite için yazım sayacı, CSV için dosya mtime/boyut.
+    Yoklanamazsa None döner."""
+    if _supabase_enabled() and _get_supabase_client() is None:
+        return None
+    return storage_backend().version()
+
+def _within_refresh_overlap(state):
+    """Son görülen değişiklik CATALOG_REFRESH_OVERLAP'tan yeniyse True: bu süre içinde
+    başlamış ama henüz commit edilmemiş yazımlar imzayı değiştirmeden görünür olabilir."""
+    watermark = state["watermark"]
+    if watermark is None:
+        return False
+    return pd.Timestamp.now(tz="UTC") - watermark < pd.Timedelta(seconds=CATALOG_REFRESH_OVERLAP)
+
+def validate_catalog(force=False):
+    """Cache'teki kataloğun (ve ondan fiyatlananların) hâlâ geçerli olup olmadığını
+    en fazla CATALOG_PROBE_TTL saniyede bir depo imzasıyla kontrol eder. İmza
+    değiştiyse Supabase'de artımlı yenileme, olmazsa tam yeniden yükleme yapılır.
+    Katalog bu süreçte henüz yüklenmediyse (okumalar yalnızca veritabanı RPC'lerinden)
+    imza değişince yalnızca sürüm artırılır; böylece sürüm anahtarlı cache'ler yeniden okunur.
+    `force` TTL'i yok sayar. Dönüş: katalog sürümü değiştiyse True.
+    """
+    state = _catalog_state()
+    now = time.monotonic()
+    with state["lock"]:
+        if not force and now - state["probed_at"] < CATALOG_PROBE_TTL:
+            return False
+        state["probed_at"] = now
+        eski = state["signature"]
+        version = state["version"]
+        yuklu = version in state["versions"]
+    imza = probe_catalog_signature()
+    if imza is None:
+        return False
+    if not yuklu:
+        with state["lock"]:
+            if state["version"] != version or version in state["versions"]:
+                return False
+            if eski is not None and imza != eski:
+                invalidate_catalog()
+            state["signature"] = imza
+            return state["version"] != version
+    if imza == eski and not _within_refresh_overlap(state):
+        return False
+    degisen = refresh_catalog()
+    with state["lock"]:
+        if degisen is None:
+            # Artımlı yenileme yapılamıyor (yerel depo / eski şema): sonraki okumada tam yükleme
+            if state["version"] == version:
+                invalidate_catalog()
+            state["signature"] = imza
+        elif state["signature"] == eski:
+            # Artımlı yenileme tamamlandı (yarış olduysa refresh_catalog imzayı sıfırlamıştır)
+            state["signature"] = imza
+        return state["version"] != version
+
+def build_numeric_catalog(df):
+    """Ürün tablosunun sayısal kolonlarını tek seferde float64'e çevirir.
+    Dönen tablo `df` ile aynı indekse sahiptir; `title` ve `ean` anahtar olarak korunur.
+    """
+    num = pd.DataFrame(index=df.index)
+    for c in ('title', 'ean'):
+        num[c] = df[c] if c in df.columns else ""
+    for c in _numeric_columns():
+        if c in df.columns:
+            num[c] = parse_euro_series(df[c])
+        else:
+            num[c] = 0.0
+    return num
+
+def load_numeric_catalog(version=None):
+    """`load_csv_data` çıktısının sayısal (float64) karşılığı; sürüm başına bir kez
+    ayrıştırılır ve oturumlar arasında paylaşılır (salt okunur kullanın)."""
+    return _catalog_snapshot(version)[1]["numeric"]
+
+def load_priced_catalog(params, version=None):
+    """Fiyatlanmış katalog; (katalog sürümü, parametreler) anahtarıyla tüm sekme
+    ve oturumlar arasında paylaşılır (salt okunur kullanın). Aynı parametrelerle
+    daha eski bir sürüm cache'teyse yalnızca aradaki kirli satırlar yeniden fiyatlanır.
+    """
+    state = _catalog_state()
+    pk = params_key(params)
+    with state["lock"]:
+        v, snap = _catalog_snapshot(version)
+        hit = state["priced"].get((v, pk))
+        if hit is not None:
+            state["priced"].move_to_end((v, pk))
+            return hit[0]
+        numeric = snap["numeric"]
+        priced = None
+        # Aynı parametrelerle fiyatlanmış en yeni eski sürümden artımlı güncelle
+        bases = sorted((bv for bv, bpk in state["priced"] if bpk == pk and bv < v), reverse=True)
+        if bases:
+            base_v = bases[0]
+            changes = [state["changes"].get(x) for x in range(base_v + 1, v + 1)]
+            if all(c is not None for c in changes):
+                dirty = frozenset().union(*changes)
+                base_df, base_keys = state["priced"][(base_v, pk)]
+                priced = _patch_rows(
+                    base_df, base_keys, numeric.index, snap["keys"], dirty,
+                    lambda mask: price_catalog(numeric[mask], dict(pk)),
+                )
+        if priced is None:
+            priced = price_catalog(numeric, dict(pk))
+        _lru_put(state["priced"], (v, pk), (priced, snap["keys"]), PRICED_CACHE_ENTRIES)
+        return priced
+
+def _sync_frame(df):
+    """Tabloyu Supabase satır biçimine getirir: DB_COLUMNS, türetilmiş alanlar, metin değerler."""
+    df2 = df.copy()
+    # Backfill: eski kolondan yeni kolona
+    if 'hava_tr_de_navlun' not in df2.columns and 'tr_de_navlun' in df2.columns:
+        df2['hava_tr_de_navlun'] = df2['tr_de_navlun']
+    for c in DB_COLUMNS:
+        if c not in df2.columns:
+            df2[c] = ""
+    # Türetilmiş alanlar: kara_tr_de_navlun = tr_ne_navlun + ne_de_navlun
+    try:
+        kara = to_cents(parse_euro_series(df2['tr_ne_navlun'])) + to_cents(parse_euro_series(df2['ne_de_navlun']))
+        df2['kara_tr_de_navlun'] = [format_cents(v) for v in kara]
     except Exception:
         pass
+    # Türetilmiş alan: hava_tr_de_navlun = express_kargo + ddp (varsa)
+    try:
+        sums = to_cents(parse_euro_series(df2['express_kargo'])) + to_cents(parse_euro_series(df2['ddp']))
+        # Yalnızca toplam > 0 ise üzerine yaz
+        df2['hava_tr_de_navlun'] = [
+            format_cents(s) if s > 0 else (r if isinstance(r, str) and r != '' else format_cents(0))
+            for s, r in zip(sums, df2.get('hava_tr_de_navlun', ''))
+        ]
+    except Exception:
+        pass
+    df2 = df2[DB_COLUMNS]
+    df2 = df2.fillna("")
+    # Supabase şemasında metin kolonları kullanıldığı için string'e çevir
+    try:
+        df2 = df2.astype(str)
+    except Exception:
+        pass
+    return df2
 
-@st.cache_data(show_spinner=False)
-def load_csv_data():
-    """Verileri yükler (Supabase varsa oradan; yoksa yerel CSV'den)."""
-    # Öncelik: Supabase
-    if _supabase_enabled():
-        sb = _get_supabase_client()
-        if sb is not None:
+def _has_ean(frame):
+    """EAN'ı dolu satırlar (bkz. `product_keys`)."""
+    return ~frame['ean'].astype(str).str.strip().isin(["", "nan", "None"])
+
+def _keyed_hashes(frame):
+    """Satır anahtarı (EAN/title) → içerik özeti; yinelenen anahtarlarda son satır geçerlidir."""
+    keys = product_keys(frame).to_numpy()
+    hashes = pd.util.hash_pandas_object(frame[DB_COLUMNS], index=False).to_numpy()
+    return dict(zip(keys, hashes)), keys
+
+def _run_batches(tasks, workers=SUPABASE_LOAD_WORKERS):
+    """(açıklama, fonksiyon) görevlerini havuzda yeniden denemeli çalıştırır; herhangi biri
+    başarısız olursa hatayı yükseltir. Her fonksiyon etkilediği satır sayısını döndürür."""
+    if not tasks:
+        return 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(tasks)))) as ex:
+        futures = [ex.submit(_with_retry, fn, what) for what, fn in tasks]
+        return sum(int(f.result() or 0) for f in futures)
+
+def sync_products(sb, target, stored):
+    """`stored` (depodaki satırlar) ile `target` arasındaki farkı Supabase'e yazar.
+    İçerik özeti değişen/yeni EAN'lı satırlar `upsert(on_conflict="ean")` ile, EAN'sız
+    satırlar title bazında sil+ekle ile gönderilir; yalnızca hedefte olmayan anahtarlar
+    silinir. Silme filtrelerinde değerler `postgrest_in` ile tırnaklanır (virgül/parantez/
+    tırnak içeren başlıklar). İstekler parçalara bölünüp paralel çalışır.
+    Dönüş: {"yazilan": n, "silinen": m, "degismeyen": k}.
+    """
+    target = _sync_frame(target)
+    stored = _sync_frame(stored)
+    stored_hashes, stored_keys = _keyed_hashes(stored)
+    target_hashes, target_keys = _keyed_hashes(target)
+    stored_ean_keys = set(stored_keys[_has_ean(stored).to_numpy()])
+
+    # Yinelenen anahtarlarda son satırı tut (upsert aynı satırı iki kez güncelleyemez)
+    son = pd.Series(np.arange(len(target_keys))).groupby(target_keys).last()
+    degisen = [k for k in son.index if stored_hashes.get(k) != target_hashes[k]]
+    silinen = [k for k in stored_hashes if k not in target_hashes]
+
+    rows = target.iloc[son[degisen].to_numpy()] if degisen else target.iloc[0:0]
+    has_ean = _has_ean(rows)
+    upsert_rows = rows[has_ean].to_dict(orient="records")
+    title_rows = rows[~has_ean].assign(ean=None).to_dict(orient="records")
+    silinen_ean = [k for k in silinen if k in stored_ean_keys]
+    silinen_title = [k for k in silinen if k not in stored_ean_keys]
+
+    def _bos_ean(q):
+        return q.or_("ean.is.null,ean.eq.")
+
+    tasks = []
+    for i in range(0, len(upsert_rows), SYNC_UPSERT_BATCH):
+        batch = upsert_rows[i:i + SYNC_UPSERT_BATCH]
+        tasks.append((f"upsert[{i}]", lambda b=batch: len(
+            sb.table("products").upsert(b, on_conflict="ean").execute().data or b)))
+    for i in range(0, len(title_rows), SYNC_UPSERT_BATCH):
+        batch = title_rows[i:i + SYNC_UPSERT_BATCH]
+        titles = [r["title"] for r in batch]
+        def _title_write(b=batch, t=titles):
+            _bos_ean(sb.table("products").delete().filter("title", "in", postgrest_in(t))).execute()
+            return len(sb.table("products").insert(b).execute().data or b)
+        tasks.append((f"title[{i}]", _title_write))
+    for i in range(0, len(silinen_ean), SYNC_DELETE_BATCH):
+        keys = silinen_ean[i:i + SYNC_DELETE_BATCH]
+        tasks.append((f"delete ean[{i}]", lambda k=keys: len(
+            sb.table("products").delete().filter("ean", "in", postgrest_in(k)).execute().data or [])))
+    for i in range(0, len(silinen_title), SYNC_DELETE_BATCH):
+        keys = silinen_title[i:i + SYNC_DELETE_BATCH]
+        tasks.append((f"delete title[{i}]", lambda k=keys: len(
+            _bos_ean(sb.table("products").delete().filter("title", "in", postgrest_in(k))).execute().data or [])))
+
+    t0 = time.perf_counter()
+    _run_batches(tasks)
+    stats = {"yazilan": len(upsert_rows) + len(title_rows), "silinen": len(silinen), "degismeyen": len(son) - len(degisen)}
+    logger.info("products senkronizasyonu: %s, %d istek, %.0f ms", stats, len(tasks), (time.perf_counter() - t0) * 1000)
+    return stats
+
+class StorageBackend(ABC):
+    """Katalog deposu arayüzü. Satırlar DB_COLUMNS metin kolonlarıyla taşınır; satır
+    anahtarı `product_keys` kuralıdır (EAN, yoksa title)."""
+
+    @abstractmethod
+    def load(self):
+        """Tüm kataloğu DB_COLUMNS sırasıyla döndürür."""
+
+    @abstractmethod
+    def get_by_ean(self, ean):
+        """EAN'ı verilen satır (sözlük); yoksa None."""
+
+    @abstractmethod
+    def upsert_rows(self, rows):
+        """Satırları anahtarlarına göre ekler/günceller. Dönüş: yazılan satır sayısı."""
+
+    @abstractmethod
+    def delete_keys(self, keys):
+        """Anahtarı (EAN/title) verilen satırları siler. Dönüş: silinen anahtar sayısı."""
+
+    @abstractmethod
+    def version(self):
+        """Ucuz sürüm imzası; depo değiştiğinde farklı bir değer döner (yoklanamazsa None)."""
+
+    def load_numeric(self):
+        """Depo sayıları tipli saklıyorsa `build_numeric_catalog` biçiminde sayısal katalog;
+        değilse None (sayılar metinden ayrıştırılır)."""
+        return None
+
+class SupabaseBackend(StorageBackend):
+    """Supabase `products` tablosu. Yazımlar `sync_products` ile aynı kurallarla yapılır."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def load(self):
+        return load_supabase_catalog(self.client)
+
+    def get_by_ean(self, ean):
+        rows = _with_retry(
+            lambda: self.client.table("products").select(",".join(DB_COLUMNS)).eq("ean", str(ean)).limit(1).execute().data or [],
+            f"products[ean={ean}]",
+        )
+        return rows[0] if rows else None
+
+    def upsert_rows(self, rows):
+        return sync_products(self.client, rows, pd.DataFrame(columns=DB_COLUMNS))["yazilan"]
+
+    def delete_keys(self, keys):
+        keys = [str(k) for k in keys]
+        tasks = []
+        for i in range(0, len(keys), SYNC_DELETE_BATCH):
+            batch = keys[i:i + SYNC_DELETE_BATCH]
+            tasks.append((f"delete ean[{i}]", lambda k=batch: len(
+                self.client.table("products").delete().filter("ean", "in", postgrest_in(k)).execute().data or [])))
+            tasks.append((f"delete title[{i}]", lambda k=batch: len(
+                self.client.table("products").delete().filter("title", "in", postgrest_in(k)).or_("ean.is.null,ean.eq.").execute().data or [])))
+        _run_batches(tasks)
+        return len(keys)
+
+    def version(self):
+        try:
+            res = self.client.table("products").select("updated_at", count="exact").order("updated_at", desc=True).limit(1).execute()
+            return ("supabase", res.count, (res.data or [{}])[0].get("updated_at"))
+        except Exception:
             try:
-                res = sb.table("products").select("*").execute()
-                rows = res.data or []
-                df = pd.DataFrame(rows)
-                if df.empty:
-                    return pd.DataFrame(columns=DB_COLUMNS)
-                # Eski veriden yeni kolona geriye dönük eşleme
-                if 'hava_tr_de_navlun' not in df.columns and 'tr_de_navlun' in df.columns:
-                    df['hava_tr_de_navlun'] = df['tr_de_navlun']
-                # Eksik kolonları tamamla ve sıralamayı koru
-                for c in DB_COLUMNS:
-                    if c not in df.columns:
-                        df[c] = ""
-                df = df[DB_COLUMNS]
-                return df
+                # Değişiklik takibi olmayan eski şema: yalnızca satır sayısı
+                return ("supabase", self.client.table("products").select("id", count="exact").limit(1).execute().count, None)
             except Exception:
-                return pd.DataFrame(columns=DB_COLUMNS)
+                mark_supabase_failed()
+                return None
 
-    # Geriye dönüş: yerel CSV
-    if os.path.exists(CSV_FILE):
+def read_catalog_csv(source):
+    """Katalog CSV'sini okur: katalog kolonları açık şemayla metin olarak alınır (boş
+    hücreler "" kalır; boş hücreli EAN kolonu float'a dönüşüp anahtarları bozmaz).
+    pyarrow varsa dosya blok blok, çok iş parçacıklı Arrow okuyucusuyla ayrıştırılır."""
+    if pacsv is None:
+        return pd.read_csv(source, dtype=str, keep_default_na=False)
+    metin = {c: pa.string() for c in DB_COLUMNS + ['tr_de_navlun']}
+    table = pacsv.read_csv(
+        source,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=CSV_READ_BLOCK_BYTES),
+        convert_options=pacsv.ConvertOptions(
+            column_types=metin, strings_can_be_null=False, quoted_strings_can_be_null=False,
+        ),
+    )
+    return table.to_pandas()
+
+class CsvBackend(StorageBackend):
+    """Eski düz dosya deposu: her yazım tüm dosyayı yeniden yazar, aramalar tam taramadır."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return pd.DataFrame(columns=DB_COLUMNS)
         try:
-            df = pd.read_csv(CSV_FILE)
-            # Eski veriden yeni kolona geriye dönük eşleme
-            if 'hava_tr_de_navlun' not in df.columns and 'tr_de_navlun' in df.columns:
-                df['hava_tr_de_navlun'] = df['tr_de_navlun']
-            # Eksik kolonları garantiye al
-            for c in DB_COLUMNS:
-                if c not in df.columns:
-                    df[c] = ""
-            df = df[[c for c in DB_COLUMNS if c in df.columns]]
-            return df
+            return _normalize_catalog(read_catalog_csv(self.path))
         except Exception:
             return pd.DataFrame(columns=DB_COLUMNS)
-    return pd.DataFrame(columns=DB_COLUMNS)
 
-def persist_df(df: pd.DataFrame):
-    """DataFrame'i kalıcı depoya yazar ve cache'i temizler.
-    Supabase varsa tabloyu yeni verilerle eşitler; yoksa CSV'ye yazar.
-    """
+    def get_by_ean(self, ean):
+        df = self.load()
+        hit = df[df['ean'].astype(str).str.strip() == str(ean).strip()]
+        return hit.iloc[0].to_dict() if len(hit.index) else None
+
+    def upsert_rows(self, rows):
+        df = self.load()
+        rows = _normalize_catalog(rows)
+        new_keys = product_keys(rows)
+        rows = rows[~new_keys.duplicated(keep="last").to_numpy()]
+        new_keys = product_keys(rows)
+        keys = product_keys(df)
+        # Var olan satırlar yerinde güncellenir (sıra korunur), yeniler sona eklenir
+        hit = keys.isin(new_keys).to_numpy()
+        if hit.any():
+            df = df.astype(object)
+            df.loc[hit, DB_COLUMNS] = rows.set_axis(new_keys.to_numpy()).loc[keys[hit].to_numpy(), DB_COLUMNS].to_numpy()
+        df = pd.concat([df, rows[~new_keys.isin(keys).to_numpy()]], ignore_index=True)
+        df.to_csv(self.path, index=False)
+        return len(rows.index)
+
+    def delete_keys(self, keys):
+        keys = {str(k) for k in keys}
+        df = self.load()
+        drop = product_keys(df).isin(keys).to_numpy()
+        if drop.any():
+            df[~drop].to_csv(self.path, index=False)
+        return int(drop.sum())
+
+    def version(self):
+        try:
+            st_ = os.stat(self.path)
+            return ("csv", st_.st_mtime_ns, st_.st_size)
+        except OSError:
+            return ("csv", None, None)
+
+class ParquetBackend(StorageBackend):
+    """Yerel sütunlu depo (bkz. `write_catalog_parquet`). Okumalar bellek eşlemelidir;
+    fiyatlama için yalnızca anahtar ve sayısal kolonlar okunur (`load_numeric`).
+    Yazımlar dosyayı Arrow tablosu üzerinde (metne dönmeden) atomik yeniden yazar;
+    var olan satırlar yerinde güncellenir, yeniler sona eklenir.
+    Dosya ilk kez oluşturulurken `import_csv` dosyası varsa içeri aktarılır."""
+
+    def __init__(self, path, import_csv=None):
+        self.path = path
+        if not os.path.exists(path) and import_csv and os.path.exists(import_csv):
+            try:
+                df = read_catalog_csv(import_csv)
+                write_catalog_parquet(df, path)
+                logger.info("%s Parquet deposuna aktarıldı: %d satır", import_csv, len(df.index))
+            except Exception as e:
+                logger.warning("%s Parquet deposuna aktarılamadı: %s", import_csv, e)
+
+    def _table(self, columns=None):
+        return read_catalog_table(self.path, columns=columns) if os.path.exists(self.path) else None
+
+    def _keys(self):
+        """Dosyadaki satır anahtarları (Arrow metin dizisi)."""
+        table = self._table(columns=['title', 'ean'])
+        return pa.array(product_keys(pd.DataFrame({c: _arrow_text(table.column(c)) for c in ('title', 'ean')})), type=pa.string())
+
+    def load(self):
+        table = self._table()
+        if table is None:
+            return pd.DataFrame(columns=DB_COLUMNS)
+        return _normalize_catalog(catalog_from_arrow(table))
+
+    def load_numeric(self):
+        table = self._table(columns=['title', 'ean'] + _numeric_columns())
+        return None if table is None else numeric_from_arrow(table)
+
+    def get_by_ean(self, ean):
+        if not os.path.exists(self.path):
+            return None
+        hit = pq.read_table(self.path, filters=[("ean", "==", str(ean).strip())], memory_map=True)
+        return _normalize_catalog(catalog_from_arrow(hit)).iloc[0].to_dict() if hit.num_rows else None
+
+    def upsert_rows(self, rows):
+        rows = _normalize_catalog(rows)
+        new_keys = product_keys(rows)
+        rows = rows[~new_keys.duplicated(keep="last").to_numpy()]
+        new_keys = product_keys(rows)
+        yeni = catalog_arrow_table(rows)
+        table = self._table()
+        if table is None:
+            write_catalog_parquet(rows, self.path)
+            return len(rows.index)
+        if table.schema != yeni.schema:
+            table = catalog_arrow_table(catalog_from_arrow(table))
+        keys, new_keys = self._keys(), pa.array(new_keys, type=pa.string())
+        # Satır i için alınacak konum: güncellenen anahtarlar yeni satıra, diğerleri kendine
+        hedef = pc.fill_null(pc.index_in(keys, value_set=new_keys), -1).to_numpy()
+        secim = np.where(hedef >= 0, table.num_rows + hedef, np.arange(table.num_rows))
+        eklenen = table.num_rows + np.flatnonzero(~pc.is_in(new_keys, value_set=keys).to_numpy(zero_copy_only=False))
+        table = pa.concat_tables([table, yeni]).take(np.concatenate([secim, eklenen]))
+        self._write(table)
+        return len(rows.index)
+
+    def delete_keys(self, keys):
+        keys = {str(k) for k in keys}
+        table = self._table()
+        if table is None or not keys:
+            return 0
+        drop = pc.is_in(self._keys(), value_set=pa.array(list(keys), type=pa.string())).to_numpy(zero_copy_only=False)
+        if drop.any():
+            self._write(table.filter(pa.array(~drop)))
+        return int(drop.sum())
+
+    def _write(self, table):
+        tmp = f"{self.path}.tmp"
+        pq.write_table(table, tmp)
+        os.replace(tmp, self.path)
+
+    def version(self):
+        try:
+            st_ = os.stat(self.path)
+            return ("parquet", st_.st_mtime_ns, st_.st_size)
+        except OSError:
+            return ("parquet", None, None)
+
+class SqliteBackend(StorageBackend):
+    """Yerel SQLite deposu (WAL). `key` (EAN, yoksa title) tekil indekslidir; `ean` ve
+    `title` indeksleri nokta okumalar içindir. Her yazım `catalog_meta.version` sayacını
+    aynı işlemde artırır; sürüm yoklaması tek satırlık bir okumadır.
+    Veritabanı ilk kez oluşturulurken `import_csv` dosyası varsa içeri aktarılır."""
+
+    def __init__(self, path, import_csv=None):
+        self.path = path
+        with self._connect() as con:
+            con.execute("pragma journal_mode=wal")
+            con.execute(
+                "create table if not exists products (id integer primary key, key text not null, "
+                + ", ".join(f"{c} text not null default ''" for c in DB_COLUMNS)
+                + ", updated_at text not null default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')))"
+            )
+            con.execute("create unique index if not exists products_key_idx on products(key)")
+            con.execute("create index if not exists products_ean_idx on products(ean)")
+            con.execute("create index if not exists products_title_idx on products(title)")
+            con.execute("create table if not exists catalog_meta (id integer primary key check (id = 1), version integer not null)")
+            con.execute("insert or ignore into catalog_meta (id, version) values (1, 0)")
+            bos = con.execute("select version from catalog_meta").fetchone()[0] == 0
+        if bos and import_csv and os.path.exists(import_csv):
+            try:
+                df = read_catalog_csv(import_csv)
+                n = self._write(_normalize_catalog(df).fillna("").astype(str))
+                logger.info("%s SQLite deposuna aktarıldı: %d satır", import_csv, n)
+            except Exception as e:
+                logger.warning("%s SQLite deposuna aktarılamadı: %s", import_csv, e)
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=30)
+        con.execute("pragma synchronous=normal")
+        return con
+
+    def _write(self, frame):
+        """Metin tablosunu anahtarına göre ekler/günceller (tek işlem)."""
+        keys = product_keys(frame)
+        son = ~keys.duplicated(keep="last").to_numpy()
+        frame, keys = frame[son], keys.to_numpy()[son]
+        if not len(keys):
+            return 0
+        kolonlar = ", ".join(DB_COLUMNS)
+        guncelle = ", ".join(f"{c} = excluded.{c}" for c in DB_COLUMNS)
+        sql = (
+            f"insert into products (key, {kolonlar}) values ({', '.join('?' * (len(DB_COLUMNS) + 1))}) "
+            f"on conflict(key) do update set {guncelle}, updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')"
+        )
+        con = self._connect()
+        try:
+            with con:
+                con.executemany(sql, ((k, *row) for k, row in zip(keys, frame[DB_COLUMNS].itertuples(index=False, name=None))))
+                con.execute("update catalog_meta set version = version + 1")
+        finally:
+            con.close()
+        return len(keys)
+
+    def _query(self, sql, args=()):
+        con = self._connect()
+        try:
+            return pd.read_sql_query(sql, con, params=args)
+        finally:
+            con.close()
+
+    def load(self):
+        return _normalize_catalog(self._query(f"select {', '.join(DB_COLUMNS)} from products order by id"))
+
+    def get_by_ean(self, ean):
+        hit = self._query(f"select {', '.join(DB_COLUMNS)} from products where ean = ? limit 1", (str(ean).strip(),))
+        return hit.iloc[0].to_dict() if len(hit.index) else None
+
+    def upsert_rows(self, rows):
+        return self._write(_sync_frame(rows))
+
+    def delete_keys(self, keys):
+        keys = [str(k) for k in keys]
+        if not keys:
+            return 0
+        con = self._connect()
+        try:
+            with con:
+                silinen = 0
+                for i in range(0, len(keys), SQLITE_BATCH):
+                    batch = keys[i:i + SQLITE_BATCH]
+                    silinen += con.execute(f"delete from products where key in ({', '.join('?' * len(batch))})", batch).rowcount
+                con.execute("update catalog_meta set version = version + 1")
+        finally:
+            con.close()
+        return silinen
+
+    def version(self):
+        try:
+            con = self._connect()
+            try:
+                return ("sqlite", con.execute("select version from catalog_meta").fetchone()[0])
+            finally:
+                con.close()
+        except sqlite3.Error:
+            return None
+
+@st.cache_resource(show_spinner=False)
+def local_backend():
+    """Supabase yokken kullanılan yerel depo (LOCAL_STORAGE)."""
+    if LOCAL_STORAGE == "csv":
+        return CsvBackend(CSV_FILE)
+    if LOCAL_STORAGE == "parquet" and pq is not None:
+        return ParquetBackend(PARQUET_FILE, import_csv=CSV_FILE)
+    return SqliteBackend(SQLITE_FILE, import_csv=CSV_FILE)
+
+def storage_backend():
+    """Etkin katalog deposu: Supabase (secrets ve client varsa), yoksa yerel depo."""
     if _supabase_enabled():
         sb = _get_supabase_client()
         if sb is not None:
-            try:
-                # Standart kolon setini uygula ve türetilmiş alanları güncelle
-                df2 = df.copy()
-                # Backfill: eski kolondan yeni kolona
-                if 'hava_tr_de_navlun' not in df2.columns and 'tr_de_navlun' in df2.columns:
-                    df2['hava_tr_de_navlun'] = df2['tr_de_navlun']
-                for c in DB_COLUMNS:
-                    if c not in df2.columns:
-                        df2[c] = ""
-                # Türetilmiş alanlar: kara_tr_de_navlun = tr_ne_navlun + ne_de_navlun
-                try:
-                    df2['kara_tr_de_navlun'] = (
-                        df2.apply(lambda r: clean_euro_value(r.get('tr_ne_navlun', 0)) +
-                                              clean_euro_value(r.get('ne_de_navlun', 0)), axis=1)
-                        .apply(lambda v: f"€{float(v):.2f}")
-                    )
-                except Exception:
-                    pass
-                # Türetilmiş alan: hava_tr_de_navlun = express_kargo + ddp (varsa)
+            return SupabaseBackend(sb)
+    return local_backend()
+
+def write_rows(backend, df, dirty_keys=None):
+    """`df`'i depoya satır düzeyinde yazar: `dirty_keys` verilirse yalnızca bu anahtarların
+    son hali (güncellenen satırlar / silinen anahtarlar), verilmezse depodaki tabloyla fark
+    (tüm satırlar yazılır, depoda olup `df`'te olmayanlar silinir).
+    Dönüş: {"yazilan": n, "silinen": m}."""
+    keys = product_keys(df)
+    if dirty_keys is None:
+        rows = df
+        silinecek = set(product_keys(backend.load())) - set(keys)
+    else:
+        dirty = {str(k) for k in dirty_keys}
+        rows = df[keys.isin(dirty).to_numpy()]
+        silinecek = dirty - set(keys)
+    yazilan = backend.upsert_rows(rows) if len(rows.index) else 0
+    silinen = backend.delete_keys(sorted(silinecek)) if silinecek else 0
+    return {"yazilan": yazilan, "silinen": silinen}
+
+def _write_op(df, dirty_keys):
+    """Kaydı günlüğe yazılabilir bir işleme çevirir: `dirty_keys` verilirse yalnızca bu
+    anahtarların son hali (güncellenen satırlar / silinen anahtarlar), verilmezse tam tablo."""
+    if dirty_keys is None:
+        return {"full": _sync_frame(df).to_dict(orient="records"), "upsert": [], "delete": []}
+    dirty = {str(k) for k in dirty_keys}
+    keys = product_keys(df)
+    upsert = _sync_frame(df[keys.isin(dirty).to_numpy()])
+    state = _catalog_state()
+    with state["lock"]:
+        snap = state["versions"].get(state["version"])
+    if snap is None:
+        return {"full": _sync_frame(df).to_dict(orient="records"), "upsert": [], "delete": []}
+    old = snap["raw"]
+    removed = dirty - set(keys)
+    delete = _sync_frame(old[product_keys(old).isin(removed).to_numpy()])[["title", "ean"]]
+    return {"full": None, "upsert": upsert.to_dict(orient="records"), "delete": delete.to_dict(orient="records")}
+
+def _op_summary(op):
+    if op["full"] is not None:
+        return f"Tam senkronizasyon ({len(op['full'])} satır)"
+    return f"{len(op['upsert'])} satır yazılacak, {len(op['delete'])} satır silinecek"
+
+def _coalesce_writes(ops):
+    """İşlemleri sırayla birleştirir: her anahtarın yalnızca son hali kalır; tam tablo
+    yazımı kendinden önceki her şeyi geçersiz kılar. Dönüş: (hedef, depodaki) çerçeveleri
+    ya da tam yazımda (hedef, None)."""
+    full = None
+    son = OrderedDict()
+    for op in ops:
+        if op["full"] is not None:
+            full = op["full"]
+            son.clear()
+        for kind in ("delete", "upsert"):
+            rows = pd.DataFrame(op[kind], columns=DB_COLUMNS if kind == "upsert" else ["title", "ean"])
+            for key, row in zip(product_keys(rows), op[kind]):
+                son.pop(key, None)
+                son[key] = (kind, row)
+    upsert = [row for kind, row in son.values() if kind == "upsert"]
+    delete = [row for kind, row in son.values() if kind == "delete"]
+    if full is None:
+        return pd.DataFrame(upsert, columns=DB_COLUMNS), pd.DataFrame(delete, columns=DB_COLUMNS)
+    target = pd.DataFrame(full, columns=DB_COLUMNS)
+    if son:
+        target = pd.concat([target[~product_keys(target).isin(son.keys()).to_numpy()],
+                            pd.DataFrame(upsert, columns=DB_COLUMNS)], ignore_index=True)
+    return target, None
+
+def _journal_append(entries, path=WRITE_JOURNAL_FILE):
+    """Günlüğe satır ekler ve diske zorlar (yeniden başlatmada hiçbir yazım kaybolmasın)."""
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+def _journal_pending(path=WRITE_JOURNAL_FILE):
+    """Günlükte yazıldı olarak işaretlenmemiş işlemler (sıra numarasıyla, sırayla)."""
+    ops = OrderedDict()
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
                 try:
-                    sums = (
-                        df2.apply(lambda r: clean_euro_value(r.get('express_kargo', 0)) +
-                                              clean_euro_value(r.get('ddp', 0)), axis=1)
-                    )
-                    # Yalnızca toplam > 0 ise üzerine yaz
-                    df2['hava_tr_de_navlun'] = [
-                        f"€{float(s):.2f}" if float(s) > 0 else (r if isinstance(r, str) and r != '' else f"€0.00")
-                        for s, r in zip(sums, df2.get('hava_tr_de_navlun', ''))
-                    ]
-                except Exception:
-                    pass
-                df2 = df2[DB_COLUMNS]
-                df2 = df2.fillna("")
-                # Supabase şemasında metin kolonları kullanıldığı için string'e çevir
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # yarım kalmış son satır
+                if "op" in entry:
+                    ops[entry["seq"]] = entry
+                elif entry.get("durum") == "yazıldı":
+                    ops.pop(entry["seq"], None)
+    except FileNotFoundError:
+        pass
+    return ops
+
+@st.cache_resource(show_spinner=False)
+def _write_queue():
+    """Süreç genelinde arka plan yazım kuyruğu. Oluşturulurken günlükte kalan (önceki
+    süreçte yazılamamış) işlemler yeniden kuyruğa alınır."""
+    wq = {
+        "queue": queue.Queue(maxsize=WRITE_QUEUE_MAX),
+        "lock": threading.Lock(),
+        "journal_lock": threading.Lock(),
+        "seq": 0,
+        "writes": OrderedDict(),  # sıra → {durum, aciklama, zaman, hata, sonuc}
+        "failed": OrderedDict(),  # sıra → işlem (yeniden denenmeyi bekler)
+        "thread": None,
+    }
+    bekleyen = _journal_pending() if _supabase_enabled() else {}
+    if bekleyen:
+        wq["seq"] = max(bekleyen)
+        for seq, entry in bekleyen.items():
+            _track_write(wq, seq, "bekliyor", f"{_op_summary(entry['op'])} (günlükten)")
+            try:
+                wq["queue"].put_nowait((seq, entry["op"]))
+            except queue.Full:
+                wq["failed"][seq] = entry["op"]
+                _track_write(wq, seq, "hata", hata="kuyruk dolu; yeniden denemeyi bekliyor")
+        _ensure_writer(wq)
+        logger.info("Yazım günlüğünden %d bekleyen işlem yeniden kuyruğa alındı", len(bekleyen))
+    return wq
+
+def _track_write(wq, seq, durum, aciklama=None, hata=None, sonuc=None):
+    with wq["lock"]:
+        kayit = wq["writes"].get(seq) or {"aciklama": aciklama, "zaman": datetime.now()}
+        kayit.update(durum=durum, hata=hata, sonuc=sonuc)
+        wq["writes"][seq] = kayit
+        wq["writes"].move_to_end(seq)
+        while len(wq["writes"]) > WRITE_STATUS_KEEP:
+            wq["writes"].popitem(last=False)
+
+def _flush_writes(batch):
+    """Birleştirilmiş işlemleri Supabase'e yazar; başarısızlıkta üstel bekleme ile yeniden dener."""
+    target, stored = _coalesce_writes([op for _, op in batch])
+    hata = None
+    for deneme in range(WRITE_MAX_ATTEMPTS):
+        try:
+            sb = _get_supabase_client()
+            if sb is None:
+                raise RuntimeError("Supabase client oluşturulamadı")
+            if stored is None:
+                if target.empty:
+                    raise RuntimeError("tam senkronizasyon atlandı: hedef boş (silme önlendi)")
+                stored = load_supabase_catalog(sb)
+            return sync_products(sb, target, stored), None
+        except Exception as e:
+            hata = e
+            mark_supabase_failed()
+            logger.warning("Arka plan yazımı başarısız (deneme %d/%d): %s", deneme + 1, WRITE_MAX_ATTEMPTS, e)
+            time.sleep(SUPABASE_RETRY_BACKOFF * 2 ** deneme)
+    return None, hata
+
+def _writer_loop(wq):
+    q = wq["queue"]
+    while True:
+        batch = [q.get()]
+        try:
+            # Kısa bir süre bekleyip art arda gelen düzenlemeleri aynı yazıma topla
+            time.sleep(WRITE_COALESCE_DELAY)
+            while True:
                 try:
-                    df2 = df2.astype(str)
-                except Exception:
-                    pass
+                    batch.append(q.get_nowait())
+                except queue.Empty:
+                    break
+            for seq, _ in batch:
+                _track_write(wq, seq, "yazılıyor")
+            sonuc, hata = _flush_writes(batch)
+            if hata is None:
+                with wq["journal_lock"]:
+                    _journal_append([{"seq": seq, "durum": "yazıldı"} for seq, _ in batch])
+                for seq, _ in batch:
+                    _track_write(wq, seq, "yazıldı", sonuc=sonuc)
+                # Kendi yazımımız depo imzasını değiştirdi; sonraki yoklama artımlı tazeler
+                _catalog_state()["probed_at"] = 0.0
+            else:
+                _fail_writes(wq, batch, hata)
+            _compact_journal(wq)
+        except Exception as e:
+            # Beklenmeyen hata (birleştirme, günlük, durum takibi) yazıcıyı durdurmasın:
+            # toplu işlem başarısızlara alınır, günlükte kalır ve yeniden denenebilir
+            logger.warning("Arka plan yazıcısında beklenmeyen hata: %s", e)
+            _fail_writes(wq, batch, e)
+
+def _fail_writes(wq, batch, hata):
+    with wq["lock"]:
+        for seq, op in batch:
+            wq["failed"][seq] = op
+    for seq, _ in batch:
+        try:
+            _track_write(wq, seq, "hata", hata=str(hata))
+        except Exception as e:
+            logger.warning("Yazım durumu güncellenemedi (#%s): %s", seq, e)
+
+def _compact_journal(wq):
+    """Kuyruk boşaldığında ve başarısız işlem yoksa günlüğü sıfırlar."""
+    with wq["journal_lock"]:
+        with wq["lock"]:
+            if not wq["queue"].empty() or wq["failed"]:
+                return
+            bekleyen = [s for s, w in wq["writes"].items() if w["durum"] in ("bekliyor", "yazılıyor")]
+        if not bekleyen:
+            try:
+                open(WRITE_JOURNAL_FILE, "w", encoding="utf-8").close()
+            except OSError:
+                pass
+
+def _ensure_writer(wq):
+    with wq["lock"]:
+        if wq["thread"] is None or not wq["thread"].is_alive():
+            wq["thread"] = threading.Thread(target=_writer_loop, args=(wq,), name="persist-writer", daemon=True)
+            wq["thread"].start()
+
+def enqueue_write(df, dirty_keys=None):
+    """Kaydı günlüğe yazıp arka plan kuyruğuna ekler; ağ senkronizasyonunu beklemez.
+    Kuyruk doluysa yer açılana kadar bekler (geri basınç). Dönüş: yazım sıra numarası."""
+    return enqueue_op(_write_op(df, dirty_keys))
+
+def enqueue_op(op):
+    """Hazır bir yazım işlemini ({full, upsert, delete}) günlüğe yazıp kuyruğa ekler."""
+    wq = _write_queue()
+    with wq["journal_lock"]:
+        with wq["lock"]:
+            wq["seq"] += 1
+            seq = wq["seq"]
+        _journal_append([{"seq": seq, "op": op}])
+        _track_write(wq, seq, "bekliyor", _op_summary(op))
+    _ensure_writer(wq)
+    wq["queue"].put((seq, op))
+    return seq
+
+def retry_failed_writes():
+    """Başarısız yazımları yeniden kuyruğa alır. Dönüş: kuyruğa alınan yazım sayısı."""
+    wq = _write_queue()
+    with wq["lock"]:
+        failed = list(wq["failed"].items())
+        wq["failed"].clear()
+    _ensure_writer(wq)
+    for seq, op in failed:
+        _track_write(wq, seq, "bekliyor")
+        wq["queue"].put((seq, op))
+    return len(failed)
+
+def write_status():
+    """Son yazımların durumu (en yeni önce): [{seq, durum, aciklama, zaman, hata, sonuc}]."""
+    wq = _write_queue()
+    with wq["lock"]:
+        return [dict(w, seq=s) for s, w in reversed(wq["writes"].items())]
+
+def writes_pending():
+    """Supabase'e henüz ulaşmamış (bekleyen, yazılmakta ya da başarısız) yazım varsa True.
+    Bu sürede veritabanı RPC'leri yazımdan önceki durumu döndürür; katalog sürümü ise
+    yazımı zaten içerir, bu yüzden özet/sayfa yerel katalogdan hesaplanmalıdır."""
+    if not _supabase_enabled():
+        return False
+    wq = _write_queue()
+    with wq["lock"]:
+        return bool(wq["failed"]) or any(w["durum"] in ("bekliyor", "yazılıyor") for w in wq["writes"].values())
 
+def persist_df(df: pd.DataFrame, dirty_keys=None, wait=False):
+    """DataFrame'i kalıcı depoya yazar ve katalog cache'ini günceller.
+    Supabase varsa yalnızca farkları yazar (`sync_products`); yoksa yerel depoya
+    (`local_backend`) satır düzeyinde yazar (`write_rows`).
+    Supabase yazımı varsayılan olarak arka plan kuyruğuna alınır (`enqueue_write`):
+    cache hemen güncellenir, ağ senkronizasyonu beklenmez. `wait=True` eşzamanlı yazar.
+    Karşılaştırma tabanı: `dirty_keys` verilirse cache'teki güncel katalog (depo aynası),
+    verilmezse depodan yeniden okunan satırlar (onarım/tam senkronizasyon).
+    `dirty_keys` (EAN/title) verilirse cache yalnızca bu satırlar için güncellenir;
+    verilmezse katalog bir sonraki okumada depodan tam yüklenir.
+    Dönüş: eşzamanlı Supabase senkronizasyon özeti, kuyrukta yazım sıra numarası (yerel depoda None).
+    """
+    stats = None
+    if _supabase_enabled():
+        sb = _get_supabase_client() if wait else None
+        if sb is not None or not wait:
+            try:
                 # Güvenlik: Boş dataset ile senkronizasyonu durdur (toplu silmeyi önle)
-                if df2.empty or len(df2.index) == 0:
+                if df.empty or len(df.index) == 0:
                     try:
                         if st.session_state.get('debug_mode', False):
                             st.warning("Senkronizasyon atlandı: kaynak dataset boş (silme önlendi)")
                     except Exception:
                         pass
-                    return
-
-                # Mevcut anahtarları al (EAN ve Title)
-                try:
-                    existing = sb.table("products").select("ean,title").execute().data or []
-                except Exception:
-                    existing = []
-                existing_eans = {str(r.get("ean")) for r in existing if str(r.get("ean", "")).strip() != ""}
-                existing_titles = {str(r.get("title")) for r in existing if str(r.get("title", "")).strip() != ""}
-
-                # Hedef anahtar kümeleri
-                target_eans = {str(x) for x in df2.get("ean", pd.Series([], dtype=str)).astype(str) if str(x).strip() != ""}
-                target_titles = {str(x) for x in df2.get("title", pd.Series([], dtype=str)).astype(str) if str(x).strip() != ""}
+                    return None
 
                 # Eğer hedefte hiç anahtar yoksa, muhtemelen yanlışlık — işlemi iptal et
-                if not target_eans and not target_titles:
+                if not product_keys(df).astype(str).str.strip().ne("").any():
                     try:
                         if st.session_state.get('debug_mode', False):
                             st.warning("Senkronizasyon atlandı: hedef anahtar setleri boş (silme önlendi)")
                     except Exception:
                         pass
-                    return
+                    return None
 
-                # Silinmesi gerekenler
-                to_delete_eans = list(existing_eans - target_eans)
-                to_delete_titles = list(existing_titles - target_titles)
-
-                # Sil: önce EAN'a göre, sonra EAN'siz satırlar için title'a göre
-                if to_delete_eans:
-                    sb.table("products").delete().in_("ean", to_delete_eans).execute()
-                if to_delete_titles:
-                    sb.table("products").delete().in_("title", to_delete_titles).execute()
-
-                # Ekle/Güncelle: basit strateji — önce mevcut eşleşenleri sil, sonra toplu insert
-                if target_eans:
-                    sb.table("products").delete().in_("ean", list(target_eans)).execute()
-                if target_titles:
-                    # EAN'siz kayıtlar için title bazlı silme (EAN'lılara dokunmaz)
-                    no_ean_titles = [t for t in target_titles if t]
-                    if no_ean_titles:
-                        sb.table("products").delete().in_("title", no_ean_titles).execute()
-
-                # Insert all rows
-                rows = df2.to_dict(orient="records")
-                if rows:
-                    # Supabase hatalarında paket büyüklüğü sorun olursa parçalayın
-                    chunk = 500
-                    for i in range(0, len(rows), chunk):
-                        sb.table("products").insert(rows[i:i+chunk]).execute()
-            except Exception:
-                # Sessiz düş; CSV'ye yaz
+                if not wait:
+                    stats = enqueue_write(df, dirty_keys)
+                    if dirty_keys is None:
+                        _install_catalog(_normalize_catalog(df))
+                    else:
+                        apply_catalog_changes(df, dirty_keys)
+                    return stats
+
+                stored = None
+                if dirty_keys is not None:
+                    state = _catalog_state()
+                    with state["lock"]:
+                        snap = state["versions"].get(state["version"])
+                    stored = snap["raw"] if snap is not None else None
+                if stored is None:
+                    stored = load_supabase_catalog(sb)
+                stats = sync_products(sb, df, stored)
                 try:
-                    df.to_csv(CSV_FILE, index=False)
+                    st.session_state['last_sync'] = stats
                 except Exception:
                     pass
+            except Exception:
+                mark_supabase_failed()
+                # Sessiz düş; yerel depoya yaz
+                try:
+                    write_rows(local_backend(), df, dirty_keys)
+                except Exception as e:
+                    logger.warning("Yerel depoya yazılamadı: %s", e)
     else:
         try:
-            df.to_csv(CSV_FILE, index=False)
-        except Exception:
-            pass
+            write_rows(local_backend(), df, dirty_keys)
+            # Kendi yazdığımız değişiklik cache'i geçersiz kılmasın
+            _catalog_state()["signature"] = probe_catalog_signature()
+        except Exception as e:
+            logger.warning("Yerel depoya yazılamadı: %s", e)
+    if dirty_keys is None:
+        invalidate_catalog()
+    else:
+        apply_catalog_changes(df, dirty_keys)
+    return stats
+
+def _key_positions(snap, keys):
+    """Anahtarların anlık görüntüdeki satır konumları (yoksa -1). Anahtar indeksi sürüm
+    başına bir kez kurulur; anahtarlar tekil değilse her anahtarın son satırı verilir."""
+    index = snap.get("key_index")
+    if index is None:
+        index = pd.Index(snap["keys"])
+        if not index.is_unique:
+            son = ~index.duplicated(keep="last")
+            index = pd.Series(np.flatnonzero(son), index=index[son])
+        snap["key_index"] = index
+    if isinstance(index, pd.Series):
+        return index.reindex(keys).fillna(-1).to_numpy(dtype=np.int64)
+    return index.get_indexer(keys)
+
+def get_products(keys):
+    """Anahtarları (EAN, yoksa title) verilen ürünlerin güncel satırları (DB_COLUMNS).
+    Cache'teki katalogdan okunur; cache'te olmayan EAN'lar depodan tek tek
+    (`get_by_ean`, indeksli) okunur. Bulunamayan anahtarlar atlanır."""
+    keys = [str(k) for k in keys]
+    _, snap = _catalog_snapshot()
+    pos = _key_positions(snap, keys)
+    found = snap["raw"].iloc[pos[pos >= 0]]
+    extra = []
+    for k in (k for k, p in zip(keys, pos) if p < 0):
+        try:
+            row = storage_backend().get_by_ean(k)
+        except Exception as e:
+            logger.warning("Ürün depodan okunamadı (%s): %s", k, e)
+            row = None
+        if row is not None:
+            extra.append(row)
+    if extra:
+        found = pd.concat([found, _normalize_catalog(pd.DataFrame(extra))], ignore_index=True)
+    return found.reset_index(drop=True)
+
+def _patch_catalog(rows, deleted):
+    """Satır düzeyindeki değişikliği (eklenen/güncellenen `rows`, silinen anahtarlar)
+    geçerli katalog sürümüne işleyip yeni sürüm olarak cache'e alır."""
+    state = _catalog_state()
+    with state["lock"]:
+        _, snap = _catalog_snapshot()
+        raw, keys = snap["raw"], snap["keys"]
+        row_keys = product_keys(rows).to_numpy()
+        pos = _key_positions(snap, row_keys)
+        var = pos >= 0
+        out = _replace_rows(raw, pos[var], rows[var]) if var.any() else raw
+        out_keys = keys
+        if (~var).any():
+            start = (int(out.index.max()) + 1) if len(out.index) else 0
+            yeni = rows[~var].set_axis(pd.RangeIndex(start, start + int((~var).sum())))
+            out = pd.concat([out, yeni[DB_COLUMNS]])
+            out_keys = np.concatenate([keys, row_keys[~var]])
+        if deleted:
+            kalan = ~pd.Index(out_keys).isin(list(deleted))
+            out, out_keys = out[kalan], out_keys[kalan]
+        v = apply_catalog_changes(out, set(row_keys) | set(deleted), keys=out_keys)
+        if out_keys is keys:
+            # Yalnızca güncelleme: satır sırası ve anahtarlar aynı, indeksler yeni sürüme taşınır
+            yeni = state["versions"][v]
+            if "key_index" in snap:
+                yeni["key_index"] = snap["key_index"]
+            if "title_order" in snap and out["title"].iloc[pos].equals(raw["title"].iloc[pos]):
+                yeni["title_order"] = snap["title_order"]
+        return v
+
+def write_product_rows(rows=None, deleted=()):
+    """Satır düzeyinde yazım: `rows` (DB_COLUMNS) anahtarına göre eklenir/güncellenir,
+    `deleted` anahtarları silinir. Depoya yalnızca bu satırlar için hedefli istekler gider
+    (Supabase: arka plan kuyruğu; yerel depo: tek upsert/delete) ve cache yalnızca bu
+    satırlar için güncellenir; maliyet katalog boyutundan bağımsızdır."""
+    rows = _sync_frame(rows if rows is not None else pd.DataFrame(columns=DB_COLUMNS))
+    row_keys = product_keys(rows)
+    son = ~row_keys.duplicated(keep="last").to_numpy()
+    rows, row_keys = rows[son], row_keys[son]
+    deleted = {str(k) for k in deleted} - set(row_keys)
+    if rows.empty and not deleted:
+        return None
+    seq = None
+    yerel = not _supabase_enabled()
+    if not yerel:
+        try:
+            silinen = get_products(deleted)[["title", "ean"]] if deleted else pd.DataFrame(columns=["title", "ean"])
+            op = {
+                "full": None,
+                "upsert": rows.to_dict(orient="records"),
+                "delete": _sync_frame(silinen)[["title", "ean"]].to_dict(orient="records"),
+            }
+            seq = enqueue_op(op)
+        except Exception as e:
+            mark_supabase_failed()
+            logger.warning("Yazım kuyruğa alınamadı, yerel depoya yazılıyor: %s", e)
+            yerel = True
+    if yerel:
+        try:
+            backend = local_backend()
+            if not rows.empty:
+                backend.upsert_rows(rows)
+            if deleted:
+                backend.delete_keys(sorted(deleted))
+            if not _supabase_enabled():
+                # Kendi yazdığımız değişiklik cache'i geçersiz kılmasın
+                _catalog_state()["signature"] = probe_catalog_signature()
+        except Exception as e:
+            logger.warning("Yerel depoya yazılamadı: %s", e)
+    _patch_catalog(rows, deleted)
     try:
-        load_csv_data.clear()
-    except Exception:
-        pass
+        log_product_changes(rows, sorted(deleted))
+    except Exception as e:
+        logger.warning("Değişiklik günlüğüne yazılamadı: %s", e)
+    return seq
+
+def insert_product(product):
+    """Tek ürün ekler (aynı anahtarlı ürün varsa üzerine yazar). Dönüş: ürün anahtarı."""
+    rows = _normalize_catalog(pd.DataFrame([product]))
+    write_product_rows(rows)
+    return str(product_keys(rows).iloc[0])
+
+def upsert_products(df):
+    """Birden çok ürünü anahtarlarına göre ekler/günceller (ör. CSV içe aktarımı)."""
+    return write_product_rows(_normalize_catalog(df))
+
+def update_products(changes):
+    """{anahtar (EAN, yoksa title): {kolon: değer}} değişikliklerini uygular; yalnızca
+    bu ürünler okunur ve yazılır. Dönüş: güncellenen ürün sayısı."""
+    changes = {str(k): v for k, v in changes.items()}
+    rows = get_products(changes)
+    if rows.empty:
+        return 0
+    keys = product_keys(rows)
+    for col in {c for fields in changes.values() for c in fields}:
+        if col in rows.columns:
+            rows[col] = rows[col].astype(object)
+    for i, key in enumerate(keys):
+        for col, val in changes[key].items():
+            if col in rows.columns:
+                rows.iat[i, rows.columns.get_loc(col)] = val
+    write_product_rows(rows)
+    return len(rows.index)
+
+def update_fields(ean, fields):
+    """Tek ürünün alanlarını günceller (`ean`: EAN, EAN'sız ürünlerde title).
+    Dönüş: ürün bulunduysa True."""
+    return update_products({str(ean): fields}) == 1
+
+def delete_products(eans):
+    """Anahtarları (EAN, yoksa title) verilen ürünleri siler. Dönüş: silinen ürün sayısı."""
+    rows = get_products(eans)
+    if rows.empty:
+        return 0
+    write_product_rows(deleted=set(product_keys(rows)))
+    return len(rows.index)
 
 def clean_euro_value(value):
     """Euro değerini temizler ve float'a çevirir.
@@ -373,90 +2111,747 @@ def clean_euro_value(value):
     except Exception:
         return 0.0
 
-def calculate_total_cost(row, params):
-    """İki farklı rota ile maliyet hesaplar: TR→NL→DE ve TR→DE"""
+_EURO_NUMBER_RE = r"-?(?:\d+\.?\d*|\.\d+)"
+
+def _parse_euro_arrow(values):
+    """`parse_euro_series` metin kuralları Arrow hesaplama çekirdekleriyle: metin dizisini
+    float64 dizisine çevirir, ayrıştırılamayan/boş değerler NaN olur. Tekrarlayan
+    değerler (aynı fiyat/navlun) sözlük kodlanıp her farklı değer bir kez ayrıştırılır."""
+    t = pa.array(values, type=pa.string(), from_pandas=True)
+    if isinstance(t, pa.ChunkedArray):
+        t = t.combine_chunks()
+    sozluk = t.dictionary_encode()
+    if 2 * len(sozluk.dictionary) <= len(t):
+        return pc.take(_parse_euro_text(sozluk.dictionary), sozluk.indices).to_numpy(zero_copy_only=False)
+    return _parse_euro_text(t).to_numpy(zero_copy_only=False)
+
+def _parse_euro_text(t):
+    # €, tırnak, boşluk ve diğer uygunsuz karakterler tek geçişte atılır (ayırıcı tespitini etkilemezler)
+    t = pc.replace_substring_regex(t, r"[^0-9.,-]", "")
+    # Son görülen ayırıcı virgülse (virgülden sonra nokta yoksa) ondalıktır
+    comma_decimal = pc.match_substring_regex(t, r",[^.]*$")
+    t = pc.if_else(
+        comma_decimal,
+        pc.replace_substring(pc.replace_substring(t, '.', ''), ',', '.'),
+        pc.replace_substring(t, ',', ''),
+    )
+    valid = pc.match_substring_regex(t, f"^(?:{_EURO_NUMBER_RE})$")
+    return pc.cast(pc.if_else(valid, t, pa.scalar(None, pa.string())), pa.float64())
+
+def parse_euro_series(values, errors="zero"):
+    """`clean_euro_value` ile aynı kuralları tüm kolona vektörel uygular.
+    errors="zero": ayrıştırılamayan/boş değerler 0.0 olur (clean_euro_value gibi).
+    errors="coerce": ayrıştırılamayan/boş değerler NaN kalır (doğrulama için).
+    """
+    s = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        out = s.astype(np.float64)
+        return out.fillna(0.0) if errors == "zero" else out
+    if pc is not None and isinstance(s.dtype, pd.StringDtype):
+        # Metin kolonu: tüm hücreler tek geçişte Arrow ile ayrıştırılır (boşlar NaN)
+        out = pd.Series(_parse_euro_arrow(s), index=s.index)
+        return out.fillna(0.0) if errors == "zero" else out
+
+    obj = s.astype(object)
+    out = np.full(len(obj), np.nan, dtype=np.float64)
+    is_text = (obj.map(type) == str).to_numpy()
+    # Sayısal hücreler (karışık tipli kolonlarda)
+    is_other = ~is_text & obj.notna().to_numpy()
+    if is_other.any():
+        out[is_other] = pd.to_numeric(obj[is_other], errors='coerce').to_numpy(dtype=np.float64)
+    # Metin hücreler: €, tırnak, boşluk temizliği ve ayırıcı tespiti
+    if is_text.any() and pc is not None:
+        out[is_text] = _parse_euro_arrow(obj[is_text].to_numpy())
+    elif is_text.any():
+        t = (obj[is_text].str.replace('€', '', regex=False)
+             .str.replace('"', '', regex=False)
+             .str.replace(' ', '', regex=False)
+             .str.strip())
+        # Son görülen ayırıcı virgülse ondalıktır (yalnız virgül durumu dahil)
+        comma_decimal = t.str.rfind(',') > t.str.rfind('.')
+        t = t.where(~comma_decimal, t.str.replace('.', '', regex=False).str.replace(',', '.', regex=False))
+        t = t.where(comma_decimal, t.str.replace(',', '', regex=False))
+        t = t.str.replace(r"[^0-9\.-]", "", regex=True)
+        valid = t.str.fullmatch(_EURO_NUMBER_RE).to_numpy(dtype=bool)
+        parsed = np.full(len(t), np.nan, dtype=np.float64)
+        parsed[valid] = t[valid].astype(np.float64).to_numpy()
+        out[is_text] = parsed
+    out = pd.Series(out, index=s.index)
+    return out.fillna(0.0) if errors == "zero" else out
+
+def _euro_column(df, col, fallback=None):
+    """Kolonu float dizisine çevirir (sayısal kolonlar olduğu gibi kullanılır);
+    kolon yoksa (varsa) yedek kolonu, o da yoksa 0 kullanır."""
+    if col not in df.columns and fallback is not None:
+        col = fallback
+    if col not in df.columns:
+        return np.zeros(len(df.index), dtype=np.float64)
+    return parse_euro_series(df[col]).to_numpy(dtype=np.float64)
+
+# Para tutarları hesap motorunda tam sayı sent (int64) olarak tutulur.
+# Yuvarlama kuralı (her yerde aynı): yarımlar sıfırdan uzağa (0,005 → 0,01; -0,005 → -0,01).
+# Yüzdeler 0,01 puan hassasiyete (baz puan) yuvarlanır; yüzde tutarı her kalem için ayrı
+# hesaplanıp sente yuvarlanır, toplamlar bu sentlerin tam sayı toplamıdır.
+
+def _round_half_away(values):
+    """Float diziyi yarımlar sıfırdan uzağa olacak şekilde int64'e yuvarlar."""
+    v = np.asarray(values, dtype=np.float64)
+    # İkili gösterim hatası (örn. 12.17*100 = 1216.9999…) için önce 1e-6'ya yuvarla
+    v = np.round(v, 6)
+    return (np.sign(v) * np.floor(np.abs(v) + 0.5)).astype(np.int64)
+
+def to_cents(values):
+    """Euro tutar(lar)ını int64 sente çevirir; NaN 0 sayılır."""
+    return _round_half_away(np.nan_to_num(np.asarray(values, dtype=np.float64) * 100, nan=0.0))
+
+def apply_rate(cents, percent):
+    """Sent tutar(lar)ına yüzde uygular: yüzde baz puana, sonuç sente yuvarlanır (tam sayı aritmetiği)."""
+    c = np.asarray(cents, dtype=np.int64)
+    bp = int(to_cents(percent))
+    pay = np.abs(c) * abs(bp)
+    return np.sign(c) * np.sign(bp) * ((pay + 5000) // 10000)
+
+def cents_to_euro(cents):
+    """Sent dizisini float euro'ya çevirir (yalnızca gösterim/uyumluluk için)."""
+    return np.asarray(cents, dtype=np.int64) / 100
+
+def format_cents(cents):
+    """Tek sent değerini kayıt biçimine çevirir: 1217 → "€12.17", -5 → "€-0.05"."""
+    c = int(cents)
+    isaret = "-" if c < 0 else ""
+    return f"€{isaret}{abs(c) // 100}.{abs(c) % 100:02d}"
+
+def format_euro(value):
+    """Euro tutarını sente yuvarlayıp kayıt biçiminde döndürür."""
+    return format_cents(to_cents(value))
+
+def _cents_column(df, col, fallback=None):
+    """Kolonu int64 sent dizisine çevirir (bkz. `_euro_column`)."""
+    return to_cents(_euro_column(df, col, fallback=fallback))
+
+def price_catalog(df, params):
+    """Tüm katalog için kayıtlı tüm rotaların maliyetini vektörel hesaplar.
+    Ürün × rota maliyet matrisi kurulur ve optimal rota tek bir argmin ile seçilir.
+    Tutarlar int64 sent olarak hesaplanır (vergi ve kesinti sente yuvarlanır), bu
+    yüzden toplamlar tamdır; float kolonlar bu sentlerin euro karşılığıdır.
+    Her rota için `<anahtar>_navlun`, `_temel_maliyet`, `_reklam_dahil`, `_vergi`,
+    `_pazaryeri_kesinti`, `_son_maliyet` kolonları; ayrıca optimal seçim, satış
+    fiyatı, kâr marjı, kâr marjı % ve ROI döndürülür (indeks `df` ile aynıdır).
+    Tam toplamlar için `satis_fiyati_cents`, `optimal_cost_cents`, `kar_marji_cents`
+    ve `cost_difference_cents` (int64) kolonları kullanılır.
+    """
+    n = len(df.index)
     # Ham maliyet – yalnızca EUR alanından alınır
-    ham_maliyet = clean_euro_value(row.get('ham_maliyet_euro', 0))
-    
+    ham_maliyet = _cents_column(df, 'ham_maliyet_euro')
     # Satış fiyatı (pazar yeri ve vergi bu fiyata göre hesaplanacak)
-    satis_fiyati = clean_euro_value(row.get('fiyat', 0))
-    
-    # Maliyet bileşenleri
-    ne_de_navlun = clean_euro_value(row.get('ne_de_navlun', 0))  # NL→DE navlun
-    tr_ne_navlun_field = clean_euro_value(row.get('tr_ne_navlun', 0))  # TR→NL toplam navlun
-    express_kargo = clean_euro_value(row.get('express_kargo', 0))
-    ddp = clean_euro_value(row.get('ddp', 0))
-    # TR→DE toplam navlun (hava) — yeni alan adı, eskiye geriye dönük destek
-    hava_tr_de_navlun_field = clean_euro_value(
-        row.get('hava_tr_de_navlun', row.get('tr_de_navlun', 0))
-    )
-    desi_val = clean_euro_value(row.get('desi', 0))
-    tr_de_navlun_from_table = get_tr_de_navlun_by_desi(desi_val) or 0.0
-    
-    # Reklam maliyeti
-    reklam_maliyeti = params['reklam_maliyeti']
-    
-    # ROTA 1: TR → NL → DE
-    # TR→NL segmenti: direkt girilen toplam değer kullanılır
-    tr_ne_navlun_final = tr_ne_navlun_field
-    tr_nl_de_navlun = tr_ne_navlun_final + ne_de_navlun
-    # Temel Maliyet = Ham + (TR-NL + NL-DE)
-    tr_nl_de_temel_maliyet = ham_maliyet + tr_nl_de_navlun
-    # Son Maliyet = Temel + Reklam + Vergi + Pazaryeri
-    tr_nl_de_vergi = (satis_fiyati * params['vergi_yuzdesi']) / 100
-    tr_nl_de_pazaryeri_kesinti = (satis_fiyati * params['pazaryeri_kesintisi']) / 100
-    tr_nl_de_reklam_dahil = tr_nl_de_temel_maliyet + params['reklam_maliyeti']
-    tr_nl_de_son_maliyet = tr_nl_de_reklam_dahil + tr_nl_de_vergi + tr_nl_de_pazaryeri_kesinti
-    
-    # ROTA 2: TR → DE (Direkt)
-    # TR→DE segmenti: hava (express_kargo + ddp) veya tablo değeri
-    tr_de_navlun_hesaplanan = express_kargo + ddp
-    # Hesaplamada express+ddp kullanılır (tablo değeri yalnızca referans)
-    if tr_de_navlun_hesaplanan > 0:
-        hava_tr_de_navlun_val = tr_de_navlun_hesaplanan
-    elif hava_tr_de_navlun_field > 0:
-        hava_tr_de_navlun_val = hava_tr_de_navlun_field
+    satis_fiyati = _cents_column(df, 'fiyat')
+
+    reklam_maliyeti = int(to_cents(params['reklam_maliyeti']))
+    # Vergi ve pazaryeri kesintisi tüm rotalarda satış fiyatına bağlıdır
+    vergi = apply_rate(satis_fiyati, params['vergi_yuzdesi'])
+    pazaryeri_kesinti = apply_rate(satis_fiyati, params['pazaryeri_kesintisi'])
+
+    # Ürün × rota matrisleri: Temel = Ham + Navlun; Son = Temel + Reklam + Vergi + Pazaryeri
+    columns = {}
+    navlun = np.zeros((n, len(ROUTES)), dtype=np.int64)
+    for j, route in enumerate(ROUTES):
+        for c in route["navlun"]:
+            navlun[:, j] += _cents_column(df, c)
+    temel = ham_maliyet[:, None] + navlun
+    reklam_dahil = temel + reklam_maliyeti
+    son_maliyet = reklam_dahil + vergi[:, None] + pazaryeri_kesinti[:, None]
+    for j, route in enumerate(ROUTES):
+        key = route["key"]
+        columns[f'{key}_navlun'] = cents_to_euro(navlun[:, j])
+        columns[f'{key}_temel_maliyet'] = cents_to_euro(temel[:, j])
+        columns[f'{key}_reklam_dahil'] = cents_to_euro(reklam_dahil[:, j])
+        columns[f'{key}_vergi'] = cents_to_euro(vergi)
+        columns[f'{key}_pazaryeri_kesinti'] = cents_to_euro(pazaryeri_kesinti)
+        columns[f'{key}_son_maliyet'] = cents_to_euro(son_maliyet[:, j])
+
+    # TR→DE hava navlunu (referans): express+ddp, yoksa kayıtlı alan, o da yoksa desi tablosu
+    tr_de_navlun_hesaplanan = _cents_column(df, 'express_kargo') + _cents_column(df, 'ddp')
+    hava_tr_de_navlun_field = _cents_column(df, 'hava_tr_de_navlun', fallback='tr_de_navlun')
+    desi_val = _euro_column(df, 'desi')
+    tr_de_navlun_from_table = to_cents(lookup_navlun(desi_val))
+    columns['hava_tr_de_navlun'] = cents_to_euro(np.where(
+        tr_de_navlun_hesaplanan > 0,
+        tr_de_navlun_hesaplanan,
+        np.where(hava_tr_de_navlun_field > 0, hava_tr_de_navlun_field, tr_de_navlun_from_table),
+    ))
+
+    # En uygun rotayı seç (eşitlikte kayıt sırasında önce gelen); tasarruf = en yakın alternatife fark
+    rows = np.arange(n)
+    best = np.argmin(son_maliyet, axis=1) if n else np.zeros(0, dtype=np.int64)
+    optimal_cost = son_maliyet[rows, best]
+    optimal_temel = temel[rows, best]
+    if len(ROUTES) > 1 and n:
+        ikinci = np.partition(son_maliyet, 1, axis=1)[:, 1]
+        cost_difference = ikinci - optimal_cost
     else:
-        hava_tr_de_navlun_val = tr_de_navlun_from_table
-    # Temel Maliyet = Ham + (Express + DDP)
-    tr_de_temel_maliyet = ham_maliyet + (express_kargo + ddp)
-    # Son Maliyet = Temel + Reklam + Vergi + Pazaryeri
-    tr_de_vergi = (satis_fiyati * params['vergi_yuzdesi']) / 100
-    tr_de_pazaryeri_kesinti = (satis_fiyati * params['pazaryeri_kesintisi']) / 100
-    tr_de_reklam_dahil = tr_de_temel_maliyet + params['reklam_maliyeti']
-    tr_de_son_maliyet = tr_de_reklam_dahil + tr_de_vergi + tr_de_pazaryeri_kesinti
-    
-    # En uygun rotayı seç
-    optimal_route = "TR→NL→DE" if tr_nl_de_son_maliyet <= tr_de_son_maliyet else "TR→DE"
-    optimal_cost = min(tr_nl_de_son_maliyet, tr_de_son_maliyet)
-    
-    return {
-        # TR→NL→DE Rotası
-        'tr_nl_de_temel_maliyet': tr_nl_de_temel_maliyet,
-        'tr_nl_de_navlun': tr_nl_de_navlun,
-        'tr_nl_de_reklam_dahil': tr_nl_de_reklam_dahil,
-        'tr_nl_de_vergi': tr_nl_de_vergi,
-        'tr_nl_de_pazaryeri_kesinti': tr_nl_de_pazaryeri_kesinti,
-        'tr_nl_de_son_maliyet': tr_nl_de_son_maliyet,
-        
-        # TR→DE Direkt Rota
-        'tr_de_temel_maliyet': tr_de_temel_maliyet,
-        'hava_tr_de_navlun': hava_tr_de_navlun_val,
-        'tr_de_reklam_dahil': tr_de_reklam_dahil,
-        'tr_de_vergi': tr_de_vergi,
-        'tr_de_pazaryeri_kesinti': tr_de_pazaryeri_kesinti,
-        'tr_de_son_maliyet': tr_de_son_maliyet,
-        
+        cost_difference = np.zeros(n, dtype=np.int64)
+
+    # Kârlılık: Kâr = Satış - Son Maliyet; ROI = Kâr / Temel Maliyet (optimal rota)
+    kar_marji = satis_fiyati - optimal_cost
+    with np.errstate(divide='ignore', invalid='ignore'):
+        kar_marji_yuzde = np.where(satis_fiyati > 0, kar_marji / satis_fiyati * 100, 0.0)
+        roi = np.where(optimal_temel > 0, kar_marji / optimal_temel, 0.0)
+
+    columns.update({
         # Optimal seçim
-        'optimal_route': optimal_route,
-        'optimal_cost': optimal_cost,
-        'cost_difference': abs(tr_nl_de_son_maliyet - tr_de_son_maliyet),
-        
+        'optimal_route': np.array(route_labels(), dtype=object)[best] if n else np.array([], dtype=object),
+        'optimal_cost': cents_to_euro(optimal_cost),
+        'optimal_temel_maliyet': cents_to_euro(optimal_temel),
+        'cost_difference': cents_to_euro(cost_difference),
+
         # Eski format uyumluluğu için
-        'reklam_maliyeti': reklam_maliyeti,
-        'son_maliyet': optimal_cost
+        'reklam_maliyeti': reklam_maliyeti / 100,
+        'son_maliyet': cents_to_euro(optimal_cost),
+
+        # Kârlılık
+        'satis_fiyati': cents_to_euro(satis_fiyati),
+        'kar_marji': cents_to_euro(kar_marji),
+        'kar_marji_yuzde': kar_marji_yuzde,
+        'roi': roi,
+
+        # Tam sayı sent karşılıkları (tam toplamlar için)
+        'satis_fiyati_cents': satis_fiyati,
+        'optimal_cost_cents': optimal_cost,
+        'kar_marji_cents': kar_marji,
+        'cost_difference_cents': cost_difference,
+    })
+    return pd.DataFrame(columns, index=df.index)
+
+def calculate_total_cost(row, params):
+    """Kayıtlı rotalarla maliyet hesaplar (tek ürün için `price_catalog`)."""
+    return price_catalog(pd.DataFrame([dict(row)]), params).iloc[0].to_dict()
+
+def with_price_columns(df, priced):
+    """Ürün tablosuna liste/export/analiz sekmelerinde kullanılan hesap kolonlarını ekler."""
+    out = df.copy()
+    out['Satış Fiyatı'] = priced['satis_fiyati']
+    for route in ROUTES:
+        out[f"{route['label']} Maliyet"] = priced[f"{route['key']}_son_maliyet"]
+    out['Optimal Rota'] = priced['optimal_route']
+    out['Son Maliyet'] = priced['optimal_cost']
+    out['Kar Marjı'] = priced['kar_marji']
+    out['Kar Marjı %'] = priced['kar_marji_yuzde'].round(2)
+    out['ROI'] = priced['roi'].round(2)
+    return out
+
+# Export sekmesi dosya biçimleri: etiket → (dosya uzantısı, MIME türü)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Excel": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "JSON": ("json", "application/json"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+def export_file(bicim, params, version=None):
+    """Export sekmesi dosyasının içeriği (bytes). CSV, Excel ve Parquet hesap kolonlarını
+    (`with_price_columns`, ROI hariç) içerir; JSON yalnızca katalog kolonlarıdır."""
+    if bicim == "JSON":
+        return catalog_json_bytes(version)
+    v, snap = _catalog_snapshot(version)
+    raw = snap["raw"]
+    export_df = with_price_columns(raw, load_priced_catalog(params, v)).drop(columns=['ROI'])
+    if bicim == "Parquet":
+        return catalog_parquet_bytes(raw, export_df[export_df.columns.difference(DB_COLUMNS, sort=False)])
+    if bicim == "Excel":
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+            export_df.to_excel(writer, sheet_name='Ürünler', index=False)
+            # Parametreler sheet'i
+            params_df = pd.DataFrame(list(params.items()), columns=['Parametre', 'Değer'])
+            params_df.to_excel(writer, sheet_name='Parametreler', index=False)
+        return buffer.getvalue()
+    return export_df.to_csv(index=False).encode("utf-8")
+
+# Analiz sekmesi kâr marjı aralıkları: (özet anahtarı, etiket) — analysis.sql ile aynı sınırlar
+KAR_ARALIKLARI = [
+    ("cok_yuksek", "Çok Yüksek (>40%)"),
+    ("yuksek", "Yüksek (30-40%)"),
+    ("orta", "Orta (20-30%)"),
+    ("dusuk", "Düşük (10-20%)"),
+    ("cok_dusuk", "Çok Düşük (0-10%)"),
+    ("zararli", "Zararlı (<0%)"),
+]
+
+def catalog_summary(priced, raw, top=10):
+    """Analiz sekmesi özetini yerelde hesaplar; `analysis_summary` RPC'siyle aynı yapıyı döndürür:
+    toplam/kârlı/zararlı sayıları, ortalama kâr %, aralık dağılımı, en kârlı/zararlı `top`
+    ürün, Pareto (%20 ürün) kârı ve rota bazlı tasarruf (tutarlar sent)."""
+    kar = priced['kar_marji_cents'].to_numpy(dtype=np.int64)
+    yuzde = priced['kar_marji_yuzde'].to_numpy(dtype=np.float64)
+    titles = raw['title'].to_numpy(dtype=object)
+    n = len(kar)
+    sira = np.arange(n)
+
+    def _liste(idx):
+        return [{"title": titles[i], "kar_cents": int(kar[i]), "kar_yuzde": float(yuzde[i])} for i in idx]
+
+    azalan = np.lexsort((sira, -kar))
+    n_top = max(1, int(n * 0.2))
+    rota_ozet = priced.groupby('optimal_route')['cost_difference_cents'].agg(['sum', 'count'])
+    return {
+        "toplam": n,
+        "karli": int((kar > 0).sum()),
+        "zararli": int((kar < 0).sum()),
+        "ortalama_kar_yuzde": float(yuzde.mean()) if n else None,
+        "dagilim": {
+            "cok_yuksek": int((yuzde > 40).sum()),
+            "yuksek": int(((yuzde >= 30) & (yuzde <= 40)).sum()),
+            "orta": int(((yuzde >= 20) & (yuzde < 30)).sum()),
+            "dusuk": int(((yuzde >= 10) & (yuzde < 20)).sum()),
+            "cok_dusuk": int(((yuzde >= 0) & (yuzde < 10)).sum()),
+            "zararli": int((yuzde < 0).sum()),
+        },
+        "en_karli": _liste(azalan[:top]),
+        "en_zararli": _liste(np.lexsort((sira, kar))[:top]),
+        "toplam_kar_cents": int(kar.sum()),
+        "pareto_adet": n_top,
+        "pareto_kar_cents": int(kar[azalan[:n_top]].sum()),
+        "rotalar": [
+            {
+                "rota": route["label"],
+                "tasarruf_cents": int(rota_ozet['sum'].get(route["label"], 0)),
+                "adet": int(rota_ozet['count'].get(route["label"], 0)),
+            }
+            for route in ROUTES
+        ],
+    }
+
+def analysis_rpc_args(params, top=10):
+    """`analysis_summary` RPC parametreleri (rota kaydı dahil)."""
+    return {
+        "p_reklam": float(params['reklam_maliyeti']),
+        "p_komisyon": float(params['pazaryeri_kesintisi']),
+        "p_vergi": float(params['vergi_yuzdesi']),
+        "p_routes": [{"label": r["label"], "navlun": list(r["navlun"])} for r in ROUTES],
+        "p_top": int(top),
+    }
+
+def load_analysis_summary(params, version=None):
+    """Analiz özeti. Supabase varsa veritabanında hesaplanır (analysis.sql) ve yalnızca özet
+    aktarılır; RPC yoksa/başarısızsa ya da yazımlar henüz veritabanına ulaşmadıysa
+    (`writes_pending`) yerel fiyatlanmış katalogdan hesaplanır.
+    Sonuç (katalog sürümü, parametreler) anahtarıyla cache'lenir."""
+    return _load_analysis_summary(catalog_version() if version is None else version, params_key(params))
+
+@st.cache_data(show_spinner=False, max_entries=ANALYSIS_CACHE_ENTRIES)
+def _load_analysis_summary(version, params_items):
+    params = dict(params_items)
+    if _supabase_enabled() and not writes_pending():
+        sb = _get_supabase_client()
+        if sb is not None:
+            try:
+                ozet = sb.rpc("analysis_summary", analysis_rpc_args(params)).execute().data
+                if isinstance(ozet, dict) and "toplam" in ozet:
+                    return ozet
+            except Exception as e:
+                logger.warning("Analiz özeti veritabanında hesaplanamadı, yerelde hesaplanıyor: %s", e)
+    return catalog_summary(load_priced_catalog(params, version), load_csv_data(version))
+
+# Ürün Listesi kâr durumu filtresi: (etiket → filtre değeri) — analysis.sql ile aynı değerler
+KAR_DURUMLARI = {
+    "Tümü": None,
+    "Pozitif": "pozitif",
+    "Negatif": "negatif",
+    "0'a yakın (±5%)": "sifira_yakin",
+}
+
+def product_filter(arama=None, kar_durumu=None, fiyat=(None, None), yuzde=(None, None), rotalar=None):
+    """Ürün Listesi filtresini (hashable değerli) sözlük olarak kurar. None olan alanlar
+    uygulanmaz; `rotalar` verilirse yalnızca optimal rotası bunlardan biri olan ürünler kalır."""
+    return {
+        "arama": arama or None,
+        "kar_durumu": kar_durumu,
+        "fiyat_min": fiyat[0],
+        "fiyat_max": fiyat[1],
+        "yuzde_min": yuzde[0],
+        "yuzde_max": yuzde[1],
+        "rotalar": None if rotalar is None else tuple(rotalar),
+    }
+
+def product_filter_mask(raw, priced, filtre):
+    """Filtreyi fiyatlanmış katalog üzerinde vektörel uygular (`product_list_rows` ile aynı
+    kurallar): arama başlıkta ya da EAN'da büyük/küçük harf duyarsız düz metin, fiyat sent
+    üzerinden, kâr % listede gösterilen 2 ondalıklı değer üzerinden karşılaştırılır."""
+    mask = np.ones(len(raw.index), dtype=bool)
+    if filtre.get("arama"):
+        mask &= (
+            raw['title'].astype(str).str.contains(filtre["arama"], case=False, regex=False, na=False)
+            | raw['ean'].fillna("").astype(str).str.contains(filtre["arama"], case=False, regex=False, na=False)
+        ).to_numpy()
+    satis = priced['satis_fiyati_cents'].to_numpy(dtype=np.int64)
+    kar = priced['kar_marji_cents'].to_numpy(dtype=np.int64)
+    yuzde = priced['kar_marji_yuzde'].to_numpy(dtype=np.float64).round(2)
+    if filtre.get("fiyat_min") is not None:
+        mask &= satis >= to_cents(filtre["fiyat_min"])
+    if filtre.get("fiyat_max") is not None:
+        mask &= satis <= to_cents(filtre["fiyat_max"])
+    if filtre.get("yuzde_min") is not None:
+        mask &= yuzde >= filtre["yuzde_min"]
+    if filtre.get("yuzde_max") is not None:
+        mask &= yuzde <= filtre["yuzde_max"]
+    if filtre.get("rotalar") is not None:
+        mask &= priced['optimal_route'].isin(list(filtre["rotalar"])).to_numpy()
+    durum = filtre.get("kar_durumu")
+    if durum == "pozitif":
+        mask &= kar > 0
+    elif durum == "negatif":
+        mask &= kar < 0
+    elif durum == "sifira_yakin":
+        mask &= np.abs(yuzde) <= 5
+    return mask
+
+def _list_stats(priced, mask):
+    """Filtrelenmiş listenin özeti (`product_list_stats` RPC'siyle aynı yapı)."""
+    satis = priced['satis_fiyati_cents'].to_numpy(dtype=np.int64)[mask]
+    kar = priced['kar_marji_cents'].to_numpy(dtype=np.int64)[mask]
+    yuzde = priced['kar_marji_yuzde'].to_numpy(dtype=np.float64)[mask].round(2)
+    if len(satis) == 0:
+        return {"adet": 0, "karli": 0, "ort_fiyat": None, "ort_kar": None, "ort_yuzde": None,
+                "fiyat_min": None, "fiyat_max": None, "yuzde_min": None, "yuzde_max": None}
+    return {
+        "adet": int(len(satis)),
+        "karli": int((kar > 0).sum()),
+        "ort_fiyat": float(satis.mean()) / 100,
+        "ort_kar": float(kar.mean()) / 100,
+        "ort_yuzde": float(yuzde.mean()),
+        "fiyat_min": int(satis.min()) / 100,
+        "fiyat_max": int(satis.max()) / 100,
+        "yuzde_min": float(yuzde.min()),
+        "yuzde_max": float(yuzde.max()),
     }
 
+def _title_order(version=None):
+    """Katalog satırlarının (title, anahtar) sırası ve sıralı anahtar listesi; yerel keyset
+    sayfalama için sürüm başına bir kez kurulur ve anlık görüntüde saklanır."""
+    _, snap = _catalog_snapshot(version)
+    sira = snap.get("title_order")
+    if sira is None:
+        titles = snap["raw"]['title'].fillna("").astype(str).to_numpy(dtype=object)
+        order = pd.DataFrame({"t": titles, "k": snap["keys"]}).sort_values(["t", "k"], kind="stable").index.to_numpy()
+        sira = {"order": order, "keys": list(zip(titles[order], snap["keys"][order]))}
+        snap["title_order"] = sira
+    return sira
+
+@st.cache_data(show_spinner=False, max_entries=PRODUCT_LIST_CACHE_ENTRIES)
+def _local_product_list(version, params_items, filter_items):
+    """Filtreye uyan satırların (title, anahtar) sırasındaki konumları ve listenin özeti."""
+    filtre = dict(filter_items)
+    priced = load_priced_catalog(dict(params_items), version)
+    mask = product_filter_mask(load_csv_data(version), priced, filtre)
+    return {"sira": np.flatnonzero(mask[_title_order(version)["order"]]), "ozet": _list_stats(priced, mask)}
+
+def _local_product_page(version, params_items, filter_items, after, limit):
+    liste = _local_product_list(version, params_items, filter_items)
+    sira = _title_order(version)
+    if after is None:
+        start = 0
+    elif after[0] == "yerel":
+        start = bisect.bisect_right(sira["keys"], (after[1], after[2]))
+    else:  # veritabanı imleci: aynı başlıktan devam et
+        start = bisect.bisect_left(sira["keys"], (after[1],))
+    i = int(np.searchsorted(liste["sira"], start))
+    secili = liste["sira"][i:i + limit + 1]
+    sonraki = None
+    if len(secili) > limit:
+        secili = secili[:limit]
+        sonraki = ("yerel",) + sira["keys"][secili[-1]]
+    return load_csv_data(version).iloc[sira["order"][secili]], sonraki
+
+def product_list_rpc_args(params, filtre):
+    """`product_page` / `product_list_stats` RPC parametreleri."""
+    args = analysis_rpc_args(params)
+    del args["p_top"]
+    args.update({
+        "p_arama": filtre.get("arama"),
+        "p_kar_durumu": filtre.get("kar_durumu"),
+        "p_fiyat_min": filtre.get("fiyat_min"),
+        "p_fiyat_max": filtre.get("fiyat_max"),
+        "p_yuzde_min": filtre.get("yuzde_min"),
+        "p_yuzde_max": filtre.get("yuzde_max"),
+        "p_rotalar": None if filtre.get("rotalar") is None else list(filtre["rotalar"]),
+    })
+    return args
+
+def load_product_page(params, filtre, after=None, limit=100, version=None):
+    """Filtrelenmiş ürün listesinin bir sayfası: (ham satırlar, sonraki sayfa imleci).
+    Sıra (title, anahtar) üzerindedir ve keyset ile sayfalanır; başlıksız (NULL) ürünler iki
+    yolda da boş başlık sayılır ve listede yer alır. `after` önceki sayfanın döndürdüğü
+    imleçtir (ilk sayfa için None), son sayfada sonraki imleç None olur.
+    Supabase varsa filtre ve sayfalama veritabanında `product_page` ile products_title_sort_idx
+    üzerinden yapılır; RPC yoksa/başarısızsa ya da Supabase'e henüz ulaşmamış yazım varsa
+    (`writes_pending`) süreçteki yerel sıralı indeks kullanılır — aksi halde yazımı içeren
+    sürümün anahtarı altına yazımdan önceki sayfa cache'lenirdi.
+    Sonuç (katalog sürümü, parametreler, filtre, imleç) anahtarıyla cache'lenir."""
+    v = catalog_version() if version is None else version
+    return _load_product_page(v, params_key(params), tuple(sorted(filtre.items())), after, int(limit))
+
+@st.cache_data(show_spinner=False, max_entries=PRODUCT_LIST_CACHE_ENTRIES)
+def _load_product_page(version, params_items, filter_items, after, limit):
+    if _supabase_enabled() and not writes_pending() and (after is None or after[0] == "db"):
+        sb = _get_supabase_client()
+        if sb is not None:
+            try:
+                args = product_list_rpc_args(dict(params_items), dict(filter_items))
+                args.update({
+                    "p_after_title": None if after is None else after[1],
+                    "p_after_id": None if after is None else after[2],
+                    "p_limit": limit + 1,
+                })
+                rows = sb.rpc("product_page", args).execute().data or []
+                sonraki = None
+                if len(rows) > limit:
+                    rows = rows[:limit]
+                    sonraki = ("db", rows[-1]["title"] or "", rows[-1]["id"])
+                return _normalize_catalog(pd.DataFrame(rows)), sonraki
+            except Exception as e:
+                logger.warning("Ürün listesi sayfası veritabanından alınamadı, yerel indeks kullanılıyor: %s", e)
+    return _local_product_page(version, params_items, filter_items, after, limit)
+
+def load_product_list_stats(params, filtre, version=None):
+    """Filtrelenmiş listenin özeti: adet, kârlı adet, ortalama fiyat/kâr/kâr %, fiyat ve
+    kâr % sınırları. Supabase varsa `product_list_stats` RPC'si, yoksa ya da bekleyen yazım
+    varken (`writes_pending`) yerel katalog kullanılır."""
+    v = catalog_version() if version is None else version
+    return _load_product_list_stats(v, params_key(params), tuple(sorted(filtre.items())))
+
+@st.cache_data(show_spinner=False, max_entries=PRODUCT_LIST_CACHE_ENTRIES)
+def _load_product_list_stats(version, params_items, filter_items):
+    if _supabase_enabled() and not writes_pending():
+        sb = _get_supabase_client()
+        if sb is not None:
+            try:
+                ozet = sb.rpc("product_list_stats", product_list_rpc_args(dict(params_items), dict(filter_items))).execute().data
+                if isinstance(ozet, dict) and "adet" in ozet:
+                    return ozet
+            except Exception as e:
+                logger.warning("Ürün listesi özeti veritabanında hesaplanamadı, yerelde hesaplanıyor: %s", e)
+    return _local_product_list(version, params_items, filter_items)["ozet"]
+
+def evaluate_scenario_grid(num_df, komisyon_values, reklam_values, vergi_values, max_cells=4_000_000):
+    """Komisyon × reklam × vergi ızgarasındaki tüm senaryoları tüm ürünler için
+    tek bir yayınlanmış (broadcast) dizi hesabıyla değerlendirir.
+    Vergi, kesinti ve reklam iki rotaya da aynı eklendiği için optimal rota
+    parametrelerden bağımsızdır; ürün başına optimal temel maliyet bir kez alınır.
+    Hesap `price_catalog` ile aynı tam sayı sent kurallarıyla yapılır (yüzde
+    tutarları ürün başına sente yuvarlanır), böylece senaryo toplamları tamdır.
+    Bellek sınırı için ürünler `max_cells` hücrelik parçalar halinde işlenir.
+    Dönüş: (toplam kâr €, kârlı ürün sayısı) — ikisi de (K, A, V) şeklinde.
+    """
+    komisyon_values = np.asarray(komisyon_values, dtype=np.float64)
+    vergi_values = np.asarray(vergi_values, dtype=np.float64)
+    a = to_cents(reklam_values)[None, :, None, None]
+    shape = (len(komisyon_values), a.shape[1], len(vergi_values))
+
+    base = price_catalog(num_df, {'reklam_maliyeti': 0.0, 'pazaryeri_kesintisi': 0.0, 'vergi_yuzdesi': 0.0})
+    satis = base['satis_fiyati_cents'].to_numpy(dtype=np.int64)
+    temel = base['optimal_cost_cents'].to_numpy(dtype=np.int64)
+
+    total_profit = np.zeros(shape, dtype=np.int64)
+    profitable = np.zeros(shape, dtype=np.int64)
+    step = max(1, max_cells // max(1, int(np.prod(shape))))
+    for start in range(0, len(satis), step):
+        s = satis[start:start + step]
+        # Ürün başına sente yuvarlanmış kesinti ve vergi tutarları
+        k = np.stack([apply_rate(s, x) for x in komisyon_values])[:, None, None, :]
+        v = np.stack([apply_rate(s, x) for x in vergi_values])[None, None, :, :]
+        # price_catalog ile aynı: Satış - (Temel + Reklam + Vergi + Pazaryeri)
+        kar = (s - temel[start:start + step]) - a - v - k
+        total_profit += kar.sum(axis=-1)
+        profitable += (kar > 0).sum(axis=-1)
+    return total_profit / 100, profitable
+
+def load_scenario_grid(komisyon_values, reklam_values, vergi_values, version=None):
+    """`evaluate_scenario_grid` sonucunu (katalog sürümü, ızgara) anahtarıyla cache'ler."""
+    return _load_scenario_grid(
+        catalog_version() if version is None else version,
+        tuple(float(x) for x in komisyon_values),
+        tuple(float(x) for x in reklam_values),
+        tuple(float(x) for x in vergi_values),
+    )
+
+@st.cache_data(show_spinner=False, max_entries=SCENARIO_GRID_CACHE_ENTRIES)
+def _load_scenario_grid(version, komisyon_values, reklam_values, vergi_values):
+    return evaluate_scenario_grid(load_numeric_catalog(version), komisyon_values, reklam_values, vergi_values)
+
+def risk_components():
+    """Monte Carlo'da oynatılabilen maliyet bileşenleri: rotaların navlun kolonları + reklam + komisyon."""
+    navlun_cols = list(dict.fromkeys(c for r in ROUTES for c in r["navlun"]))
+    return navlun_cols + ['reklam_maliyeti', 'pazaryeri_kesintisi']
+
+def _draw_factors(dagilim, oynaklik, size, rng):
+    """Ortalaması 1, standart sapması `oynaklik` olan negatif olmayan çarpanlar üretir."""
+    sigma = max(0.0, float(oynaklik))
+    if sigma == 0:
+        return np.ones(size, dtype=np.float64)
+    if dagilim == "Lognormal":
+        s2 = np.log1p(sigma ** 2)
+        return rng.lognormal(-s2 / 2, np.sqrt(s2), size)
+    if dagilim == "Üniform":
+        w = sigma * np.sqrt(3.0)
+        return np.clip(rng.uniform(1 - w, 1 + w, size), 0.0, None)
+    return np.clip(rng.normal(1.0, sigma, size), 0.0, None)
+
+def simulate_margin_risk(num_df, params, volatility, n_draws=10_000, seed=None, max_cells=4_000_000):
+    """Navlun, reklam ve komisyon oynaklığı altında ürün bazlı kâr dağılımını simüle eder.
+    `volatility`: {bileşen: (dağılım, göreli std)} — bileşenler `risk_components()`.
+    Her çekiliş piyasa genelinde bir ay gibi ele alınır: bileşen çarpanı tüm ürünlerde
+    ortaktır, her ürün o çekilişte en ucuz rotayı kullanır. Bellek sınırı için ürünler
+    `max_cells` hücrelik (ürün × çekiliş) parçalar halinde işlenir.
+    Dönüş: (ürün tablosu: zarar olasılığı ve P5/P50/P95 kâr, portföy toplam kâr dizisi).
+    """
+    n_draws = max(1, int(n_draws))
+    rng = np.random.default_rng(seed)
+    factors = {}
+    for c in risk_components():
+        dagilim, oynaklik = volatility.get(c, ("Normal", 0.0))
+        factors[c] = _draw_factors(dagilim, oynaklik, n_draws, rng)
+
+    satis = _euro_column(num_df, 'fiyat')
+    ham = _euro_column(num_df, 'ham_maliyet_euro')
+    vergi_orani = float(params['vergi_yuzdesi']) / 100
+    kom = float(params['pazaryeri_kesintisi']) / 100 * factors['pazaryeri_kesintisi']
+    reklam = float(params['reklam_maliyeti']) * factors['reklam_maliyeti']
+    routes = [
+        (np.column_stack([_euro_column(num_df, c) for c in r["navlun"]]) if r["navlun"] else None,
+         np.vstack([factors[c] for c in r["navlun"]]) if r["navlun"] else None)
+        for r in ROUTES
+    ]
+
+    n = len(satis)
+    olasilik = np.zeros(n, dtype=np.float64)
+    yuzdelik = np.zeros((3, n), dtype=np.float64)
+    beklenen = np.zeros(n, dtype=np.float64)
+    portfoy = np.zeros(n_draws, dtype=np.float64)
+    step = max(1, max_cells // n_draws)
+    for start in range(0, n, step):
+        sl = slice(start, start + step)
+        # Rotadan bağımsız kısım: Satış - Vergi - Komisyon - Reklam
+        kar = satis[sl, None] * (1 - vergi_orani - kom[None, :]) - reklam[None, :]
+        rota_min = None
+        for navlun, carpan in routes:
+            maliyet = navlun[sl] @ carpan if navlun is not None else np.zeros((len(satis[sl]), n_draws))
+            rota_min = maliyet if rota_min is None else np.minimum(rota_min, maliyet)
+        kar -= ham[sl, None] + rota_min
+        olasilik[sl] = (kar < 0).mean(axis=1)
+        beklenen[sl] = kar.mean(axis=1)
+        portfoy += kar.sum(axis=0)
+        # Parça artık gerekmediği için yüzdelikler yerinde (kopyasız) hesaplanır
+        yuzdelik[:, sl] = np.percentile(kar, [5, 50, 95], axis=1, overwrite_input=True)
+
+    urunler = pd.DataFrame({
+        'zarar_olasiligi': olasilik,
+        'kar_p5': yuzdelik[0],
+        'kar_p50': yuzdelik[1],
+        'kar_p95': yuzdelik[2],
+        'kar_beklenen': beklenen,
+    }, index=num_df.index)
+    return urunler, portfoy
+
+def load_margin_risk(params, volatility, n_draws, seed, version=None):
+    """`simulate_margin_risk` sonucunu (katalog sürümü, parametreler, dağılımlar) anahtarıyla cache'ler."""
+    return _load_margin_risk(
+        catalog_version() if version is None else version,
+        params_key(params),
+        tuple(sorted((c, str(d), float(s)) for c, (d, s) in volatility.items())),
+        int(n_draws),
+        int(seed),
+    )
+
+@st.cache_data(show_spinner=False, max_entries=RISK_SIM_CACHE_ENTRIES)
+def _load_margin_risk(version, params_items, volatility_items, n_draws, seed):
+    volatility = {c: (d, s) for c, d, s in volatility_items}
+    return simulate_margin_risk(load_numeric_catalog(version), dict(params_items), volatility, n_draws, seed)
+
+def product_keys(df):
+    """Satır anahtarları: EAN doluysa EAN, değilse ürün adı (title)."""
+    ean = df['ean'].astype(str).str.strip() if 'ean' in df.columns else pd.Series("", index=df.index)
+    has_ean = ean.ne("") & ean.ne("nan") & ean.ne("None")
+    if 'ean' in df.columns:
+        has_ean &= df['ean'].notna()
+    title = df['title'].astype(str) if 'title' in df.columns else pd.Series("", index=df.index)
+    return ean.where(has_ean, title)
+
+def round_up_cents(values):
+    """Fiyatları yukarı doğru en yakın sente yuvarlar (hedefin altına düşmemek için)."""
+    return np.ceil(np.round(np.asarray(values, dtype=np.float64) * 100, 6)) / 100
+
+def solve_target_prices(priced, params, hedef_marj=None, hedef_roi=None):
+    """Her ürün ve rota için başabaş fiyatını ve hedef fiyatı kapalı formda hesaplar.
+    Vergi ve kesinti satış fiyatında doğrusaldır: Son Maliyet(P) = Reklam Dahil + P·t,
+    t = (vergi + kesinti) / 100. Buna göre:
+      Başabaş:           P = Reklam Dahil / (1 - t)
+      Hedef kâr marjı m: P = Reklam Dahil / (1 - t - m/100)
+      Hedef ROI r:       P = (Reklam Dahil + r·Temel) / (1 - t)
+    `priced`, `price_catalog` çıktısıdır. Payda ≤ 0 ise hedefe ulaşılamaz (NaN).
+    """
+    t = (float(params['vergi_yuzdesi']) + float(params['pazaryeri_kesintisi'])) / 100
+    out = pd.DataFrame({'satis_fiyati': priced['satis_fiyati']}, index=priced.index)
+    for route in ROUTES:
+        prefix = route["key"]
+        reklam_dahil = priced[f'{prefix}_reklam_dahil'].to_numpy(dtype=np.float64)
+        temel = priced[f'{prefix}_temel_maliyet'].to_numpy(dtype=np.float64)
+        if hedef_roi is not None:
+            pay, payda = reklam_dahil + float(hedef_roi) * temel, 1 - t
+        else:
+            pay, payda = reklam_dahil, 1 - t - float(hedef_marj or 0.0) / 100
+        out[f'{prefix}_basabas'] = reklam_dahil / (1 - t) if 1 - t > 0 else np.nan
+        out[f'{prefix}_hedef'] = pay / payda if payda > 0 else np.nan
+
+    # Optimal rota: hedef fiyatı en düşük olan (hedef ulaşılamazsa başabaşa göre)
+    keys = [r["key"] for r in ROUTES]
+    hedef = out[[f'{k}_hedef' for k in keys]].to_numpy(dtype=np.float64)
+    basabas = out[[f'{k}_basabas' for k in keys]].to_numpy(dtype=np.float64)
+    secim = np.where(np.isnan(hedef).any(axis=1, keepdims=True), basabas, hedef)
+    rows = np.arange(len(out.index))
+    best = np.argmin(np.nan_to_num(secim, nan=np.inf), axis=1) if len(rows) else np.zeros(0, dtype=np.int64)
+    out['optimal_route'] = np.array(route_labels(), dtype=object)[best] if len(rows) else np.array([], dtype=object)
+    out['optimal_basabas'] = basabas[rows, best]
+    out['optimal_hedef'] = hedef[rows, best]
+    return out
+
+def _grid_heatmap(values, komisyon_values, reklam_values, title, fmt):
+    """Komisyon × reklam ızgarası için ısı haritası (Altair)."""
+    heat_df = pd.DataFrame(
+        [
+            {'Komisyon (%)': round(float(kv), 2), 'Reklam (€)': round(float(av), 2), title: float(values[i, j])}
+            for i, kv in enumerate(komisyon_values)
+            for j, av in enumerate(reklam_values)
+        ]
+    )
+    return (
+        alt.Chart(heat_df)
+        .mark_rect()
+        .encode(
+            x=alt.X('Komisyon (%):O'),
+            y=alt.Y('Reklam (€):O', sort='descending'),
+            color=alt.Color(f'{title}:Q', scale=alt.Scale(scheme='redyellowgreen')),
+            tooltip=['Komisyon (%)', 'Reklam (€)', alt.Tooltip(f'{title}:Q', format=fmt)],
+        )
+        .properties(title=title, height=360)
+    )
+
+def _profit_histogram(values, title, bins=40):
+    """Simüle edilen toplam kâr dağılımı için histogram (önceden gruplanmış, Altair)."""
+    counts, edges = np.histogram(np.asarray(values, dtype=np.float64), bins=bins)
+    hist_df = pd.DataFrame({'Başlangıç': edges[:-1], 'Bitiş': edges[1:], 'Çekiliş': counts})
+    return (
+        alt.Chart(hist_df)
+        .mark_bar()
+        .encode(
+            x=alt.X('Başlangıç:Q', title=title),
+            x2='Bitiş:Q',
+            y=alt.Y('Çekiliş:Q'),
+            color=alt.condition(alt.datum['Bitiş'] <= 0, alt.value('#d62728'), alt.value('#2ca02c')),
+            tooltip=[alt.Tooltip('Başlangıç:Q', format=',.2f'), alt.Tooltip('Bitiş:Q', format=',.2f'), 'Çekiliş:Q'],
+        )
+        .properties(height=300)
+    )
+
 def main():
     st.title("🛒 Kaufland Fiyat Hesaplama Modülü")
     st.markdown("---")
@@ -509,6 +2904,28 @@ def main():
         st.markdown("📝 [Title Description Generator](https://kauflandiwa.streamlit.app/)")
         st.markdown("*Kaufland için başlık ve açıklama oluşturun*")
         
+        st.markdown("---")
+        # Arka plan yazım kuyruğu durumu
+        if _supabase_enabled():
+            yazimlar = write_status()
+            bekleyen = sum(w["durum"] in ("bekliyor", "yazılıyor") for w in yazimlar)
+            hatali = sum(w["durum"] == "hata" for w in yazimlar)
+            if bekleyen:
+                st.caption(f"💾 {bekleyen} kayıt arka planda Supabase'e yazılıyor...")
+            if hatali:
+                st.warning(f"⚠️ {hatali} kayıt Supabase'e yazılamadı (yerel günlükte saklanıyor).")
+                if st.button("🔁 Başarısız Kayıtları Tekrar Dene"):
+                    retry_failed_writes()
+                    st.rerun()
+            if yazimlar:
+                with st.expander("💾 Kayıt Durumu"):
+                    simge = {"bekliyor": "⏳", "yazılıyor": "🔄", "yazıldı": "✅", "hata": "❌"}
+                    for w in yazimlar[:10]:
+                        satir = f"{simge.get(w['durum'], '')} #{w['seq']} {w['zaman']:%H:%M:%S} · {w['aciklama']} · {w['durum']}"
+                        if w.get("hata"):
+                            satir += f" ({w['hata']})"
+                        st.caption(satir)
+
         st.markdown("---")
         # Debug paneli
         with st.expander("🔧 Debug Panel"):
@@ -534,6 +2951,12 @@ def main():
                     st.error("❌ Client oluşturulamadı")
             else:
                 st.error("❌ Secrets eksik - secrets.toml dosyasını kontrol edin")
+            son_senkron = st.session_state.get('last_sync')
+            if son_senkron:
+                st.caption(
+                    f"Son senkronizasyon: {son_senkron['yazilan']} satır yazıldı, "
+                    f"{son_senkron['silinen']} silindi, {son_senkron['degismeyen']} değişmedi"
+                )
             # DB onarım/yeniden senkronizasyon yardımcısı
             st.markdown("---")
             st.caption("DB onarım/yeniden senkronizasyon")
@@ -541,13 +2964,33 @@ def main():
                 try:
                     base_df = load_csv_data()
                     if not base_df.empty:
-                        persist_df(base_df)
-                        st.success("✅ Yeniden senkronizasyon denendi. Ürünler Supabase ile eşitlendi (veya CSV güncellendi).")
+                        sonuc = persist_df(base_df, wait=True)
+                        if sonuc:
+                            st.success(f"✅ Ürünler Supabase ile eşitlendi: {sonuc['yazilan']} satır yazıldı, {sonuc['silinen']} satır silindi.")
+                        else:
+                            st.success("✅ Yeniden senkronizasyon denendi. Ürünler Supabase ile eşitlendi (veya CSV güncellendi).")
                     else:
                         st.warning("⚠️ Senkronize edilecek veri bulunamadı.")
                 except Exception as e:
                     st.error(f"❌ Senkronizasyon hatası: {str(e)}")
     
+    # Depo değiştiyse (başka oturum/süreç) cache'i tazele; yoklama TTL ile sınırlı
+    validate_catalog()
+    # Bu çalıştırma boyunca tüm sekmeler aynı katalog sürümünü okur. Tam katalog yalnızca
+    # ihtiyaç duyan bölümlerde yüklenir (`_tam_katalog`); Supabase'de liste ve analiz
+    # özetleri veritabanında hesaplanır
+    version = catalog_version()
+
+    def _tam_katalog():
+        try:
+            return load_csv_data(version)
+        except CatalogLoadError as e:
+            st.error(f"❌ Ürün kataloğu yüklenemedi: {e}")
+            st.stop()
+
+    if catalog_reconciling():
+        st.caption("⏳ Katalog yerel önbellekten gösteriliyor; Supabase ile arka planda eşitleniyor.")
+
     # Ana tabs
     tab1, tab2, tab3, tab4, tab5 = st.tabs([
         "📋 Ürün Listesi", 
@@ -560,61 +3003,37 @@ def main():
     with tab1:
         st.header("Mevcut Ürünler")
         
-        # CSV'den verileri yükle
-        df = load_csv_data()
+        # Filtreleme ve sayfalama depoda (Supabase) ya da yerel sıralı indekste yapılır;
+        # yalnızca gösterilen sayfa fiyatlanır
+        with st.spinner('Hesaplamalar yapılıyor...'):
+            try:
+                genel = load_product_list_stats(params, product_filter(), version)
+            except CatalogLoadError as e:
+                st.error(f"❌ Ürün kataloğu yüklenemedi: {e}")
+                st.stop()
         
-        if not df.empty:
-            # Fiyat hesaplamalarını ekle
-            with st.spinner('Hesaplamalar yapılıyor...'):
-                df['Satış Fiyatı'] = df['fiyat'].apply(clean_euro_value)
-                hesaplama_sonuclari = []
-                roi_list = []
-                for index, row in df.iterrows():
-                    hesaplama = calculate_total_cost(row, params)
-                    hesaplama_sonuclari.append(hesaplama)
-                    try:
-                        # ROI = (Satış Fiyatı - Son Maliyet) / Temel Maliyet
-                        if hesaplama['optimal_route'] == "TR→NL→DE":
-                            temel = hesaplama.get('tr_nl_de_temel_maliyet', 0.0)
-                            son = hesaplama.get('tr_nl_de_son_maliyet', hesaplama.get('optimal_cost', 0.0))
-                        else:
-                            temel = hesaplama.get('tr_de_temel_maliyet', 0.0)
-                            son = hesaplama.get('tr_de_son_maliyet', hesaplama.get('optimal_cost', 0.0))
-                        kar_roi = (df.at[index, 'Satış Fiyatı'] - son)
-                        roi_val = (kar_roi / temel) if temel and temel > 0 else 0.0
-                    except Exception:
-                        roi_val = 0.0
-                    roi_list.append(roi_val)
-            
-            # Hesaplama sonuçlarını DataFrame'e ekle
-            df['TR→NL→DE Maliyet'] = [h['tr_nl_de_son_maliyet'] for h in hesaplama_sonuclari]
-            df['TR→DE Maliyet'] = [h['tr_de_son_maliyet'] for h in hesaplama_sonuclari]
-            df['Optimal Rota'] = [h['optimal_route'] for h in hesaplama_sonuclari]
-            df['Son Maliyet'] = [h['optimal_cost'] for h in hesaplama_sonuclari]
-            df['Kar Marjı'] = df['Satış Fiyatı'] - df['Son Maliyet']
-            df['Kar Marjı %'] = ((df['Satış Fiyatı'] - df['Son Maliyet']) / df['Satış Fiyatı'] * 100).round(2)
-            df['ROI'] = [round(x, 2) for x in roi_list]
-            
+        if genel["adet"]:
             # Gösterim için sütunları seç
-            display_columns = [
-                'title', 'ean', 'Satış Fiyatı', 'TR→NL→DE Maliyet', 
-                'TR→DE Maliyet', 'Optimal Rota', 'Son Maliyet', 'Kar Marjı', 'Kar Marjı %', 'ROI'
-            ]
+            route_cost_columns = [f"{label} Maliyet" for label in route_labels()]
+            display_columns = (
+                ['title', 'ean', 'Satış Fiyatı'] + route_cost_columns +
+                ['Optimal Rota', 'Son Maliyet', 'Kar Marjı', 'Kar Marjı %', 'ROI']
+            )
             
             # Filtreleme
             with st.expander("🔍 Filtreler", expanded=False):
                 fcol1, fcol2 = st.columns(2)
                 with fcol1:
-                    search_term = st.text_input("Ürün adında ara:", placeholder="Örn: Dünya Haritası")
+                    search_term = st.text_input("Ürün adı veya EAN ile ara:", placeholder="Örn: Dünya Haritası, 8684...")
                 with fcol2:
                     kar_marji_filtre = st.selectbox(
                         "Kâr durum filtresi:",
-                        ["Tümü", "Pozitif", "Negatif", "0'a yakın (±5%)"]
+                        list(KAR_DURUMLARI)
                     )
                 rcol1, rcol2, rcol3 = st.columns(3)
                 with rcol1:
-                    min_price = float(df['Satış Fiyatı'].min()) if len(df) else 0.0
-                    max_price = float(df['Satış Fiyatı'].max()) if len(df) else 0.0
+                    min_price = float(genel['fiyat_min'])
+                    max_price = float(genel['fiyat_max'])
                     price_range = st.slider(
                         "Satış fiyatı aralığı (€)",
                         min_value=0.0,
@@ -622,61 +3041,85 @@ def main():
                         value=(round(min_price, 2), round(max_price, 2)) if max_price >= min_price else (0.0, 0.0)
                     )
                 with rcol2:
-                    pct_min = float(df['Kar Marjı %'].min()) if len(df) else 0.0
-                    pct_max = float(df['Kar Marjı %'].max()) if len(df) else 0.0
+                    pct_min = float(genel['yuzde_min'])
+                    pct_max = float(genel['yuzde_max'])
                     pct_range = st.slider(
                         "Kâr % aralığı",
-                        min_value=float(min(-50.0, pct_min)) if len(df) else -50.0,
-                        max_value=float(max(50.0, pct_max)) if len(df) else 50.0,
-                        value=(float(min(0.0, pct_min)), float(max(0.0, pct_max))) if len(df) else (-10.0, 30.0)
+                        min_value=float(min(-50.0, pct_min)),
+                        max_value=float(max(50.0, pct_max)),
+                        value=(float(min(0.0, pct_min)), float(max(0.0, pct_max)))
                     )
                 with rcol3:
                     rota_secimi = st.multiselect(
                         "Rota",
-                        options=["TR→NL→DE", "TR→DE"],
-                        default=["TR→NL→DE", "TR→DE"]
+                        options=route_labels(),
+                        default=route_labels()
                     )
 
-            # Filtrelemeyi uygula
-            filtered_df = df.copy()
-            if search_term:
-                filtered_df = filtered_df[filtered_df['title'].str.contains(search_term, case=False, na=False)]
-            if kar_marji_filtre == "Pozitif":
-                filtered_df = filtered_df[filtered_df['Kar Marjı'] > 0]
-            elif kar_marji_filtre == "Negatif":
-                filtered_df = filtered_df[filtered_df['Kar Marjı'] < 0]
-            elif kar_marji_filtre == "0'a yakın (±5%)":
-                filtered_df = filtered_df[abs(filtered_df['Kar Marjı %']) <= 5]
-            # Aralık filtreleri
-            if len(filtered_df) > 0:
-                filtered_df = filtered_df[
-                    (filtered_df['Satış Fiyatı'] >= price_range[0]) &
-                    (filtered_df['Satış Fiyatı'] <= price_range[1]) &
-                    (filtered_df['Kar Marjı %'] >= pct_range[0]) &
-                    (filtered_df['Kar Marjı %'] <= pct_range[1]) &
-                    (filtered_df['Optimal Rota'].isin(rota_secimi))
-                ]
+            # Katalog sınırlarını kapsayan aralıklar filtre olarak gönderilmez
+            filtre = product_filter(
+                arama=search_term,
+                kar_durumu=KAR_DURUMLARI[kar_marji_filtre],
+                fiyat=(
+                    price_range[0] if price_range[0] > min_price else None,
+                    price_range[1] if price_range[1] < max_price else None,
+                ),
+                yuzde=(
+                    pct_range[0] if pct_range[0] > pct_min else None,
+                    pct_range[1] if pct_range[1] < pct_max else None,
+                ),
+                rotalar=None if set(rota_secimi) == set(route_labels()) else rota_secimi,
+            )
+            ozet = genel if filtre == product_filter() else load_product_list_stats(params, filtre, version)
             
             # Sonuçları göster
-            st.subheader(f"📊 Toplam {len(filtered_df)} ürün")
+            st.subheader(f"📊 Toplam {ozet['adet']} ürün")
             
-            if not filtered_df.empty:
+            if ozet['adet']:
                 # Özet istatistikler
                 col1, col2, col3, col4 = st.columns(4)
                 
                 with col1:
-                    st.metric("Ortalama Satış Fiyatı", f"€{filtered_df['Satış Fiyatı'].mean():.2f}")
+                    st.metric("Ortalama Satış Fiyatı", f"€{ozet['ort_fiyat']:.2f}")
                     
                 with col2:
-                    st.metric("Ortalama Kar Marjı", f"€{filtered_df['Kar Marjı'].mean():.2f}")
+                    st.metric("Ortalama Kar Marjı", f"€{ozet['ort_kar']:.2f}")
                     
                 with col3:
-                    st.metric("Ortalama Kar %", f"{filtered_df['Kar Marjı %'].mean():.1f}%")
+                    st.metric("Ortalama Kar %", f"{ozet['ort_yuzde']:.1f}%")
                     
                 with col4:
-                    pozitif_kar = len(filtered_df[filtered_df['Kar Marjı'] > 0])
-                    st.metric("Karlı Ürün Sayısı", pozitif_kar)
+                    st.metric("Karlı Ürün Sayısı", ozet['karli'])
                 
+                # Sayfalama: her sayfanın imleci saklanır; filtre/parametre değişince başa dönülür
+                pcol1, pcol2, pcol3, pcol4 = st.columns([1, 1, 3, 1])
+                with pcol4:
+                    sayfa_boyutu = st.selectbox("Sayfa boyutu", PRODUCT_PAGE_SIZES, index=1)
+                liste_anahtari = (params_key(params), tuple(sorted(filtre.items())), sayfa_boyutu)
+                if st.session_state.get('urun_listesi_anahtar') != liste_anahtari:
+                    st.session_state['urun_listesi_anahtar'] = liste_anahtari
+                    st.session_state['urun_listesi_imlecler'] = [None]
+                imlecler = st.session_state['urun_listesi_imlecler']
+                page_raw, sonraki = load_product_page(params, filtre, imlecler[-1], sayfa_boyutu, version)
+                if page_raw.empty and len(imlecler) > 1:
+                    # Sayfa başka bir düzenlemeyle boşaldı: ilk sayfaya dön
+                    imlecler[:] = [None]
+                    page_raw, sonraki = load_product_page(params, filtre, None, sayfa_boyutu, version)
+                with pcol1:
+                    if st.button("◀ Önceki", disabled=len(imlecler) == 1, use_container_width=True):
+                        imlecler.pop()
+                        st.rerun()
+                with pcol2:
+                    if st.button("Sonraki ▶", disabled=sonraki is None, use_container_width=True):
+                        imlecler.append(sonraki)
+                        st.rerun()
+                with pcol3:
+                    ilk = (len(imlecler) - 1) * sayfa_boyutu
+                    st.caption(f"Sayfa {len(imlecler)} · {ilk + 1}–{ilk + len(page_raw)} / {ozet['adet']} ürün")
+
+                page_num = build_numeric_catalog(page_raw)
+                filtered_df = with_price_columns(page_raw, price_catalog(page_num, params))
+
                 # Tabloyu göster (renklendirme)
                 display_df = filtered_df[display_columns].round(2)
                 # Yumuşak renklerle kâr yüzdesi kategorilerine göre stiller
@@ -713,8 +3156,7 @@ def main():
                     display_df.style
                     .format({
                         'Satış Fiyatı': '€{:.2f}',
-                        'TR→NL→DE Maliyet': '€{:.2f}',
-                        'TR→DE Maliyet': '€{:.2f}',
+                        **{c: '€{:.2f}' for c in route_cost_columns},
                         'Son Maliyet': '€{:.2f}',
                         'Kar Marjı': '€{:.2f}',
                         'Kar Marjı %': '{:.1f}%',
@@ -735,7 +3177,7 @@ def main():
                     edit_base_cols = ['title', 'ean'] + present_edit_cols
                     edit_df = filtered_df[edit_base_cols].copy()
                     for c in present_edit_cols:
-                        edit_df[c] = edit_df[c].apply(clean_euro_value)
+                        edit_df[c] = page_num[c]
                     edit_df['ean'] = edit_df['ean'].astype(str)
                     edited_df = st.data_editor(
                         edit_df,
@@ -751,41 +3193,26 @@ def main():
                     c1, c2 = st.columns([1,1])
                     with c1:
                         if st.button("Değişiklikleri Kaydet", type="primary"):
-                            with st.spinner('Kaydediliyor...'):
-                                existing_df = load_csv_data()
-                                if not existing_df.empty:
-                                    existing_df['ean'] = existing_df['ean'].astype(str)
-                                    updates = edited_df.dropna(subset=['ean']).set_index('ean')
-                                    for ean_key, row_vals in updates.iterrows():
-                                        idx = existing_df[existing_df['ean'].astype(str) == str(ean_key)].index
-                                        if len(idx) > 0:
-                                            for col in present_edit_cols:
-                                                existing_df.loc[idx, col] = row_vals[col]
-                                    persist_df(existing_df)
-                                    try:
-                                        load_csv_data.clear()
-                                    except Exception:
-                                        pass
-                                    st.success("Değişiklikler kaydedildi.")
-                                    st.rerun()
-                                else:
-                                    st.warning("Kaydedilecek veri bulunamadı.")
+                            # Yalnızca değeri gerçekten değişen satırlar, satır düzeyinde yazılır
+                            before = edit_df[present_edit_cols]
+                            after = edited_df[present_edit_cols]
+                            changed = ~(after.eq(before) | (after.isna() & before.isna())).all(axis=1)
+                            degisenler = {
+                                key: {col: format_euro(row_vals[col]) if pd.notna(row_vals[col]) else "" for col in present_edit_cols}
+                                for key, (_, row_vals) in zip(product_keys(edit_df[changed]), edited_df[changed].iterrows())
+                            }
+                            if degisenler and update_products(degisenler):
+                                st.success("Değişiklikler kaydedildi.")
+                                st.rerun()
+                            else:
+                                st.warning("Kaydedilecek değişiklik bulunamadı.")
                     with c2:
                         del_options = edited_df['ean'].dropna().astype(str).unique().tolist()
                         del_select = st.multiselect("Silinecek ürünler (EAN)", options=del_options)
                         if st.button("Seçili Ürünleri Sil", type="secondary") and del_select:
-                            with st.spinner('Siliniyor...'):
-                                base_df = load_csv_data()
-                                if not base_df.empty and 'ean' in base_df.columns:
-                                    base_df['ean'] = base_df['ean'].astype(str)
-                                    base_df = base_df[~base_df['ean'].isin([str(x) for x in del_select])]
-                                    persist_df(base_df)
-                                    try:
-                                        load_csv_data.clear()
-                                    except Exception:
-                                        pass
-                                    st.success("Seçili ürünler silindi.")
-                                    st.rerun()
+                            if delete_products([str(x) for x in del_select]):
+                                st.success("Seçili ürünler silindi.")
+                                st.rerun()
             else:
                 st.warning("Filtrelere uygun ürün bulunamadı.")
         else:
@@ -850,37 +3277,20 @@ def main():
                         'title': title,
                         'ean': ean,
                         'iwasku': iwasku,
-                        'fiyat': f"€{fiyat:.2f}",
-                        'ham_maliyet_euro': f"€{ham_maliyet_eur_final:.2f}",  # Her zaman EUR olarak kaydet
+                        'fiyat': format_euro(fiyat),
+                        'ham_maliyet_euro': format_euro(ham_maliyet_eur_final),  # Her zaman EUR olarak kaydet
                         'desi': desi,
-                        'tr_ne_navlun': f"€{tr_ne_navlun:.2f}",
-                        'ne_de_navlun': f"€{ne_de_navlun:.2f}",
-                        'kara_tr_de_navlun': f"€{(tr_ne_navlun + ne_de_navlun):.2f}",
-                        'express_kargo': f"€{express_kargo:.2f}",
-                        'ddp': f"€{ddp:.2f}",
-                        'hava_tr_de_navlun': f"€{(float(express_kargo) + float(ddp)):.2f}",
-                        'reklam': f"€{params['reklam_maliyeti']:.2f}"
+                        'tr_ne_navlun': format_euro(tr_ne_navlun),
+                        'ne_de_navlun': format_euro(ne_de_navlun),
+                        'kara_tr_de_navlun': format_cents(to_cents(tr_ne_navlun) + to_cents(ne_de_navlun)),
+                        'express_kargo': format_euro(express_kargo),
+                        'ddp': format_euro(ddp),
+                        'hava_tr_de_navlun': format_cents(to_cents(express_kargo) + to_cents(ddp)),
+                        'reklam': format_euro(params['reklam_maliyeti'])
                     }
                     
-                    # CSV'ye ekle
-                    df = load_csv_data()
-                    new_df = pd.DataFrame([new_product])
-                    
-                    if df.empty:
-                        updated_df = new_df
-                    else:
-                        updated_df = pd.concat([df, new_df], ignore_index=True)
-                    
-                    persist_df(updated_df)
-                    try:
-                        load_csv_data.clear()
-                    except Exception:
-                        pass
-                    
-                    # JSON'a da ekle
-                    json_data = load_json_data()
-                    json_data["products"].append(new_product)
-                    save_json_data(json_data)
+                    # Depoya tek satır olarak ekle (değişiklik günlüğüne de işlenir)
+                    insert_product(new_product)
                     
                     st.success(f"✅ '{title}' ürünü başarıyla eklendi!")
                     st.rerun()
@@ -890,34 +3300,32 @@ def main():
     with tab3:
         st.header("Detaylı Fiyat Hesaplama")
         
-        df = load_csv_data()
-        
-        if not df.empty:
-            # Ürün arama ve seçimi
+        if genel["adet"]:
+            # Ürün arama ve seçimi: Ürün Listesi ile aynı sayfalı sorgu (Supabase'de veritabanında);
+            # tam katalog yüklenmez, yalnızca bulunan ilk PRODUCT_SEARCH_LIMIT ürün okunur
             st.subheader("🔎 Ürün Arama")
             search_query = st.text_input(
                 "Ürün adı veya EAN ile ara:",
                 placeholder="Örn: Harita, 8684...",
                 help="Başlığa veya EAN koduna göre filtreleyin"
             )
-            filtered_df_sel = df.copy()
-            if search_query:
-                mask_title = filtered_df_sel['title'].str.contains(search_query, case=False, na=False)
-                mask_ean = (
-                    filtered_df_sel['ean'].astype(str).str.contains(search_query, case=False, na=False)
-                    if 'ean' in filtered_df_sel.columns else pd.Series([False]*len(filtered_df_sel), index=filtered_df_sel.index)
-                )
-                filtered_df_sel = filtered_df_sel[mask_title | mask_ean]
+            filtered_df_sel, devami = load_product_page(
+                params, product_filter(arama=search_query), None, PRODUCT_SEARCH_LIMIT, version
+            )
 
             product_names = filtered_df_sel['title'].tolist()
             if len(product_names) == 0:
                 st.info("Aramaya uygun ürün bulunamadı. Aramayı temizleyin veya farklı bir ifade deneyin.")
             else:
+                if devami is not None:
+                    st.caption(f"İlk {len(product_names)} eşleşme gösteriliyor; aradığınız ürün yoksa aramayı daraltın.")
                 selected_product = st.selectbox("Hesaplama yapılacak ürünü seçin:", product_names)
                 
                 if selected_product:
                     # Seçilen ürünün verileri
-                    selected_row = df[df['title'] == selected_product].iloc[0]
+                    selected_row = filtered_df_sel[filtered_df_sel['title'] == selected_product].iloc[0]
+                    # Sayısal alanlar (yalnızca bulunan satırlar ayrıştırılır)
+                    selected_num = build_numeric_catalog(filtered_df_sel).loc[selected_row.name]
                 
                 col1, col2 = st.columns(2)
                 
@@ -925,8 +3333,8 @@ def main():
                     st.subheader("📦 Ürün Bilgileri")
                     st.write(f"**Ürün Adı:** {selected_row['title']}")
                     st.write(f"**EAN:** {selected_row['ean']}")
-                    st.write(f"**Satış Fiyatı:** €{clean_euro_value(selected_row['fiyat']):.2f}")
-                    st.write(f"**Ham Maliyet:** €{clean_euro_value(selected_row['ham_maliyet_euro']):.2f}")
+                    st.write(f"**Satış Fiyatı:** €{selected_num['fiyat']:.2f}")
+                    st.write(f"**Ham Maliyet:** €{selected_num['ham_maliyet_euro']:.2f}")
                     st.write(f"**Desi:** {selected_row['desi']}")
                 
                 with col2:
@@ -939,80 +3347,55 @@ def main():
                 st.subheader("💰 Detaylı Maliyet Analizi")
                 
                 with st.spinner('Hesaplanıyor...'):
-                    hesaplama = calculate_total_cost(selected_row, params)
-                satis_fiyati = clean_euro_value(selected_row['fiyat'])
+                    hesaplama = calculate_total_cost(selected_num, params)
+                satis_fiyati = float(selected_num['fiyat'])
                 
                 # İki rotayı karşılaştırmalı göster
                 st.subheader("🛣️ Rota Karşılaştırması")
                 
-                col1, col2, col3 = st.columns(3)
+                route_cols = st.columns(len(ROUTES) + 1)
                 
-                with col1:
-                    st.markdown("#### TR → NL → DE")
-                    st.metric("Temel Maliyet", f"€{hesaplama['tr_nl_de_temel_maliyet']:.2f}")
-                    st.metric("Reklam Dahil", f"€{hesaplama['tr_nl_de_reklam_dahil']:.2f}")
-                    st.metric(f"Vergi ({params['vergi_yuzdesi']}%)", f"€{hesaplama['tr_nl_de_vergi']:.2f}")
-                    st.metric(f"Pazaryeri ({params['pazaryeri_kesintisi']}%)", f"€{hesaplama['tr_nl_de_pazaryeri_kesinti']:.2f}")
-                    st.metric("**SON MALİYET**", f"€{hesaplama['tr_nl_de_son_maliyet']:.2f}")
-                
-                with col2:
-                    st.markdown("#### TR → DE (Direkt)")
-                    st.metric("Temel Maliyet", f"€{hesaplama['tr_de_temel_maliyet']:.2f}")
-                    st.metric("Reklam Dahil", f"€{hesaplama['tr_de_reklam_dahil']:.2f}")
-                    st.metric(f"Vergi ({params['vergi_yuzdesi']}%)", f"€{hesaplama['tr_de_vergi']:.2f}")
-                    st.metric(f"Pazaryeri ({params['pazaryeri_kesintisi']}%)", f"€{hesaplama['tr_de_pazaryeri_kesinti']:.2f}")
-                    st.metric("**SON MALİYET**", f"€{hesaplama['tr_de_son_maliyet']:.2f}")
+                for route, rcol in zip(ROUTES, route_cols):
+                    key = route["key"]
+                    with rcol:
+                        st.markdown(f"#### {route['baslik']}")
+                        st.metric("Temel Maliyet", f"€{hesaplama[f'{key}_temel_maliyet']:.2f}")
+                        st.metric("Reklam Dahil", f"€{hesaplama[f'{key}_reklam_dahil']:.2f}")
+                        st.metric(f"Vergi ({params['vergi_yuzdesi']}%)", f"€{hesaplama[f'{key}_vergi']:.2f}")
+                        st.metric(f"Pazaryeri ({params['pazaryeri_kesintisi']}%)", f"€{hesaplama[f'{key}_pazaryeri_kesinti']:.2f}")
+                        st.metric("**SON MALİYET**", f"€{hesaplama[f'{key}_son_maliyet']:.2f}")
                 
-                with col3:
+                with route_cols[-1]:
                     st.markdown("#### 🏆 Optimal Seçim")
                     st.metric("En İyi Rota", hesaplama['optimal_route'])
                     st.metric("Optimal Maliyet", f"€{hesaplama['optimal_cost']:.2f}")
                     st.metric("Tasarruf", f"€{hesaplama['cost_difference']:.2f}")
                     
-                    if hesaplama['optimal_route'] == "TR→NL→DE":
-                        st.success("✅ Hollanda üzerinden daha ekonomik")
-                    else:
-                        st.info("✅ Direkt rota daha ekonomik")
+                    optimal_route = next(r for r in ROUTES if r["label"] == hesaplama['optimal_route'])
+                    st.success(f"✅ {optimal_route['aciklama']}")
                 
                 # Maliyet bileşenleri tablosu
                 st.subheader("📋 Maliyet Bileşenleri Detayı")
                 
                 # Ham maliyet basit - sadece EUR değeri
-                ham_maliyet_final = clean_euro_value(selected_row.get('ham_maliyet_euro', 0))
+                ham_maliyet_final = float(selected_num['ham_maliyet_euro'])
                 
-                # Bileşen superset'i: her iki rota için de uyumlu
+                # Bileşen superset'i: tüm rotaların navlun kolonları; rotaya ait değilse 0
+                navlun_cols = list(dict.fromkeys(c for r in ROUTES for c in r["navlun"]))
                 tr_nl_breakdown = {
-                    'Bileşen': [
-                        'Ham Maliyet',
-                        'TR-NL Navlun',
-                        'NL-DE Navlun',
-                        'Express Kargo',
-                        'DDP',
-                        'Reklam',
-                        f'Vergi ({params["vergi_yuzdesi"]}%)',
-                        f'Pazaryeri ({params["pazaryeri_kesintisi"]}%)'
-                    ],
-                    'TR→NL→DE (€)': [
-                        ham_maliyet_final,
-                        clean_euro_value(selected_row.get('tr_ne_navlun', 0)),
-                        clean_euro_value(selected_row.get('ne_de_navlun', 0)),
-                        0.0,
-                        0.0,
-                        hesaplama['reklam_maliyeti'],
-                        hesaplama['tr_nl_de_vergi'],
-                        hesaplama['tr_nl_de_pazaryeri_kesinti']
-                    ],
-                    'TR→DE (€)': [
-                        ham_maliyet_final,
-                        0.0,
-                        0.0,
-                        clean_euro_value(selected_row.get('express_kargo', 0)),
-                        clean_euro_value(selected_row.get('ddp', 0)),
-                        hesaplama['reklam_maliyeti'],
-                        hesaplama['tr_de_vergi'],
-                        hesaplama['tr_de_pazaryeri_kesinti']
-                    ]
+                    'Bileşen': (
+                        ['Ham Maliyet'] +
+                        [COST_COLUMN_LABELS.get(c, c) for c in navlun_cols] +
+                        ['Reklam', f'Vergi ({params["vergi_yuzdesi"]}%)', f'Pazaryeri ({params["pazaryeri_kesintisi"]}%)']
+                    )
                 }
+                for route in ROUTES:
+                    key = route["key"]
+                    tr_nl_breakdown[f"{route['label']} (€)"] = (
+                        [ham_maliyet_final] +
+                        [float(selected_num[c]) if c in route["navlun"] else 0.0 for c in navlun_cols] +
+                        [hesaplama['reklam_maliyeti'], hesaplama[f'{key}_vergi'], hesaplama[f'{key}_pazaryeri_kesinti']]
+                    )
                 
                 breakdown_df = pd.DataFrame(tr_nl_breakdown)
                 st.dataframe(breakdown_df, hide_index=True)
@@ -1074,7 +3457,7 @@ def main():
                     step=0.01,
                     help="Bu fiyatla kâr ve kâr yüzdesini anında görün; dilerseniz kaydedin"
                 )
-                row_sim = selected_row.copy()
+                row_sim = selected_num.copy()
                 row_sim['fiyat'] = sim_satis_fiyati
                 with st.spinner('Simülasyon hesaplanıyor...'):
                     hesaplama_sim = calculate_total_cost(row_sim, params)
@@ -1114,24 +3497,15 @@ def main():
                 with roi_sel_col:
                     roi_route_choice = st.selectbox(
                         "ROI için Rota",
-                        options=["Optimal", "TR→NL→DE", "TR→DE"],
+                        options=["Optimal"] + route_labels(),
                         help="ROI = (Satış Fiyatı - Son Maliyet) / Temel Maliyet"
                     )
                 with roi_val_col:
                     # ROI = (Satış Fiyatı - Son Maliyet) / Temel Maliyet
-                    if roi_route_choice == "TR→NL→DE":
-                        temel = hesaplama_sim.get('tr_nl_de_temel_maliyet', 0.0)
-                        son = hesaplama_sim.get('tr_nl_de_son_maliyet', hesaplama_sim.get('optimal_cost', 0.0))
-                    elif roi_route_choice == "TR→DE":
-                        temel = hesaplama_sim.get('tr_de_temel_maliyet', 0.0)
-                        son = hesaplama_sim.get('tr_de_son_maliyet', hesaplama_sim.get('optimal_cost', 0.0))
-                    else:
-                        if hesaplama_sim.get('optimal_route') == "TR→NL→DE":
-                            temel = hesaplama_sim.get('tr_nl_de_temel_maliyet', 0.0)
-                            son = hesaplama_sim.get('tr_nl_de_son_maliyet', hesaplama_sim.get('optimal_cost', 0.0))
-                        else:
-                            temel = hesaplama_sim.get('tr_de_temel_maliyet', 0.0)
-                            son = hesaplama_sim.get('tr_de_son_maliyet', hesaplama_sim.get('optimal_cost', 0.0))
+                    roi_label = hesaplama_sim['optimal_route'] if roi_route_choice == "Optimal" else roi_route_choice
+                    roi_key = route_key(roi_label)
+                    temel = hesaplama_sim.get(f'{roi_key}_temel_maliyet', 0.0)
+                    son = hesaplama_sim.get(f'{roi_key}_son_maliyet', hesaplama_sim.get('optimal_cost', 0.0))
                     kar_roi = sim_satis_fiyati - son
                     sim_roi = (kar_roi / temel) if temel and temel > 0 else 0.0
                     st.metric("Sim. ROI", f"{sim_roi:.2f}")
@@ -1139,31 +3513,12 @@ def main():
                 save_col1, save_col2 = st.columns([1,3])
                 with save_col1:
                     if st.button("Fiyatı CSV’ye uygula (Simülasyon)", type="primary"):
-                        with st.spinner('Güncelleniyor...'):
-                            df_base = load_csv_data()
-                            if not df_base.empty:
-                                updated = False
-                                if 'ean' in df_base.columns and pd.notna(selected_row.get('ean', None)) and str(selected_row['ean']).strip() != "":
-                                    df_base['ean'] = df_base['ean'].astype(str)
-                                    mask = df_base['ean'] == str(selected_row['ean'])
-                                    if mask.any():
-                                        df_base.loc[mask, 'fiyat'] = f"€{sim_satis_fiyati:.2f}"
-                                        updated = True
-                                if not updated and 'title' in df_base.columns:
-                                    mask = df_base['title'] == selected_row['title']
-                                    if mask.any():
-                                        df_base.loc[mask, 'fiyat'] = f"€{sim_satis_fiyati:.2f}"
-                                        updated = True
-                                if updated:
-                                    persist_df(df_base)
-                                    try:
-                                        load_csv_data.clear()
-                                    except Exception:
-                                        pass
-                                    st.success("Simülasyon fiyatı kaydedildi.")
-                                    st.rerun()
-                                else:
-                                    st.warning("Güncellenecek satır bulunamadı.")
+                        secili_anahtar = product_keys(pd.DataFrame([selected_row])).iloc[0]
+                        if update_fields(secili_anahtar, {'fiyat': format_euro(sim_satis_fiyati)}):
+                            st.success("Simülasyon fiyatı kaydedildi.")
+                            st.rerun()
+                        else:
+                            st.warning("Güncellenecek satır bulunamadı.")
         else:
             st.info("Hesaplama yapabilmek için önce ürün eklemelisiniz.")
     
@@ -1175,65 +3530,32 @@ def main():
         with col1:
             st.subheader("📤 Export")
             
-            df = load_csv_data()
-            
-            if not df.empty:
-                # Hesaplamaları ekle
-                with st.spinner('Export verileri hazırlanıyor...'):
-                    hesaplama_sonuclari = []
-                    for index, row in df.iterrows():
-                        hesaplama = calculate_total_cost(row, params)
-                        hesaplama_sonuclari.append(hesaplama)
-                
-                export_df = df.copy()
-                export_df['Satış Fiyatı'] = df['fiyat'].apply(clean_euro_value)
-                export_df['TR→NL→DE Maliyet'] = [h['tr_nl_de_son_maliyet'] for h in hesaplama_sonuclari]
-                export_df['TR→DE Maliyet'] = [h['tr_de_son_maliyet'] for h in hesaplama_sonuclari]
-                export_df['Optimal Rota'] = [h['optimal_route'] for h in hesaplama_sonuclari]
-                export_df['Son Maliyet'] = [h['optimal_cost'] for h in hesaplama_sonuclari]
-                export_df['Kar Marjı'] = export_df['Satış Fiyatı'] - export_df['Son Maliyet']
-                export_df['Kar Marjı %'] = ((export_df['Satış Fiyatı'] - export_df['Son Maliyet']) / export_df['Satış Fiyatı'] * 100).round(2)
-                
-                # CSV Export
-                csv_buffer = io.StringIO()
-                export_df.to_csv(csv_buffer, index=False)
-                csv_data = csv_buffer.getvalue()
-                
-                st.download_button(
-                    label="📁 CSV Olarak İndir",
-                    data=csv_data,
-                    file_name=f"kaufland_products_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
-                    mime="text/csv"
-                )
-                
-                # Excel Export
-                excel_buffer = io.BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                    export_df.to_excel(writer, sheet_name='Ürünler', index=False)
-                    
-                    # Parametreler sheet'i
-                    params_df = pd.DataFrame(list(params.items()), columns=['Parametre', 'Değer'])
-                    params_df.to_excel(writer, sheet_name='Parametreler', index=False)
-                
-                excel_data = excel_buffer.getvalue()
-                
-                st.download_button(
-                    label="📊 Excel Olarak İndir",
-                    data=excel_data,
-                    file_name=f"kaufland_products_{datetime.now().strftime('%Y%m%d_%H%M')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
-                
-                # JSON Export
-                json_data = load_json_data()
-                json_str = json.dumps(json_data, ensure_ascii=False, indent=2)
-                
-                st.download_button(
-                    label="🗂️ JSON Olarak İndir",
-                    data=json_str,
-                    file_name=f"kaufland_products_{datetime.now().strftime('%Y%m%d_%H%M')}.json",
-                    mime="application/json"
-                )
+            # Dışa aktarım dosyası yalnızca istenince üretilir (tam katalog yüklenip fiyatlanır);
+            # hazırlanan dosya oturumda (katalog sürümü, parametreler, biçim) anahtarıyla saklanır
+            if genel["adet"]:
+                bicimler = [b for b in EXPORT_FORMATS if b != "Parquet" or pq is not None]
+                bicim = st.selectbox("Dosya biçimi", bicimler, help="Parquet: tipli (sayısal kolonlar float, metinler sözlük kodlu) sütunlu dosya")
+                export_anahtari = (version, params_key(params), bicim)
+                hazir = st.session_state.get('export_dosyasi')
+                if hazir is not None and hazir['anahtar'] != export_anahtari:
+                    hazir = None
+                if st.button("📦 Export Dosyasını Hazırla", disabled=hazir is not None):
+                    with st.spinner('Export verileri hazırlanıyor...'):
+                        try:
+                            veri = export_file(bicim, params, version)
+                        except CatalogLoadError as e:
+                            st.error(f"❌ Ürün kataloğu yüklenemedi: {e}")
+                            st.stop()
+                    hazir = {'anahtar': export_anahtari, 'veri': veri, 'zaman': datetime.now().strftime('%Y%m%d_%H%M')}
+                    st.session_state['export_dosyasi'] = hazir
+                if hazir is not None:
+                    uzanti, mime = EXPORT_FORMATS[bicim]
+                    st.download_button(
+                        label=f"⬇️ {bicim} Olarak İndir",
+                        data=hazir['veri'],
+                        file_name=f"kaufland_products_{hazir['zaman']}.{uzanti}",
+                        mime=mime
+                    )
                 
                 # Boş CSV Şablonu
                 template_required = [
@@ -1259,14 +3581,17 @@ def main():
             st.subheader("📥 Import")
             
             uploaded_file = st.file_uploader(
-                "CSV dosyası yükleyin:",
-                type=['csv'],
-                help="Mevcut şablonla uyumlu CSV dosyası yükleyebilirsiniz."
+                "CSV veya Parquet dosyası yükleyin:",
+                type=['csv', 'parquet'] if pq is not None else ['csv'],
+                help="Mevcut şablonla uyumlu CSV ya da bu uygulamadan indirilen Parquet dosyası yükleyebilirsiniz."
             )
             
             if uploaded_file is not None:
                 try:
-                    new_df = pd.read_csv(uploaded_file)
+                    if uploaded_file.name.lower().endswith('.parquet'):
+                        new_df = catalog_from_arrow(read_catalog_table(uploaded_file))
+                    else:
+                        new_df = read_catalog_csv(uploaded_file)
                     
                     # Gerekli sütunları kontrol et
                     required_columns = [
@@ -1303,14 +3628,11 @@ def main():
                     
                     for col in numeric_columns:
                         if col in new_df.columns:
-                            # Sayısal olmayan değerleri kontrol et
-                            non_numeric_rows = []
-                            for idx, value in new_df[col].items():
-                                try:
-                                    if pd.notna(value) and value != "":
-                                        clean_euro_value(value)
-                                except:
-                                    non_numeric_rows.append(idx + 2)  # +2 çünkü header + 0-based index
+                            # Sayısal olmayan değerleri kontrol et (kolon bir kez ayrıştırılır)
+                            raw = new_df[col]
+                            parsed = parse_euro_series(raw, errors="coerce")
+                            filled = raw.notna() & (raw.astype(str).str.strip() != "")
+                            non_numeric_rows = (new_df.index[(parsed.isna() & filled).to_numpy()] + 2).tolist()  # +2 çünkü header + 0-based index
                             
                             if non_numeric_rows:
                                 validation_errors.append(f"'{col}' sütununda geçersiz değerler (satır: {', '.join(map(str, non_numeric_rows[:5]))})")
@@ -1335,22 +3657,8 @@ def main():
                     st.success(f"✅ Dosya doğrulandı! {len(new_df)} satır veri bulundu.")
                     
                     if st.button("Verileri İçe Aktar", type="primary"):
-                        # Mevcut verilerle birleştir
-                        existing_df = load_csv_data()
-                        
-                        if existing_df.empty:
-                            combined_df = new_df
-                        else:
-                            combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-                            # Duplikaları temizle (EAN bazında)
-                            if 'ean' in combined_df.columns:
-                                combined_df = combined_df.drop_duplicates(subset=['ean'], keep='last')
-                        
-                        persist_df(combined_df)
-                        try:
-                            load_csv_data.clear()
-                        except Exception:
-                            pass
+                        # Mevcut verilerle birleştir: aynı EAN'lı (EAN yoksa aynı adlı) ürünler güncellenir
+                        upsert_products(new_df)
                         
                         st.success(f"✅ {len(new_df)} ürün başarıyla içe aktarıldı!")
                         st.rerun()
@@ -1365,37 +3673,42 @@ def main():
     with tab5:
         st.header("📈 Analiz ve Raporlar")
         
-        df = load_csv_data()
+        # Özet (Supabase'de veritabanında hesaplanır, yalnızca özet aktarılır)
+        try:
+            ozet = load_analysis_summary(params, version)
+        except CatalogLoadError as e:
+            st.error(f"❌ Ürün kataloğu yüklenemedi: {e}")
+            st.stop()
         
-        if not df.empty:
-            # Hesaplamaları ekle
-            with st.spinner('Analiz hesaplanıyor...'):
-                hesaplama_sonuclari = []
-                for index, row in df.iterrows():
-                    hesaplama = calculate_total_cost(row, params)
-                    hesaplama_sonuclari.append(hesaplama)
-            
-            df['Satış Fiyatı'] = df['fiyat'].apply(clean_euro_value)
-            df['Son Maliyet'] = [h['son_maliyet'] for h in hesaplama_sonuclari]
-            df['Kar Marjı'] = df['Satış Fiyatı'] - df['Son Maliyet']
-            df['Kar Marjı %'] = ((df['Satış Fiyatı'] - df['Son Maliyet']) / df['Satış Fiyatı'] * 100).round(2)
-            
+        if ozet['toplam']:
+            def _fiyatli_katalog():
+                """Tam katalog + hesap kolonları; yalnızca satır bazlı araçlar (hedef fiyat
+                tablosu, Monte Carlo risk tablosu) açıkken yüklenir, özet bölümleri kullanmaz."""
+                with st.spinner('Analiz hesaplanıyor...'):
+                    fiyatli = load_priced_catalog(params, version)
+                return with_price_columns(_tam_katalog(), fiyatli), fiyatli
+
+            def _ozet_tablosu(urunler):
+                return pd.DataFrame({
+                    'title': [u['title'] for u in urunler],
+                    'Kar Marjı': [u['kar_cents'] / 100 for u in urunler],
+                    'Kar Marjı %': [round(u['kar_yuzde'], 2) for u in urunler],
+                })
+
             # Genel istatistikler
             st.subheader("📊 Genel İstatistikler")
             
             col1, col2, col3, col4 = st.columns(4)
             
             with col1:
-                st.metric("Toplam Ürün", len(df))
+                st.metric("Toplam Ürün", ozet['toplam'])
             with col2:
-                karlı_urun = len(df[df['Kar Marjı'] > 0])
-                st.metric("Karlı Ürün", karlı_urun)
+                st.metric("Karlı Ürün", ozet['karli'])
             with col3:
-                zararlı_urun = len(df[df['Kar Marjı'] < 0])
-                st.metric("Zararlı Ürün", zararlı_urun)
+                st.metric("Zararlı Ürün", ozet['zararli'])
             with col4:
-                ortalama_kar = df['Kar Marjı %'].mean()
-                st.metric("Ortalama Kar %", f"{ortalama_kar:.1f}%")
+                ortalama_kar = ozet['ortalama_kar_yuzde']
+                st.metric("Ortalama Kar %", f"{ortalama_kar if ortalama_kar is not None else float('nan'):.1f}%")
             
             # En karlı ve en zararlı ürünler
             st.subheader("🏆 En İyi ve En Kötü Performans")
@@ -1404,25 +3717,16 @@ def main():
             
             with col1:
                 st.write("**En Karlı 5 Ürün:**")
-                top_profitable = df.nlargest(5, 'Kar Marjı')[['title', 'Kar Marjı', 'Kar Marjı %']]
-                st.dataframe(top_profitable, hide_index=True)
+                st.dataframe(_ozet_tablosu(ozet['en_karli'][:5]), hide_index=True)
             
             with col2:
                 st.write("**En Zararlı 5 Ürün:**")
-                top_loss = df.nsmallest(5, 'Kar Marjı')[['title', 'Kar Marjı', 'Kar Marjı %']]
-                st.dataframe(top_loss, hide_index=True)
+                st.dataframe(_ozet_tablosu(ozet['en_zararli'][:5]), hide_index=True)
             
             # Kar marjı dağılımı
             st.subheader("📊 Kar Marjı Dağılımı")
             
-            kar_araliklari = {
-                'Çok Yüksek (>40%)': len(df[df['Kar Marjı %'] > 40]),
-                'Yüksek (30-40%)': len(df[(df['Kar Marjı %'] >= 30) & (df['Kar Marjı %'] <= 40)]),
-                'Orta (20-30%)': len(df[(df['Kar Marjı %'] >= 20) & (df['Kar Marjı %'] < 30)]),
-                'Düşük (10-20%)': len(df[(df['Kar Marjı %'] >= 10) & (df['Kar Marjı %'] < 20)]),
-                'Çok Düşük (0-10%)': len(df[(df['Kar Marjı %'] >= 0) & (df['Kar Marjı %'] < 10)]),
-                'Zararlı (<0%)': len(df[df['Kar Marjı %'] < 0])
-            }
+            kar_araliklari = {etiket: ozet['dagilim'][anahtar] for anahtar, etiket in KAR_ARALIKLARI}
             
             kar_df = pd.DataFrame(list(kar_araliklari.items()), columns=['Aralık', 'Ürün Sayısı'])
             
@@ -1456,12 +3760,11 @@ def main():
 
             # Pareto analizi (kâr katkısına göre ilk %20 ürün)
             st.subheader("🧮 Pareto Analizi (%20 Ürün)")
-            if len(df) > 0:
-                sorted_df = df.sort_values('Kar Marjı', ascending=False)
-                n_top = max(1, int(len(sorted_df) * 0.2))
-                pareto_df = sorted_df.head(n_top)
-                total_profit = float(df['Kar Marjı'].sum())
-                pareto_profit = float(pareto_df['Kar Marjı'].sum())
+            if ozet['toplam'] > 0:
+                n_top = ozet['pareto_adet']
+                # Toplamlar tam sayı sentler üzerinden (kayan nokta birikimi yok)
+                total_profit = ozet['toplam_kar_cents'] / 100
+                pareto_profit = ozet['pareto_kar_cents'] / 100
                 pareto_share = (pareto_profit / total_profit * 100.0) if total_profit > 0 else 0.0
                 pc1, pc2, pc3 = st.columns(3)
                 with pc1:
@@ -1471,70 +3774,246 @@ def main():
                 with pc3:
                     st.metric("Pareto Kâr Payı", f"{pareto_share:.1f}%")
                 st.write("En yüksek katkı yapan ürünler:")
-                st.dataframe(pareto_df[['title', 'Kar Marjı', 'Kar Marjı %']].head(10), hide_index=True)
+                st.dataframe(_ozet_tablosu(ozet['en_karli'][:min(n_top, 10)]), hide_index=True)
 
             # Rota bazlı kazanım (tasarruf)
             st.subheader("🛣️ Rota Bazlı Kazanım")
-            save_nl = sum(h['cost_difference'] for h in hesaplama_sonuclari if h['optimal_route'] == 'TR→NL→DE')
-            save_de = sum(h['cost_difference'] for h in hesaplama_sonuclari if h['optimal_route'] == 'TR→DE')
-            cnt_nl = sum(1 for h in hesaplama_sonuclari if h['optimal_route'] == 'TR→NL→DE')
-            cnt_de = sum(1 for h in hesaplama_sonuclari if h['optimal_route'] == 'TR→DE')
-            rc1, rc2, rc3, rc4 = st.columns(4)
-            with rc1:
-                st.metric("Hollanda Üzerinden Tasarruf", f"€{save_nl:.2f}")
-            with rc2:
-                st.metric("Direkt Rota Avantajı", f"€{save_de:.2f}")
-            with rc3:
-                st.metric("NL Rota Ürün Sayısı", cnt_nl)
-            with rc4:
-                st.metric("Direkt Rota Ürün Sayısı", cnt_de)
+            route_save_cols = st.columns(len(ozet['rotalar']))
+            for rota, rcol in zip(ozet['rotalar'], route_save_cols):
+                with rcol:
+                    st.metric(f"{rota['rota']} Tasarrufu", f"€{rota['tasarruf_cents'] / 100:.2f}")
+                    st.metric(f"{rota['rota']} Ürün Sayısı", rota['adet'])
+
+            # Hedef fiyat çözücü (tüm ürünler için kapalı form)
+            st.subheader("🎯 Hedef Fiyat Çözücü")
+            # Kapalıyken tam katalog yüklenip fiyatlanmaz
+            if st.toggle("Tüm ürünler için başabaş ve hedef fiyatları hesapla", value=False, key="analiz_hedef_fiyat"):
+                df, priced = _fiyatli_katalog()
+                tc1, tc2, tc3 = st.columns(3)
+                with tc1:
+                    hedef_turu = st.radio("Hedef", ["Kâr Marjı %", "ROI"], horizontal=True)
+                with tc2:
+                    if hedef_turu == "Kâr Marjı %":
+                        hedef_deger = st.number_input("Hedef Kâr Marjı (%)", value=20.0, min_value=-50.0, max_value=95.0, step=0.5)
+                    else:
+                        hedef_deger = st.number_input("Hedef ROI", value=0.5, min_value=-1.0, max_value=20.0, step=0.05)
+                with tc3:
+                    hedef_rota = st.selectbox("Uygulanacak rota", ["Optimal"] + route_labels())
+
+                if hedef_turu == "Kâr Marjı %":
+                    solved = solve_target_prices(priced, params, hedef_marj=hedef_deger)
+                else:
+                    solved = solve_target_prices(priced, params, hedef_roi=hedef_deger)
+                hedef_kolon = 'optimal_hedef' if hedef_rota == "Optimal" else f"{route_key(hedef_rota)}_hedef"
+
+                hedef_cols = {
+                    'title': df['title'],
+                    'ean': df['ean'].astype(str),
+                    'Satış Fiyatı': solved['satis_fiyati'],
+                }
+                for route in ROUTES:
+                    hedef_cols[f"{route['label']} Başabaş"] = solved[f"{route['key']}_basabas"]
+                    hedef_cols[f"{route['label']} Hedef"] = solved[f"{route['key']}_hedef"]
+                hedef_cols['Optimal Rota'] = solved['optimal_route']
+                hedef_cols['Optimal Başabaş'] = solved['optimal_basabas']
+                hedef_cols['Optimal Hedef'] = solved['optimal_hedef']
+                hedef_df = pd.DataFrame(hedef_cols)
+                hedef_df['Fark (Hedef - Mevcut)'] = solved[hedef_kolon] - solved['satis_fiyati']
+                hedef_df = hedef_df.round(2)
+
+                if solved[hedef_kolon].isna().all():
+                    st.warning("⚠️ Bu hedef mevcut vergi/kesinti oranlarıyla ulaşılamaz (vergi + kesinti + hedef ≥ %100).")
+                alt_hedef = int((hedef_df['Fark (Hedef - Mevcut)'] > 0).sum())
+                st.caption(f"{alt_hedef} ürünün mevcut fiyatı hedefin altında.")
+                st.dataframe(hedef_df, use_container_width=True, hide_index=True)
+
+                hedef_csv = io.StringIO()
+                hedef_df.to_csv(hedef_csv, index=False)
+                st.download_button(
+                    label="📁 Hedef Fiyatları CSV Olarak İndir",
+                    data=hedef_csv.getvalue(),
+                    file_name=f"kaufland_hedef_fiyatlar_{datetime.now().strftime('%Y%m%d_%H%M')}.csv",
+                    mime="text/csv"
+                )
 
+                yalniz_alttakiler = st.checkbox("Yalnızca fiyatı hedefin altında olanları güncelle", value=True)
+                if st.button("Hedef fiyatları uygula", type="primary"):
+                    yeni_fiyat = pd.Series(round_up_cents(solved[hedef_kolon]), index=solved.index)
+                    secim = yeni_fiyat.notna()
+                    if yalniz_alttakiler:
+                        secim &= yeni_fiyat > solved['satis_fiyati']
+                    fiyat_map = dict(zip(product_keys(df)[secim], yeni_fiyat[secim]))
+                    guncellenen = update_products({k: {'fiyat': format_euro(v)} for k, v in fiyat_map.items()}) if fiyat_map else 0
+                    if guncellenen:
+                        st.success(f"✅ {guncellenen} ürünün fiyatı güncellendi.")
+                        st.rerun()
+                    else:
+                        st.warning("Güncellenecek ürün bulunamadı.")
             # Senaryo analizi (what-if)
             st.subheader("🧪 Senaryo Analizi (What‑if)")
-            with st.expander("Parametreleri göreli değiştir (uygulamaya yazmadan)", expanded=False):
-                sc1, sc2, sc3 = st.columns(3)
-                with sc1:
-                    komisyon_delta = st.number_input("Komisyon (puan)", value=2.0, min_value=-10.0, max_value=10.0, step=0.5)
-                with sc2:
-                    reklam_delta = st.number_input("Reklam (€)", value=1.0, min_value=-20.0, max_value=20.0, step=0.5)
-                with sc3:
-                    vergi_delta = st.number_input("Vergi (puan)", value=0.0, min_value=-10.0, max_value=10.0, step=0.5)
-
-                scenario_params = {
-                    'reklam_maliyeti': max(0.0, params['reklam_maliyeti'] + reklam_delta),
-                    'pazaryeri_kesintisi': min(100.0, max(0.0, params['pazaryeri_kesintisi'] + komisyon_delta)),
-                    'vergi_yuzdesi': min(100.0, max(0.0, params['vergi_yuzdesi'] + vergi_delta)),
-                }
+            # Tek senaryo veritabanı özetleriyle hesaplanır; ızgara ve Monte Carlo tam katalog
+            # üzerinde yerelde çalışır ve yalnızca seçildiklerinde yüklenir
+            if st.toggle("Parametreleri göreli değiştir (uygulamaya yazmadan)", value=False, key="analiz_senaryo"):
+                senaryo_modu = st.radio(
+                    "Mod",
+                    ["Tek senaryo", "Izgara (tüm kombinasyonlar)", "Monte Carlo (risk)"],
+                    horizontal=True,
+                    help=(
+                        "Izgara modunda seçilen aralıklardaki tüm komisyon × reklam × vergi kombinasyonları tek seferde hesaplanır. "
+                        "Monte Carlo modunda navlun, reklam ve komisyon oynaklığı altında ürün bazlı zarar olasılığı simüle edilir."
+                    )
+                )
+                if senaryo_modu == "Tek senaryo":
+                    sc1, sc2, sc3 = st.columns(3)
+                    with sc1:
+                        komisyon_delta = st.number_input("Komisyon (puan)", value=2.0, min_value=-10.0, max_value=10.0, step=0.5)
+                    with sc2:
+                        reklam_delta = st.number_input("Reklam (€)", value=1.0, min_value=-20.0, max_value=20.0, step=0.5)
+                    with sc3:
+                        vergi_delta = st.number_input("Vergi (puan)", value=0.0, min_value=-10.0, max_value=10.0, step=0.5)
 
-                with st.spinner('Senaryo hesaplanıyor...'):
-                    hesaplama_sonuclari_scn = []
-                    for _, row in df.iterrows():
-                        hesaplama_sonuclari_scn.append(calculate_total_cost(row, scenario_params))
-                df_scn = df.copy()
-                df_scn['Son Maliyet'] = [h['son_maliyet'] for h in hesaplama_sonuclari_scn]
-                df_scn['Kar Marjı'] = df_scn['Satış Fiyatı'] - df_scn['Son Maliyet']
-                df_scn['Kar Marjı %'] = ((df_scn['Satış Fiyatı'] - df_scn['Son Maliyet']) / df_scn['Satış Fiyatı'] * 100).round(2)
-
-                base_total_profit = float(df['Kar Marjı'].sum())
-                scn_total_profit = float(df_scn['Kar Marjı'].sum())
-                base_profitable = int((df['Kar Marjı'] > 0).sum())
-                scn_profitable = int((df_scn['Kar Marjı'] > 0).sum())
-                base_avg_pct = float(df['Kar Marjı %'].mean()) if len(df) else 0.0
-                scn_avg_pct = float(df_scn['Kar Marjı %'].mean()) if len(df_scn) else 0.0
-
-                mc1, mc2, mc3 = st.columns(3)
-                with mc1:
-                    st.metric("Toplam Kâr (Senaryo)", f"€{scn_total_profit:.2f}", delta=f"€{(scn_total_profit - base_total_profit):.2f}")
-                with mc2:
-                    st.metric("Kârlı Ürün (Senaryo)", scn_profitable, delta=scn_profitable - base_profitable)
-                with mc3:
-                    st.metric("Ortalama Kâr % (Senaryo)", f"{scn_avg_pct:.1f}%", delta=f"{(scn_avg_pct - base_avg_pct):.1f} pp")
-            
+                    scenario_params = {
+                        'reklam_maliyeti': max(0.0, params['reklam_maliyeti'] + reklam_delta),
+                        'pazaryeri_kesintisi': min(100.0, max(0.0, params['pazaryeri_kesintisi'] + komisyon_delta)),
+                        'vergi_yuzdesi': min(100.0, max(0.0, params['vergi_yuzdesi'] + vergi_delta)),
+                    }
+
+                    # Senaryo özeti de mevcut özet gibi (Supabase'de veritabanında) hesaplanır
+                    with st.spinner('Senaryo hesaplanıyor...'):
+                        ozet_scn = load_analysis_summary(scenario_params, version)
+
+                    base_total_profit = ozet['toplam_kar_cents'] / 100
+                    scn_total_profit = ozet_scn['toplam_kar_cents'] / 100
+                    base_profitable = ozet['karli']
+                    scn_profitable = ozet_scn['karli']
+                    base_avg_pct = ozet['ortalama_kar_yuzde'] or 0.0
+                    scn_avg_pct = ozet_scn['ortalama_kar_yuzde'] or 0.0
+
+                    mc1, mc2, mc3 = st.columns(3)
+                    with mc1:
+                        st.metric("Toplam Kâr (Senaryo)", f"€{scn_total_profit:.2f}", delta=f"€{(scn_total_profit - base_total_profit):.2f}")
+                    with mc2:
+                        st.metric("Kârlı Ürün (Senaryo)", scn_profitable, delta=scn_profitable - base_profitable)
+                    with mc3:
+                        st.metric("Ortalama Kâr % (Senaryo)", f"{scn_avg_pct:.1f}%", delta=f"{(scn_avg_pct - base_avg_pct):.1f} pp")
+                elif senaryo_modu == "Izgara (tüm kombinasyonlar)":
+                    gc1, gc2, gc3 = st.columns(3)
+                    with gc1:
+                        komisyon_araligi = st.slider("Komisyon aralığı (%)", 0.0, 50.0, (15.0, 30.0), step=0.5)
+                        komisyon_adim = st.number_input("Komisyon adım sayısı", min_value=2, max_value=50, value=20)
+                    with gc2:
+                        reklam_araligi = st.slider("Reklam aralığı (€)", 0.0, 30.0, (0.0, 10.0), step=0.25)
+                        reklam_adim = st.number_input("Reklam adım sayısı", min_value=2, max_value=50, value=20)
+                    with gc3:
+                        vergi_araligi = st.slider("Vergi aralığı (%)", 0.0, 30.0, (7.0, 19.0), step=0.5)
+                        vergi_adim = st.number_input("Vergi adım sayısı", min_value=1, max_value=20, value=5)
+
+                    komisyon_values = np.round(np.linspace(komisyon_araligi[0], komisyon_araligi[1], int(komisyon_adim)), 4)
+                    reklam_values = np.round(np.linspace(reklam_araligi[0], reklam_araligi[1], int(reklam_adim)), 4)
+                    vergi_values = np.round(np.linspace(vergi_araligi[0], vergi_araligi[1], int(vergi_adim)), 4)
+
+                    t0 = datetime.now()
+                    with st.spinner('Senaryo ızgarası hesaplanıyor...'):
+                        try:
+                            grid_profit, grid_profitable = load_scenario_grid(komisyon_values, reklam_values, vergi_values, version)
+                        except CatalogLoadError as e:
+                            st.error(f"❌ Ürün kataloğu yüklenemedi: {e}")
+                            st.stop()
+                    gecen_ms = (datetime.now() - t0).total_seconds() * 1000
+                    st.caption(f"{grid_profit.size} senaryo × {ozet['toplam']} ürün — {gecen_ms:.0f} ms")
+
+                    # En iyi senaryo (en yüksek toplam kâr)
+                    bi, bj, bk = np.unravel_index(int(np.argmax(grid_profit)), grid_profit.shape)
+                    bc1, bc2, bc3 = st.columns(3)
+                    with bc1:
+                        st.metric("En Yüksek Toplam Kâr", f"€{grid_profit[bi, bj, bk]:.2f}")
+                    with bc2:
+                        st.metric("Kârlı Ürün (bu senaryoda)", int(grid_profitable[bi, bj, bk]))
+                    with bc3:
+                        st.metric("Senaryo", f"%{komisyon_values[bi]:g} / €{reklam_values[bj]:g} / %{vergi_values[bk]:g}")
+
+                    vergi_secimi = st.select_slider(
+                        "Isı haritası için vergi (%)",
+                        options=[float(x) for x in vergi_values],
+                        value=float(vergi_values[-1])
+                    )
+                    vk = int(np.argmin(np.abs(vergi_values - vergi_secimi)))
+                    hc1, hc2 = st.columns(2)
+                    with hc1:
+                        st.altair_chart(
+                            _grid_heatmap(grid_profit[:, :, vk], komisyon_values, reklam_values, 'Toplam Kâr (€)', ',.2f'),
+                            use_container_width=True
+                        )
+                    with hc2:
+                        st.altair_chart(
+                            _grid_heatmap(grid_profitable[:, :, vk], komisyon_values, reklam_values, 'Kârlı Ürün Sayısı', 'd'),
+                            use_container_width=True
+                        )
+                else:
+                    st.caption(
+                        "Her bileşen için dağılım ve göreli oynaklığı (standart sapma, %) seçin. "
+                        "Her çekiliş bir ay gibidir: çarpan tüm ürünlere ortak uygulanır ve her ürün o ay en ucuz rotayı kullanır."
+                    )
+                    volatility = {}
+                    for c in risk_components():
+                        vc1, vc2, vc3 = st.columns([2, 2, 2])
+                        with vc1:
+                            st.markdown(f"**{COST_COLUMN_LABELS.get(c, c)}**")
+                        with vc2:
+                            dagilim = st.selectbox("Dağılım", RISK_DISTRIBUTIONS, key=f"mc_dagilim_{c}", label_visibility="collapsed")
+                        with vc3:
+                            oynaklik = st.number_input(
+                                "Oynaklık (%)", min_value=0.0, max_value=100.0, step=1.0,
+                                value=DEFAULT_RISK_VOLATILITY.get(c, DEFAULT_RISK_VOLATILITY["navlun"]),
+                                key=f"mc_oynaklik_{c}", label_visibility="collapsed"
+                            )
+                        volatility[c] = (dagilim, oynaklik / 100)
+
+                    rc1, rc2, rc3 = st.columns(3)
+                    with rc1:
+                        cekilis = st.number_input("Çekiliş sayısı", min_value=100, max_value=50000, value=10000, step=1000)
+                    with rc2:
+                        tohum = st.number_input("Rastgele tohum", min_value=0, max_value=2**31 - 1, value=42, step=1)
+                    with rc3:
+                        risk_esigi = st.slider("Riskli ürün eşiği (zarar olasılığı %)", 1, 100, 10)
+
+                    df, priced = _fiyatli_katalog()
+                    t0 = datetime.now()
+                    with st.spinner('Monte Carlo simülasyonu çalışıyor...'):
+                        risk_df, portfoy = load_margin_risk(params, volatility, cekilis, tohum, version)
+                    gecen_ms = (datetime.now() - t0).total_seconds() * 1000
+                    st.caption(f"{int(cekilis)} çekiliş × {len(df)} ürün — {gecen_ms:.0f} ms")
+
+                    p5, p50, p95 = np.percentile(portfoy, [5, 50, 95]) if len(portfoy) else (0.0, 0.0, 0.0)
+                    riskli = int((risk_df['zarar_olasiligi'] * 100 >= risk_esigi).sum())
+                    mk1, mk2, mk3, mk4 = st.columns(4)
+                    with mk1:
+                        st.metric("Beklenen Toplam Kâr", f"€{float(portfoy.mean()):.2f}")
+                    with mk2:
+                        st.metric("Portföy P5 / P95", f"€{p5:.0f} / €{p95:.0f}")
+                    with mk3:
+                        st.metric("Portföy Zarar Olasılığı", f"{float((portfoy < 0).mean()) * 100:.1f}%")
+                    with mk4:
+                        st.metric("Riskli Ürün", riskli)
+
+                    st.altair_chart(_profit_histogram(portfoy, 'Portföy Toplam Kâr (€)'), use_container_width=True)
+
+                    risk_tablo = pd.DataFrame({
+                        'title': df['title'],
+                        'ean': df['ean'].astype(str),
+                        'Kar Marjı': df['Kar Marjı'],
+                        'Zarar Olasılığı %': risk_df['zarar_olasiligi'] * 100,
+                        'P5 Kâr': risk_df['kar_p5'],
+                        'P50 Kâr': risk_df['kar_p50'],
+                        'P95 Kâr': risk_df['kar_p95'],
+                    }).sort_values('Zarar Olasılığı %', ascending=False).round(2)
+                    st.dataframe(risk_tablo, use_container_width=True, hide_index=True)
+        
             # Öneriler
             st.subheader("💡 Öneriler")
             
-            zararlı_urun_sayisi = len(df[df['Kar Marjı'] < 0])
-            düşük_kar_sayisi = len(df[(df['Kar Marjı %'] >= 0) & (df['Kar Marjı %'] < 20)])
+            zararlı_urun_sayisi = ozet['zararli']
+            düşük_kar_sayisi = ozet['dagilim']['cok_dusuk'] + ozet['dagilim']['dusuk']
             
             if zararlı_urun_sayisi > 0:
                 st.warning(f"⚠️ {zararlı_urun_sayisi} ürün zarar ediyor. Bu ürünlerin fiyatlarını gözden geçirin.")
@@ -1542,7 +4021,7 @@ def main():
             if düşük_kar_sayisi > 0:
                 st.info(f"ℹ️ {düşük_kar_sayisi} ürünün kar marjı %20'nin altında. Fiyat optimizasyonu düşünebilirsiniz.")
             
-            if ortalama_kar > 20:
+            if ortalama_kar is not None and ortalama_kar > 20:
                 st.success("✅ Genel kar marjı sağlıklı seviyede!")
         else:
             st.info("Analiz yapabilmek için önce ürün eklemelisiniz.")
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Supabase toplu yükleyici
+Migration script'lerinin ortak kullandığı paralel, kaldığı yerden devam edebilen yükleyici.
+
+- EAN'lı satırlar `upsert(on_conflict="ean")` ile yazılır; EAN'sız satırlar title bazında
+  sil+ekle ile yazılır (uygulamadaki `sync_products` ile aynı kural). Böylece script'i
+  yeniden çalıştırmak güvenlidir.
+- Batch boyutu uyarlanır: hızlı biten isteklerde büyür, yavaş/başarısız isteklerde küçülür.
+- Tamamlanan satır aralıkları checkpoint dosyasına yazılır; hata sonrası aynı CSV ile
+  yeniden çalıştırıldığında yalnızca eksik aralıklar yüklenir.
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+CHECKPOINT_FILE = ".migrate_checkpoint.json"
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_SIZE = 500
+MIN_BATCH_SIZE = 20
+MAX_BATCH_SIZE = 2000
+TARGET_BATCH_SECONDS = 2.0  # bu süreden hızlı biten batch'ler büyütülür, yavaşlar küçültülür
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5  # saniye; her denemede iki katına çıkar
+REPORT_INTERVAL = 2.0  # saniye; ilerleme satırları en fazla bu sıklıkla yazılır
+
+
+class BulkLoadError(RuntimeError):
+    """Bir batch tüm denemelere rağmen yazılamadığında fırlatılır (checkpoint kaydedilmiştir)."""
+
+
+def _has_ean(frame):
+    return ~frame['ean'].astype(str).str.strip().isin(["", "nan", "None"])
+
+
+def dedupe_by_key(df):
+    """Aynı EAN'ı (EAN yoksa title'ı) taşıyan satırlardan sonuncusunu tutar; upsert aynı
+    satırı tek istekte iki kez güncelleyemez. Dönüş: (tablo, atılan satır sayısı)."""
+    keys = df['ean'].astype(str).str.strip().where(_has_ean(df), df['title'].astype(str))
+    keep = ~keys.duplicated(keep="last")
+    return df[keep.to_numpy()].reset_index(drop=True), int((~keep).sum())
+
+
+def data_fingerprint(df):
+    """Checkpoint'in aynı veri için kullanıldığını doğrulayan içerik özeti."""
+    hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+    return hashlib.sha1(hashes.tobytes()).hexdigest()
+
+
+class Checkpoint:
+    """Tamamlanan [başlangıç, bitiş) satır aralıklarını birleştirerek saklar."""
+
+    def __init__(self, path, fingerprint, total):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.total = total
+        self.done = []
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("fingerprint") == fingerprint and data.get("total") == total:
+                    self.done = [tuple(r) for r in data.get("done", [])]
+            except (OSError, ValueError):
+                pass
+
+    @property
+    def completed(self):
+        return sum(e - s for s, e in self.done)
+
+    def remaining(self):
+        """Henüz yüklenmemiş aralıklar."""
+        gaps, cursor = [], 0
+        for s, e in sorted(self.done):
+            if s > cursor:
+                gaps.append((cursor, s))
+            cursor = max(cursor, e)
+        if cursor < self.total:
+            gaps.append((cursor, self.total))
+        return gaps
+
+    def mark(self, start, end):
+        merged = []
+        for s, e in sorted(self.done + [(start, end)]):
+            if merged and s <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((s, e))
+        self.done = merged
+        self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": self.fingerprint, "total": self.total, "done": self.done}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def postgrest_in(values):
+    """PostgREST `in.(...)` filtre değeri. Her değer çift tırnağa alınır; içindeki `"` ve `\\`
+    ters eğik çizgiyle kaçışlanır. Böylece virgül, parantez ya da tırnak içeren ürün
+    başlıkları tek bir değer olarak eşleşir (başka satırları silmez, isteği bozmaz)."""
+    return "(" + ",".join('"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values) + ")"
+
+
+def _write_batch(client, rows, table):
+    """Bir batch'i idempotent olarak yazar."""
+    ean_rows = [r for r in rows if str(r.get('ean', '')).strip() not in ("", "nan", "None")]
+    title_rows = [dict(r, ean=None) for r in rows if str(r.get('ean', '')).strip() in ("", "nan", "None")]
+    if ean_rows:
+        client.table(table).upsert(ean_rows, on_conflict="ean").execute()
+    if title_rows:
+        titles = [r['title'] for r in title_rows]
+        client.table(table).delete().filter("title", "in", postgrest_in(titles)).or_("ean.is.null,ean.eq.").execute()
+        client.table(table).insert(title_rows).execute()
+    return len(rows)
+
+
+def _format_seconds(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600} sa {seconds % 3600 // 60} dk"
+    if seconds >= 60:
+        return f"{seconds // 60} dk {seconds % 60} sn"
+    return f"{seconds} sn"
+
+
+def bulk_upsert(client, df, table="products", workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                checkpoint_file=CHECKPOINT_FILE, resume=True, report=print):
+    """`df` satırlarını (metin kolonlar) paralel ve kaldığı yerden devam ederek yükler.
+
+    `workers` eşzamanlı istek sayısı, `batch_size` başlangıç batch boyutudur; boyut
+    MIN_BATCH_SIZE ile MAX_BATCH_SIZE arasında istek süresine göre uyarlanır.
+    Başarısız batch küçültülerek yeniden denenir; en küçük boyutta da yazılamazsa
+    checkpoint kaydedilir ve BulkLoadError fırlatılır.
+    Dönüş: {"yuklenen": n, "atlanan": m, "sure": saniye}.
+    """
+    records = df.to_dict('records')
+    total = len(records)
+    checkpoint = Checkpoint(checkpoint_file, data_fingerprint(df), total)
+    if not resume:
+        checkpoint.done = []
+    atlanan = checkpoint.completed
+    if atlanan:
+        report(f"↩️  Checkpoint bulundu: {atlanan}/{total} satır zaten yüklenmiş, kalanlardan devam ediliyor")
+
+    pending = list(reversed(checkpoint.remaining()))  # sondan alınır (pop)
+    size = max(MIN_BATCH_SIZE, min(MAX_BATCH_SIZE, batch_size))
+    loaded = 0
+    failure = None
+    t0 = last_report = time.perf_counter()
+
+    def _run(start, end):
+        error = None
+        for attempt in range(MAX_RETRIES):
+            try:
+                t = time.perf_counter()
+                _write_batch(client, records[start:end], table)
+                return time.perf_counter() - t
+            except Exception as e:
+                error = e
+                time.sleep(RETRY_BACKOFF * 2 ** attempt)
+        raise error
+
+    def _next_range():
+        start, end = pending.pop()
+        if end - start > size:
+            pending.append((start + size, end))
+            end = start + size
+        return start, end
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as ex:
+        running = {}
+        while pending or running:
+            while pending and failure is None and len(running) < max(1, workers):
+                start, end = _next_range()
+                running[ex.submit(_run, start, end)] = (start, end)
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                start, end = running.pop(fut)
+                try:
+                    elapsed = fut.result()
+                except Exception as e:
+                    if end - start > MIN_BATCH_SIZE:
+                        # Büyük istek zaman aşımı/boyut sınırına takılmış olabilir: böl ve yeniden dene
+                        size = max(MIN_BATCH_SIZE, (end - start) // 2)
+                        pending.append((start, end))
+                    elif failure is None:
+                        failure = (start, end, e)
+                    continue
+                checkpoint.mark(start, end)
+                loaded += end - start
+                if elapsed < TARGET_BATCH_SECONDS / 2:
+                    size = min(MAX_BATCH_SIZE, size * 2)
+                elif elapsed > TARGET_BATCH_SECONDS:
+                    size = max(MIN_BATCH_SIZE, size // 2)
+
+            now = time.perf_counter()
+            if now - last_report >= REPORT_INTERVAL or not (pending or running):
+                last_report = now
+                done = atlanan + loaded
+                rate = loaded / max(now - t0, 1e-9)
+                eta = (total - done) / rate if rate > 0 else float("inf")
+                eta_txt = _format_seconds(eta) if eta != float("inf") else "?"
+                report(f"   ⏳ {done}/{total} satır (%{done * 100 // max(total, 1)}) · "
+                       f"{rate:,.0f} satır/sn · kalan ~{eta_txt} · batch {size}")
+
+    if failure is not None:
+        start, end, e = failure
+        raise BulkLoadError(
+            f"{start + 1}-{end} arası satırlar yazılamadı: {e}. "
+            f"İlerleme {checkpoint.path} dosyasına kaydedildi; script'i yeniden çalıştırarak devam edin."
+        )
+    checkpoint.clear()
+    return {"yuklenen": loaded, "atlanan": atlanan, "sure": time.perf_counter() - t0}
+
+
+def add_cli_arguments(parser):
+    """Migration script'lerine ortak yükleme seçeneklerini ekler."""
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"eşzamanlı yazma isteği sayısı (varsayılan {DEFAULT_WORKERS})")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"başlangıç batch boyutu; istek süresine göre uyarlanır (varsayılan {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE,
+                        help=f"ilerleme dosyası (varsayılan {CHECKPOINT_FILE})")
+    parser.add_argument("--restart", action="store_true",
+                        help="checkpoint'i yok say ve baştan yükle")
+    return parser
@@ -11,6 +11,7 @@ create extension if not exists pgcrypto;
 create table public.products (
   id uuid primary key default gen_random_uuid(),
   created_at timestamptz not null default now(),
+  updated_at timestamptz not null default now(),
 
   -- Business columns (kept as text to match app's current CSV/string format)
   title text,
@@ -28,10 +29,64 @@ create table public.products (
   reklam text
 );
 
--- Unique by EAN when present (ignore empty EANs)
-create unique index products_ean_unique
-  on public.products (ean)
-  where ean is not null and ean <> '';
+-- Unique by EAN (upsert on_conflict=ean); rows without an EAN store NULL.
+-- The table was just recreated, so the step below moves nothing here; it is kept so
+-- the index cannot fail if the script is run without the DROP above (same step as supabase.sql).
+create table if not exists public.products_ean_duplicates (
+  id uuid primary key,
+  created_at timestamptz,
+  updated_at timestamptz,
+  title text,
+  ean text,
+  iwasku text,
+  fiyat text,
+  ham_maliyet_euro text,
+  desi text,
+  tr_ne_navlun text,
+  ne_de_navlun text,
+  kara_tr_de_navlun text,
+  express_kargo text,
+  ddp text,
+  hava_tr_de_navlun text,
+  reklam text,
+  removed_at timestamptz not null default now()
+);
+-- No policies: not readable or writable through the anon API
+alter table public.products_ean_duplicates enable row level security;
+
+do $$
+declare
+  moved integer;
+begin
+  with dup as (
+    select id from (
+      select id, row_number() over (
+               partition by ean
+               order by updated_at desc, created_at desc, id desc
+             ) as rn
+      from public.products
+      where ean is not null
+    ) d
+    where d.rn > 1
+  ), copied as (
+    insert into public.products_ean_duplicates (
+      id, created_at, updated_at, title, ean, iwasku, fiyat, ham_maliyet_euro, desi,
+      tr_ne_navlun, ne_de_navlun, kara_tr_de_navlun, express_kargo, ddp, hava_tr_de_navlun, reklam
+    )
+    select p.id, p.created_at, p.updated_at, p.title, p.ean, p.iwasku, p.fiyat, p.ham_maliyet_euro, p.desi,
+           p.tr_ne_navlun, p.ne_de_navlun, p.kara_tr_de_navlun, p.express_kargo, p.ddp, p.hava_tr_de_navlun, p.reklam
+    from public.products p join dup using (id)
+    on conflict (id) do nothing
+    returning id
+  )
+  delete from public.products p using copied where p.id = copied.id;
+  get diagnostics moved = row_count;
+  if moved > 0 then
+    raise warning '% row(s) with a duplicate EAN moved to public.products_ean_duplicates; review them before deleting', moved;
+  end if;
+end $$;
+create unique index products_ean_key
+  on public.products (ean);
 
 -- Enable Row Level Security
 alter table public.products enable row level security;
@@ -52,6 +107,57 @@ create policy products_delete on public.products
 
 -- Optional: helpful index for title searches
 create index products_title_idx on public.products (title);
+create index products_updated_at_idx on public.products (updated_at);
+
+-- Change tracking for incremental refresh: the app keeps a watermark and only
+-- reads rows whose updated_at (or tombstone deleted_at) is newer than it.
+create or replace function public.products_set_updated_at()
+returns trigger language plpgsql as $$
+begin
+  new.updated_at := now();
+  return new;
+end $$;
+
+drop trigger if exists products_set_updated_at on public.products;
+create trigger products_set_updated_at
+  before update on public.products
+  for each row execute function public.products_set_updated_at();
+
+-- Tombstones: one row per deleted product (or per key change on update).
+-- Old tombstones can be purged once every app instance has polled past them, e.g.
+--   delete from public.products_deleted where deleted_at < now() - interval '7 days';
+drop table if exists public.products_deleted;
+create table public.products_deleted (
+  seq bigint generated always as identity primary key,
+  product_id uuid,
+  ean text,
+  title text,
+  deleted_at timestamptz not null default now()
+);
+create index if not exists products_deleted_deleted_at_idx on public.products_deleted (deleted_at);
+
+create or replace function public.products_write_tombstone()
+returns trigger language plpgsql security definer set search_path = public as $$
+begin
+  if tg_op = 'DELETE' then
+    insert into public.products_deleted (product_id, ean, title) values (old.id, old.ean, old.title);
+    return old;
+  end if;
+  if old.ean is distinct from new.ean or old.title is distinct from new.title then
+    insert into public.products_deleted (product_id, ean, title) values (old.id, old.ean, old.title);
+  end if;
+  return new;
+end $$;
+
+drop trigger if exists products_write_tombstone on public.products;
+create trigger products_write_tombstone
+  after delete or update on public.products
+  for each row execute function public.products_write_tombstone();
+
+alter table public.products_deleted enable row level security;
+drop policy if exists products_deleted_select on public.products_deleted;
+create policy products_deleted_select on public.products_deleted
+  for select using (true);
 
 -- Kontrol sorgusu
 SELECT 'Tablo başarıyla oluşturuldu!' as message;
@@ -0,0 +1,201 @@
+"""
+bulk_loader testleri: checkpoint aralıkları, PostgREST filtre kaçışı, yeniden deneme ve devam
+"""
+
+import json
+import threading
+
+import pandas as pd
+import pytest
+
+import bulk_loader
+
+
+class _Sorgu:
+    def __init__(self, istemci, tablo):
+        self.istemci = istemci
+        self.islem = {"tablo": tablo}
+
+    def upsert(self, satirlar, on_conflict=None):
+        self.islem.update(tur="upsert", satirlar=satirlar, on_conflict=on_conflict)
+        return self
+
+    def insert(self, satirlar):
+        self.islem.update(tur="insert", satirlar=satirlar)
+        return self
+
+    def delete(self):
+        self.islem["tur"] = "delete"
+        return self
+
+    def filter(self, kolon, operator, deger):
+        self.islem["filter"] = (kolon, operator, deger)
+        return self
+
+    def or_(self, filtre):
+        self.islem["or"] = filtre
+        return self
+
+    def execute(self):
+        return self.istemci.calistir(self.islem)
+
+
+class SahteIstemci:
+    """Çağrıları kaydeder; `hata` verilen satırları içeren yazımlar istisna fırlatır."""
+
+    def __init__(self, hata=lambda satirlar: False):
+        self.hata = hata
+        self.lock = threading.Lock()
+        self.islemler = []
+        self.denemeler = 0
+
+    def table(self, ad):
+        return _Sorgu(self, ad)
+
+    def calistir(self, islem):
+        with self.lock:
+            self.denemeler += 1
+            if self.hata(islem.get("satirlar", [])):
+                raise RuntimeError("istek zaman aşımı")
+            self.islemler.append(islem)
+        return type("Sonuc", (), {"data": islem.get("satirlar", [])})()
+
+    def yazilan_eanlar(self):
+        return sorted(r["ean"] for i in self.islemler if i["tur"] == "upsert" for r in i["satirlar"])
+
+
+def katalog(n, baslangic=0):
+    return pd.DataFrame({
+        "title": [f"Ürün {i}" for i in range(baslangic, baslangic + n)],
+        "ean": [str(10_000 + i) for i in range(baslangic, baslangic + n)],
+        "fiyat": ["€1.00"] * n,
+    })
+
+
+@pytest.fixture(autouse=True)
+def hizli_deneme(monkeypatch):
+    monkeypatch.setattr(bulk_loader, "RETRY_BACKOFF", 0.0)
+
+
+# --- Checkpoint -------------------------------------------------------------
+
+def test_checkpoint_bos_tum_aralik_kalir(tmp_path):
+    cp = bulk_loader.Checkpoint(str(tmp_path / "cp.json"), "fp", 100)
+    assert cp.remaining() == [(0, 100)]
+    assert cp.completed == 0
+
+
+def test_checkpoint_mark_birlestirir_ve_bosluklari_verir(tmp_path):
+    cp = bulk_loader.Checkpoint(str(tmp_path / "cp.json"), "fp", 100)
+    cp.mark(20, 30)
+    cp.mark(50, 60)
+    cp.mark(30, 40)      # bitişik: (20, 40)
+    cp.mark(55, 70)      # örtüşen: (50, 70)
+    assert cp.done == [(20, 40), (50, 70)]
+    assert cp.remaining() == [(0, 20), (40, 50), (70, 100)]
+    assert cp.completed == 40
+    cp.mark(0, 20)
+    cp.mark(40, 50)
+    cp.mark(70, 100)
+    assert cp.done == [(0, 100)]
+    assert cp.remaining() == []
+
+
+def test_checkpoint_diske_yazilir_ve_ayni_veriyle_yuklenir(tmp_path):
+    yol = str(tmp_path / "cp.json")
+    bulk_loader.Checkpoint(yol, "fp", 100).mark(0, 40)
+    assert json.loads(open(yol, encoding="utf-8").read())["done"] == [[0, 40]]
+
+    assert bulk_loader.Checkpoint(yol, "fp", 100).remaining() == [(40, 100)]
+    # Farklı veri (özet ya da satır sayısı) checkpoint'i geçersiz kılar
+    assert bulk_loader.Checkpoint(yol, "baska", 100).remaining() == [(0, 100)]
+    assert bulk_loader.Checkpoint(yol, "fp", 101).remaining() == [(0, 101)]
+
+
+def test_bozuk_checkpoint_yok_sayilir(tmp_path):
+    yol = tmp_path / "cp.json"
+    yol.write_text('{"fingerprint": "fp", "total": 10, "do', encoding="utf-8")
+    assert bulk_loader.Checkpoint(str(yol), "fp", 10).remaining() == [(0, 10)]
+
+
+# --- PostgREST filtresi -----------------------------------------------------
+
+def test_postgrest_in_ozel_karakterleri_kacislar():
+    assert bulk_loader.postgrest_in(["Harita, Dünya (büyük)", 'a"b', "c\\d", "düz"]) == \
+        '("Harita, Dünya (büyük)","a\\"b","c\\\\d","düz")'
+
+
+def test_ean_siz_satirlar_tirnakli_title_filtresiyle_silinir():
+    istemci = SahteIstemci()
+    satirlar = [{"title": 'Poster "A3", çerçeveli (2)', "ean": ""}, {"title": "Kalem", "ean": "nan"}]
+    bulk_loader._write_batch(istemci, satirlar, "products")
+    sil, ekle = istemci.islemler
+    assert sil["tur"] == "delete"
+    assert sil["filter"] == ("title", "in", '("Poster \\"A3\\", çerçeveli (2)","Kalem")')
+    assert sil["or"] == "ean.is.null,ean.eq."
+    assert ekle["tur"] == "insert"
+    assert [(r["title"], r["ean"]) for r in ekle["satirlar"]] == [('Poster "A3", çerçeveli (2)', None), ("Kalem", None)]
+
+
+# --- bulk_upsert --------------------------------------------------------------
+
+def test_tum_satirlar_yuklenir_ve_checkpoint_silinir(tmp_path):
+    yol = tmp_path / "cp.json"
+    istemci = SahteIstemci()
+    sonuc = bulk_loader.bulk_upsert(istemci, katalog(250), workers=3, batch_size=40,
+                                    checkpoint_file=str(yol), report=lambda m: None)
+    assert sonuc["yuklenen"] == 250 and sonuc["atlanan"] == 0
+    assert istemci.yazilan_eanlar() == sorted(katalog(250)["ean"])
+    assert not yol.exists()
+
+
+def test_basarisiz_buyuk_batch_bolunerek_yeniden_denenir(tmp_path):
+    # 64 satırdan büyük istekler "zaman aşımına" uğrar
+    istemci = SahteIstemci(hata=lambda satirlar: len(satirlar) > 64)
+    sonuc = bulk_loader.bulk_upsert(istemci, katalog(200), workers=1, batch_size=200,
+                                    checkpoint_file=str(tmp_path / "cp.json"), report=lambda m: None)
+    assert sonuc["yuklenen"] == 200
+    assert istemci.yazilan_eanlar() == sorted(katalog(200)["ean"])
+    assert max(len(i["satirlar"]) for i in istemci.islemler) <= 64
+
+
+def test_gecici_hata_ayni_batch_tekrar_denenir(tmp_path):
+    hatalar = iter([True, True, False])
+    istemci = SahteIstemci(hata=lambda satirlar: next(hatalar, False))
+    sonuc = bulk_loader.bulk_upsert(istemci, katalog(30), workers=1, batch_size=50,
+                                    checkpoint_file=str(tmp_path / "cp.json"), report=lambda m: None)
+    assert sonuc["yuklenen"] == 30
+    assert istemci.denemeler == 3
+    assert len(istemci.islemler) == 1
+
+
+def test_kalici_hatada_checkpoint_kaydedilir_ve_kalanlardan_devam_edilir(tmp_path):
+    yol = str(tmp_path / "cp.json")
+    df = katalog(120)
+    bozuk = df.loc[70, "ean"]
+    istemci = SahteIstemci(hata=lambda satirlar: any(r.get("ean") == bozuk for r in satirlar))
+    with pytest.raises(bulk_loader.BulkLoadError):
+        bulk_loader.bulk_upsert(istemci, df, workers=1, batch_size=bulk_loader.MIN_BATCH_SIZE,
+                                checkpoint_file=yol, report=lambda m: None)
+    ilk_yazilanlar = istemci.yazilan_eanlar()
+    assert bozuk not in ilk_yazilanlar
+    kalan = bulk_loader.Checkpoint(yol, bulk_loader.data_fingerprint(df), len(df)).remaining()
+    assert any(s <= 70 < e for s, e in kalan)
+
+    # İkinci çalıştırma yalnızca eksik aralıkları yükler
+    ikinci = SahteIstemci()
+    sonuc = bulk_loader.bulk_upsert(ikinci, df, workers=2, batch_size=50, checkpoint_file=yol, report=lambda m: None)
+    assert sonuc["atlanan"] == len(ilk_yazilanlar)
+    assert sonuc["yuklenen"] == len(df) - len(ilk_yazilanlar)
+    assert sorted(ilk_yazilanlar + ikinci.yazilan_eanlar()) == sorted(df["ean"])
+    assert not (tmp_path / "cp.json").exists()
+
+
+def test_restart_checkpointi_yok_sayar(tmp_path):
+    yol = str(tmp_path / "cp.json")
+    df = katalog(50)
+    bulk_loader.Checkpoint(yol, bulk_loader.data_fingerprint(df), len(df)).mark(0, 50)
+    istemci = SahteIstemci()
+    sonuc = bulk_loader.bulk_upsert(istemci, df, checkpoint_file=yol, resume=False, report=lambda m: None)
+    assert (sonuc["yuklenen"], sonuc["atlanan"]) == (50, 0)
+    assert istemci.yazilan_eanlar() == sorted(df["ean"])
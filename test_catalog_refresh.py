@@ -0,0 +1,73 @@
+"""
+Katalog yoklama testleri: filigran payı içinde imza değişmese de artımlı yenileme
+"""
+
+import pandas as pd
+import pytest
+
+import app
+
+
+@pytest.fixture
+def katalog_durumu(monkeypatch):
+    """Yüklü bir sürümü olan temiz katalog durumu; yenileme çağrıları sayılır."""
+    app._catalog_state.clear()
+    state = app._catalog_state()
+    state["versions"][0] = app._make_snapshot(pd.DataFrame(columns=app.DB_COLUMNS))
+    state["signature"] = ("supabase", 10, "2026-01-01T00:00:00+00:00")
+    cagrilar = []
+    monkeypatch.setattr(app, "probe_catalog_signature", lambda: state["signature"])
+    monkeypatch.setattr(app, "refresh_catalog", lambda: cagrilar.append(1) or 0)
+    yield state, cagrilar
+    app._catalog_state.clear()
+
+
+def test_pay_en_uzun_yazim_isleminden_uzun():
+    assert app.CATALOG_REFRESH_OVERLAP >= 60
+    assert app.CATALOG_REFRESH_OVERLAP > app.CATALOG_PROBE_TTL
+
+
+def test_imza_ayni_filigran_pay_icinde_yenilenir(katalog_durumu):
+    state, cagrilar = katalog_durumu
+    state["watermark"] = pd.Timestamp.now(tz="UTC") - pd.Timedelta(seconds=10)
+    app.validate_catalog(force=True)
+    assert cagrilar == [1]
+
+
+def test_imza_ayni_filigran_eski_yenilenmez(katalog_durumu):
+    state, cagrilar = katalog_durumu
+    state["watermark"] = pd.Timestamp.now(tz="UTC") - pd.Timedelta(seconds=app.CATALOG_REFRESH_OVERLAP + 60)
+    app.validate_catalog(force=True)
+    assert cagrilar == []
+
+
+def test_filigran_yoksa_yalnizca_imza_degisince_yoklanir(katalog_durumu):
+    state, cagrilar = katalog_durumu
+    state["watermark"] = None
+    app.validate_catalog(force=True)
+    assert cagrilar == []
+
+
+@pytest.fixture
+def yuklenmemis_katalog(monkeypatch):
+    """Katalog yüklenmemiş (okumalar yalnızca RPC'lerden); depo imzası test içinde değişir."""
+    app._catalog_state.clear()
+    state = app._catalog_state()
+    imza = {"deger": ("supabase", 10, "2026-01-01T00:00:00+00:00")}
+    monkeypatch.setattr(app, "probe_catalog_signature", lambda: imza["deger"])
+    monkeypatch.setattr(app, "refresh_catalog", lambda: pytest.fail("yüklenmemiş katalog yenilenmez"))
+    yield state, imza
+    app._catalog_state.clear()
+
+
+def test_yuklenmemis_katalogda_imza_degisince_surum_artar(yuklenmemis_katalog):
+    state, imza = yuklenmemis_katalog
+    assert app.validate_catalog(force=True) is False      # ilk yoklama yalnızca imzayı kaydeder
+    assert state["signature"] == imza["deger"] and app.catalog_version() == 0
+
+    assert app.validate_catalog(force=True) is False      # imza aynı
+    imza["deger"] = ("supabase", 11, "2026-01-01T00:05:00+00:00")
+    assert app.validate_catalog(force=True) is True
+    assert app.catalog_version() == 1
+    assert state["signature"] == imza["deger"]
+    assert not state["versions"]                          # tam katalog yüklenmedi
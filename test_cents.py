@@ -0,0 +1,68 @@
+"""
+Tam sayı sent aritmetiği testleri: to_cents, apply_rate, yuvarlama ve biçimleme
+"""
+
+import numpy as np
+import pytest
+
+import app
+
+
+@pytest.mark.parametrize("euro, cents", [
+    (12.17, 1217),      # 12.17*100 = 1216.999… ikili gösterim hatası
+    (0.29, 29),
+    (1.005, 101),
+    (0.005, 1),         # yarım sıfırdan uzağa
+    (-0.005, -1),
+    (-12.345, -1235),
+    (0.0, 0),
+])
+def test_to_cents(euro, cents):
+    assert int(app.to_cents(euro)) == cents
+
+
+def test_to_cents_dizi_ve_nan():
+    sonuc = app.to_cents([1.5, float("nan"), -2.25])
+    assert sonuc.dtype == np.int64
+    assert sonuc.tolist() == [150, 0, -225]
+
+
+@pytest.mark.parametrize("deger, beklenen", [
+    (0.5, 1), (1.5, 2), (2.5, 3), (-0.5, -1), (-2.5, -3),
+    (0.4999999, 1),     # 1e-6 hassasiyetine yuvarlanıp yarım sayılır
+    (0.49, 0), (-0.49, 0),
+])
+def test_round_half_away(deger, beklenen):
+    assert int(app._round_half_away(deger)) == beklenen
+
+
+@pytest.mark.parametrize("cents, yuzde, beklenen", [
+    (1000, 19, 190),
+    (250, 19, 48),      # 47.5 → 48
+    (-250, 19, -48),    # negatifte de sıfırdan uzağa
+    (250, -19, -48),
+    (1234, 7.5, 93),    # 92.55 → 93
+    (1000, 0, 0),
+    (0, 22, 0),
+])
+def test_apply_rate(cents, yuzde, beklenen):
+    assert int(app.apply_rate(cents, yuzde)) == beklenen
+
+
+def test_apply_rate_dizi_tam_sayi_kalir():
+    sonuc = app.apply_rate(np.array([100, 101, 102, 103]), 50)
+    assert sonuc.dtype == np.int64
+    assert sonuc.tolist() == [50, 51, 51, 52]
+
+
+@pytest.mark.parametrize("cents, metin", [
+    (1217, "€12.17"), (5, "€0.05"), (-5, "€-0.05"), (-1235, "€-12.35"), (0, "€0.00"),
+])
+def test_format_cents(cents, metin):
+    assert app.format_cents(cents) == metin
+
+
+def test_format_euro_gidis_donus():
+    euro = [12.17, 0.29, 99.99, -3.1]
+    metin = [app.format_euro(e) for e in euro]
+    assert app.parse_euro_series(metin).tolist() == pytest.approx(euro)
@@ -5,6 +5,9 @@ Hızlı Supabase bağlantı ve data test scripti
 
 from supabase import create_client
 import pandas as pd
+import pytest
+import json
+import os
 
 def test_supabase_connection():
     print("🔍 Supabase bağlantısı test ediliyor...")
@@ -74,16 +77,118 @@ def test_csv_data():
         print(f"❌ CSV okuma hatası: {str(e)}")
         return False
 
+def test_analysis_sql():
+    """analysis.sql fonksiyonlarını yerel bir PostgreSQL'de (ANALYSIS_TEST_DSN) çalıştırıp
+    özeti uygulamanın yerel hesabıyla karşılaştırır. Tablo yeniden oluşturulur!
+    psycopg2 yalnızca bu test için gerekir (uygulama bağımlılığı değildir)."""
+    dsn = os.environ.get("ANALYSIS_TEST_DSN")
+    if not dsn:
+        pytest.skip("ANALYSIS_TEST_DSN tanımlı değil")
+    psycopg2 = pytest.importorskip("psycopg2")
+    import app
+
+    print("\n🔍 analysis.sql yerel PostgreSQL üzerinde test ediliyor...")
+    con = psycopg2.connect(dsn)
+    con.autocommit = True
+    try:
+        cur = con.cursor()
+        # Düz PostgreSQL'de gen_random_uuid() yerleşiktir; pgcrypto kurulu olmayabilir
+        for dosya in ("recreate_table.sql", "analysis.sql"):
+            with open(dosya, encoding="utf-8") as f:
+                cur.execute(f.read().replace("create extension if not exists pgcrypto;", ""))
+
+        rows = app._sync_frame(pd.read_csv('kauflandurunler.csv')).astype(object)
+        bos = rows['ean'].isin(["", "nan", "None"])
+        rows.loc[bos, 'ean'] = None
+        rows = rows[~rows['ean'].duplicated(keep="last") | bos]
+        kolonlar = ",".join(app.DB_COLUMNS)
+        cur.executemany(
+            f"insert into public.products ({kolonlar}) values ({','.join(['%s'] * len(app.DB_COLUMNS))})",
+            [tuple(r) for r in rows[app.DB_COLUMNS].itertuples(index=False)],
+        )
+        cur.execute(f"select {kolonlar} from public.products order by id")
+        raw = pd.DataFrame(cur.fetchall(), columns=app.DB_COLUMNS)
+
+        for params in (app.DEFAULT_PARAMS, {"reklam_maliyeti": 0.0, "pazaryeri_kesintisi": 7.5, "vergi_yuzdesi": 0.0}):
+            a = app.analysis_rpc_args(params)
+            cur.execute(
+                "select public.analysis_summary(%s, %s, %s, %s::jsonb, %s)",
+                (a["p_reklam"], a["p_komisyon"], a["p_vergi"], json.dumps(a["p_routes"]), a["p_top"]),
+            )
+            db = cur.fetchone()[0]
+            yerel = json.loads(json.dumps(app.catalog_summary(app.price_catalog(raw, params), raw)))
+            assert set(db) == set(yerel), f"Özet anahtarları farklı: {sorted(set(db) ^ set(yerel))}"
+            for anahtar, deger in yerel.items():
+                if anahtar == "ortalama_kar_yuzde":
+                    assert (deger is None) == (db[anahtar] is None), f"{anahtar}: {db[anahtar]} != {deger} ({params})"
+                    if deger is not None:
+                        assert db[anahtar] == pytest.approx(deger, abs=1e-6), f"{anahtar} ({params})"
+                elif anahtar in ("en_karli", "en_zararli"):
+                    assert [(u["title"], u["kar_cents"]) for u in db[anahtar]] == \
+                        [(u["title"], u["kar_cents"]) for u in deger], f"{anahtar} ({params})"
+                else:
+                    assert db[anahtar] == deger, f"{anahtar}: {db[anahtar]} != {deger} ({params})"
+        print(f"✅ analysis_summary yerel hesapla aynı ({len(raw)} ürün)")
+
+        # Ürün listesi: başlıksız (NULL) ürünler de sayfalarda ve özette yer alır
+        cur.execute(
+            "insert into public.products (title, ean, fiyat, ham_maliyet_euro) values "
+            "(null, '999000000001', '€5.00', '€1.00'), (null, '999000000002', '€6.00', '€9.00')"
+        )
+        cur.execute(f"select {kolonlar} from public.products order by id")
+        raw = pd.DataFrame(cur.fetchall(), columns=app.DB_COLUMNS)
+        params = app.DEFAULT_PARAMS
+        priced = app.price_catalog(app.build_numeric_catalog(raw), params)
+        for filtre in (app.product_filter(), app.product_filter(arama="99900000"), app.product_filter(kar_durumu="negatif")):
+            a = app.product_list_rpc_args(params, filtre)
+            argumanlar = (a["p_reklam"], a["p_komisyon"], a["p_vergi"], json.dumps(a["p_routes"]), a["p_arama"],
+                          a["p_kar_durumu"], a["p_fiyat_min"], a["p_fiyat_max"], a["p_yuzde_min"], a["p_yuzde_max"], a["p_rotalar"])
+            cur.execute("select public.product_list_stats(%s, %s, %s, %s::jsonb, %s, %s, %s, %s, %s, %s, %s)", argumanlar)
+            db = cur.fetchone()[0]
+            mask = app.product_filter_mask(raw, priced, filtre)
+            yerel = app._list_stats(priced, mask)
+            assert (db["adet"], db["karli"]) == (yerel["adet"], yerel["karli"]), f"product_list_stats ({filtre})"
+
+            # Keyset sayfalarını uygulamanın imleç kuralıyla (NULL başlık → '') baştan sona yürü
+            gorulen, imlec = [], (None, None)
+            while True:
+                cur.execute(
+                    "select title, ean, id from public.product_page(%s, %s, %s, %s::jsonb, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                    argumanlar + imlec + (7,),
+                )
+                sayfa = cur.fetchall()
+                gorulen += [(t or "", e) for t, e, _ in sayfa]
+                if len(sayfa) < 7:
+                    break
+                imlec = (sayfa[-1][0] or "", sayfa[-1][2])
+            beklenen = raw[mask]
+            assert sorted(gorulen, key=str) == \
+                sorted(zip(beklenen["title"].fillna(""), beklenen["ean"]), key=str), f"product_page ({filtre})"
+            assert len(gorulen) == db["adet"]
+        print("✅ product_page / product_list_stats yerel listeyle aynı (başlıksız ürünler dahil)")
+    finally:
+        con.close()
+
 if __name__ == "__main__":
     print("🚀 Kaufland Database Integration Test\n")
     
     csv_ok = test_csv_data()
     db_ok = test_supabase_connection()
+    try:
+        test_analysis_sql()
+        sql_durum = "✅ YEREL HESAPLA AYNI"
+    except pytest.skip.Exception as e:
+        sql_durum = f"⏭️  ATLANDI ({e})"
+    except AssertionError as e:
+        sql_durum = f"❌ FARKLI ({e})"
+    except Exception as e:
+        sql_durum = f"❌ HATA ({e})"
     
     print("\n" + "="*50)
     print("📋 TEST SONUÇLARI:")
     print(f"📄 CSV Durumu: {'✅ HAZIR' if csv_ok else '❌ SORUNLU'}")
     print(f"🗄️  Database Durumu: {'✅ HAZIR' if db_ok else '❌ SORUNLU'}")
+    print(f"🧮 Analiz SQL: {sql_durum}")
     
     if csv_ok and db_ok:
         print("🎉 Sistem tamamen hazır! Streamlit uygulamasını başlatabilirsiniz.")
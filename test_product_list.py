@@ -0,0 +1,88 @@
+"""
+Ürün listesi sayfalama testleri: başlıksız ürünler ve veritabanı imleci (Supabase sahte)
+"""
+
+import pandas as pd
+import pytest
+
+import app
+
+
+def _urun(title, ean, fiyat="€10.00"):
+    return {"title": title, "ean": ean, "fiyat": fiyat, "ham_maliyet_euro": "€2.00"}
+
+
+KATALOG = [
+    _urun("Kalem", "111"),
+    _urun(None, "222"),
+    _urun("Harita", "333", "€1.00"),
+    _urun("", "444"),
+    _urun("Defter", "555"),
+]
+
+
+@pytest.fixture
+def yerel_katalog(monkeypatch):
+    """Yerel depo: katalog sürüm 0 olarak cache'te; sayfa ve özet cache'leri temiz."""
+    monkeypatch.setattr(app, "_supabase_enabled", lambda: False)
+    for fn in (app._catalog_state, app._local_product_list, app._load_product_page, app._load_product_list_stats):
+        fn.clear()
+    state = app._catalog_state()
+    raw = app._normalize_catalog(pd.DataFrame(KATALOG))
+    state["versions"][0] = app._make_snapshot(raw)
+    yield raw
+    for fn in (app._catalog_state, app._local_product_list, app._load_product_page, app._load_product_list_stats):
+        fn.clear()
+
+
+def test_basliksiz_urunler_sayfalarda_ve_ozette_yer_alir(yerel_katalog):
+    params = app.DEFAULT_PARAMS
+    ozet = app.load_product_list_stats(params, app.product_filter(), 0)
+    gorulen, imlec = [], None
+    while True:
+        sayfa, imlec = app.load_product_page(params, app.product_filter(), imlec, 2, 0)
+        gorulen += sayfa["ean"].tolist()
+        if imlec is None:
+            break
+    assert ozet["adet"] == len(gorulen) == len(KATALOG)
+    # Başlıksız ürünler boş başlık sayılır ve en başta gelir (analysis.sql ile aynı sıra)
+    assert gorulen[:2] == ["222", "444"]
+    assert gorulen[2:] == ["555", "333", "111"]
+
+
+def test_arama_ean_ile_de_eslesir(yerel_katalog):
+    params = app.DEFAULT_PARAMS
+    sayfa, _ = app.load_product_page(params, app.product_filter(arama="33"), None, 10, 0)
+    assert sayfa["ean"].tolist() == ["333"]
+    sayfa, _ = app.load_product_page(params, app.product_filter(arama="har"), None, 10, 0)
+    assert sayfa["ean"].tolist() == ["333"]
+
+
+class _SahteRpc:
+    def __init__(self, satirlar):
+        self.satirlar = satirlar
+        self.cagrilar = []
+
+    def rpc(self, ad, args):
+        self.cagrilar.append((ad, args))
+        satirlar = self.satirlar
+        return type("Sorgu", (), {"execute": lambda _: type("Sonuc", (), {"data": satirlar})()})()
+
+
+def test_veritabani_imleci_basliksiz_satirda_bos_baslik_tasir(monkeypatch):
+    satirlar = [{**_urun(None, "222"), "id": "a"}, {**_urun(None, "444"), "id": "b"}, {**_urun("Kalem", "111"), "id": "c"}]
+    sb = _SahteRpc(satirlar)
+    monkeypatch.setattr(app, "_supabase_enabled", lambda: True)
+    monkeypatch.setattr(app, "writes_pending", lambda: False)
+    monkeypatch.setattr(app, "_get_supabase_client", lambda: sb)
+    app._load_product_page.clear()
+    try:
+        sayfa, imlec = app.load_product_page(app.DEFAULT_PARAMS, app.product_filter(), None, 2, version=-1)
+        assert sayfa["ean"].tolist() == ["222", "444"]
+        # NULL başlık imleci None olsaydı sonraki istek ilk sayfayı tekrar getirirdi
+        assert imlec == ("db", "", "b")
+        app.load_product_page(app.DEFAULT_PARAMS, app.product_filter(), imlec, 2, version=-1)
+        _, args = sb.cagrilar[-1]
+        assert (args["p_after_title"], args["p_after_id"], args["p_limit"]) == ("", "b", 3)
+    finally:
+        app._load_product_page.clear()
@@ -0,0 +1,168 @@
+"""
+sync_products fark ve silme seçimi testleri (Supabase istemcisi sahte, çağrıları kaydeder)
+"""
+
+import threading
+
+import pandas as pd
+import pytest
+
+import app
+
+
+def _in_degerleri(liste):
+    """`postgrest_in` çıktısını PostgREST gibi çözümler: ("a","b\\"c") → ['a', 'b"c']."""
+    degerler, i = [], 1
+    while i < len(liste) - 1:
+        assert liste[i] == '"'
+        i += 1
+        deger = []
+        while liste[i] != '"':
+            if liste[i] == "\\":
+                i += 1
+            deger.append(liste[i])
+            i += 1
+        degerler.append("".join(deger))
+        i += 2  # kapanış tırnağı ve virgül
+    return degerler
+
+
+class _Sorgu:
+    def __init__(self, kayit, tablo):
+        self.kayit = kayit
+        self.islem = {"tablo": tablo}
+
+    def upsert(self, satirlar, on_conflict=None):
+        self.islem.update(tur="upsert", satirlar=satirlar, on_conflict=on_conflict)
+        return self
+
+    def insert(self, satirlar):
+        self.islem.update(tur="insert", satirlar=satirlar)
+        return self
+
+    def delete(self):
+        self.islem["tur"] = "delete"
+        return self
+
+    def filter(self, kolon, operator, deger):
+        assert operator == "in"
+        self.islem["in"] = (kolon, sorted(_in_degerleri(deger)))
+        return self
+
+    def or_(self, filtre):
+        self.islem["or"] = filtre
+        return self
+
+    def execute(self):
+        with self.kayit["lock"]:
+            self.kayit["islemler"].append(self.islem)
+        return type("Sonuc", (), {"data": self.islem.get("satirlar", [])})()
+
+
+class SahteSupabase:
+    def __init__(self):
+        self.kayit = {"lock": threading.Lock(), "islemler": []}
+
+    def table(self, ad):
+        return _Sorgu(self.kayit, ad)
+
+    def islemler(self, tur):
+        return [i for i in self.kayit["islemler"] if i["tur"] == tur]
+
+
+def katalog(*satirlar):
+    return pd.DataFrame([{"title": t, "ean": e, "fiyat": f, "desi": "1"} for t, e, f in satirlar])
+
+
+KATALOG = katalog(
+    ("Harita A", "111", "€10.00"),
+    ("Harita B", "222", "€20.00"),
+    ("Kalem", "", "€3.00"),
+)
+
+
+def test_degisiklik_yoksa_istek_gitmez():
+    sb = SahteSupabase()
+    sonuc = app.sync_products(sb, KATALOG, KATALOG)
+    assert sonuc == {"yazilan": 0, "silinen": 0, "degismeyen": 3}
+    assert sb.kayit["islemler"] == []
+
+
+def test_yalnizca_degisen_ean_satiri_upsert_edilir():
+    hedef = KATALOG.copy()
+    hedef.loc[1, "fiyat"] = "€21.50"
+    sb = SahteSupabase()
+    sonuc = app.sync_products(sb, hedef, KATALOG)
+    assert sonuc == {"yazilan": 1, "silinen": 0, "degismeyen": 2}
+    [upsert] = sb.islemler("upsert")
+    assert upsert["on_conflict"] == "ean"
+    assert [(r["ean"], r["fiyat"]) for r in upsert["satirlar"]] == [("222", "€21.50")]
+    assert sb.islemler("delete") == [] and sb.islemler("insert") == []
+
+
+def test_ean_siz_satir_title_ile_sil_ekle():
+    hedef = KATALOG.copy()
+    hedef.loc[2, "fiyat"] = "€3.50"
+    sb = SahteSupabase()
+    app.sync_products(sb, hedef, KATALOG)
+    assert sb.islemler("upsert") == []
+    [sil] = sb.islemler("delete")
+    assert sil["in"] == ("title", ["Kalem"])
+    assert sil["or"] == "ean.is.null,ean.eq."     # yalnızca EAN'sız satırlar silinir
+    [ekle] = sb.islemler("insert")
+    assert [(r["title"], r["ean"], r["fiyat"]) for r in ekle["satirlar"]] == [("Kalem", None, "€3.50")]
+
+
+def test_yalnizca_hedefte_olmayan_anahtarlar_silinir():
+    hedef = katalog(("Harita B", "222", "€20.00"))
+    sb = SahteSupabase()
+    sonuc = app.sync_products(sb, hedef, KATALOG)
+    assert sonuc == {"yazilan": 0, "silinen": 2, "degismeyen": 1}
+    silmeler = {i["in"][0]: i for i in sb.islemler("delete")}
+    assert silmeler["ean"]["in"] == ("ean", ["111"]) and "or" not in silmeler["ean"]
+    assert silmeler["title"]["in"] == ("title", ["Kalem"])
+    assert silmeler["title"]["or"] == "ean.is.null,ean.eq."
+    assert sb.islemler("upsert") == [] and sb.islemler("insert") == []
+
+
+def test_yeni_ve_yinelenen_anahtarda_son_satir_gecerli():
+    hedef = pd.concat([KATALOG, katalog(("Harita C", "333", "€5.00"), ("Harita C yeni", "333", "€6.00"))],
+                      ignore_index=True)
+    sb = SahteSupabase()
+    sonuc = app.sync_products(sb, hedef, KATALOG)
+    assert sonuc == {"yazilan": 1, "silinen": 0, "degismeyen": 3}
+    [upsert] = sb.islemler("upsert")
+    assert [(r["title"], r["fiyat"]) for r in upsert["satirlar"]] == [("Harita C yeni", "€6.00")]
+
+
+def test_istekler_parcalara_bolunur(monkeypatch):
+    monkeypatch.setattr(app, "SYNC_UPSERT_BATCH", 2)
+    monkeypatch.setattr(app, "SYNC_DELETE_BATCH", 2)
+    eski = katalog(*[(f"Ürün {i}", str(1000 + i), "€1.00") for i in range(5)])
+    hedef = katalog(*[(f"Ürün {i}", str(2000 + i), "€1.00") for i in range(5)])
+    sb = SahteSupabase()
+    sonuc = app.sync_products(sb, hedef, eski)
+    assert sonuc == {"yazilan": 5, "silinen": 5, "degismeyen": 0}
+    assert sorted(len(i["satirlar"]) for i in sb.islemler("upsert")) == [1, 2, 2]
+    silinen = sorted(e for i in sb.islemler("delete") for e in i["in"][1])
+    assert silinen == [str(1000 + i) for i in range(5)]
+    assert len(sb.islemler("delete")) == 3
+
+
+@pytest.mark.parametrize("bos", ["", "nan", "None"])
+def test_bos_ean_degerleri_title_anahtari_kullanir(bos):
+    eski = katalog(("Kalem", bos, "€3.00"))
+    sb = SahteSupabase()
+    app.sync_products(sb, eski.iloc[0:0], eski)
+    [sil] = sb.islemler("delete")
+    assert sil["in"] == ("title", ["Kalem"])
+
+
+def test_ozel_karakterli_basliklar_tek_deger_olarak_silinir():
+    baslik = 'Poster "A3", çerçeveli (2) \\ gri'
+    eski = pd.concat([KATALOG, katalog((baslik, "", "€4.00"))], ignore_index=True)
+    sb = SahteSupabase()
+    app.sync_products(sb, KATALOG, eski)
+    [sil] = sb.islemler("delete")
+    assert sil["in"] == ("title", [baslik])
+    assert sil["or"] == "ean.is.null,ean.eq."
@@ -0,0 +1,142 @@
+"""
+Yazım günlüğü testleri: çökme sonrası yeniden oynatma ve kuyruğa geri alma
+"""
+
+import json
+import time
+
+import pytest
+
+import app
+
+_GERCEK_ENSURE_WRITER = app._ensure_writer
+
+
+def _satir(title, ean, fiyat):
+    return {**{c: "" for c in app.DB_COLUMNS}, "title": title, "ean": ean, "fiyat": fiyat}
+
+
+def _islem(upsert=(), delete=()):
+    return {"full": None, "upsert": list(upsert), "delete": list(delete)}
+
+
+@pytest.fixture
+def gunluk_dizini(tmp_path, monkeypatch):
+    """Günlük göreli yolla açıldığı için testi boş bir dizinde çalıştırır."""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path / app.WRITE_JOURNAL_FILE
+
+
+@pytest.fixture
+def temiz_kuyruk(monkeypatch):
+    """Süreç genelindeki yazım kuyruğunu test için yeniden kurar (yazıcı iş parçacığı başlamaz)."""
+    monkeypatch.setattr(app, "_supabase_enabled", lambda: True)
+    monkeypatch.setattr(app, "_ensure_writer", lambda wq: None)
+    app._write_queue.clear()
+    yield
+    app._write_queue.clear()
+
+
+def test_yazildi_isaretli_islemler_yeniden_oynatilmaz(gunluk_dizini):
+    a, b, c = (_islem(upsert=[_satir(f"Ürün {i}", str(i), "€1.00")]) for i in range(3))
+    app._journal_append([{"seq": 1, "op": a}, {"seq": 2, "op": b}])
+    app._journal_append([{"seq": 1, "durum": "yazıldı"}])
+    app._journal_append([{"seq": 3, "op": c}])
+
+    bekleyen = app._journal_pending()
+    assert list(bekleyen) == [2, 3]
+    assert bekleyen[2]["op"] == b and bekleyen[3]["op"] == c
+
+
+def test_yarim_kalan_son_satir_atlanir(gunluk_dizini):
+    op = _islem(upsert=[_satir("Harita", "111", "€10.00")])
+    app._journal_append([{"seq": 1, "op": op}])
+    # Yazım sırasında çökme: son satır yarıda kesilmiş
+    satir = json.dumps({"seq": 2, "op": _islem(delete=[{"title": "Kalem", "ean": ""}])}, ensure_ascii=False)
+    with open(gunluk_dizini, "a", encoding="utf-8") as f:
+        f.write(satir[: len(satir) // 2])
+
+    assert list(app._journal_pending()) == [1]
+
+
+def test_gunluk_yoksa_bekleyen_yok(gunluk_dizini):
+    assert not gunluk_dizini.exists()
+    assert app._journal_pending() == {}
+
+
+def test_baslangicta_bekleyenler_sirayla_kuyruga_alinir(gunluk_dizini, temiz_kuyruk):
+    ops = {s: _islem(upsert=[_satir(f"Ürün {s}", str(s), "€2.00")]) for s in (4, 5, 6)}
+    app._journal_append([{"seq": s, "op": op} for s, op in ops.items()])
+    app._journal_append([{"seq": 5, "durum": "yazıldı"}])
+
+    wq = app._write_queue()
+    assert wq["seq"] == 6
+    kuyruk = [wq["queue"].get_nowait() for _ in range(wq["queue"].qsize())]
+    assert kuyruk == [(4, ops[4]), (6, ops[6])]
+    assert {s: w["durum"] for s, w in wq["writes"].items()} == {4: "bekliyor", 6: "bekliyor"}
+    assert app.writes_pending()
+    # Yeni işlemler günlükteki sıra numaralarıyla çakışmaz
+    assert app.enqueue_op(_islem(delete=[{"title": "Kalem", "ean": ""}])) == 7
+
+
+def test_yeniden_oynatilan_islemler_anahtar_bazinda_birlesir():
+    ilk = _islem(upsert=[_satir("Harita", "111", "€10.00"), _satir("Kalem", "", "€3.00")])
+    sonra = _islem(upsert=[_satir("Harita", "111", "€12.00")], delete=[{"title": "Kalem", "ean": ""}])
+
+    hedef, silinecek = app._coalesce_writes([ilk, sonra])
+    assert hedef[["title", "fiyat"]].values.tolist() == [["Harita", "€12.00"]]
+    assert silinecek["title"].tolist() == ["Kalem"]
+
+
+def test_yazim_sonrasi_gunluk_sifirlanir(gunluk_dizini, temiz_kuyruk, monkeypatch):
+    op = _islem(upsert=[_satir("Harita", "111", "€10.00")])
+    app._journal_append([{"seq": 1, "op": op}])
+    yazilan = []
+    monkeypatch.setattr(app, "WRITE_COALESCE_DELAY", 0.0)
+    monkeypatch.setattr(app, "_flush_writes", lambda batch: (yazilan.extend(batch) or {"yazilan": 1}, None))
+
+    wq = app._write_queue()
+    _GERCEK_ENSURE_WRITER(wq)
+
+    son = time.monotonic() + 5
+    while (app.writes_pending() or gunluk_dizini.stat().st_size) and time.monotonic() < son:
+        time.sleep(0.01)
+    assert yazilan == [(1, op)]
+    assert wq["writes"][1]["durum"] == "yazıldı"
+    assert not app.writes_pending()
+    assert app._journal_pending() == {}
+    assert gunluk_dizini.read_text(encoding="utf-8") == ""
+
+
+def test_beklenmeyen_hata_yaziciyi_durdurmaz(gunluk_dizini, temiz_kuyruk, monkeypatch):
+    ilk = _islem(upsert=[_satir("Harita", "111", "€10.00")])
+    sonraki = _islem(upsert=[_satir("Kalem", "222", "€3.00")])
+    yazilan = []
+
+    def _flush(batch):
+        if not yazilan and batch[0][1] is ilk:
+            raise ValueError("bozuk işlem")
+        yazilan.extend(batch)
+        return {"yazilan": len(batch)}, None
+
+    monkeypatch.setattr(app, "WRITE_COALESCE_DELAY", 0.0)
+    monkeypatch.setattr(app, "_flush_writes", _flush)
+    wq = app._write_queue()
+    _GERCEK_ENSURE_WRITER(wq)
+
+    s1 = app.enqueue_op(ilk)
+    son = time.monotonic() + 5
+    while wq["writes"][s1]["durum"] != "hata" and time.monotonic() < son:
+        time.sleep(0.01)
+    assert wq["writes"][s1]["durum"] == "hata"
+    assert wq["writes"][s1]["hata"] == "bozuk işlem"
+    assert list(wq["failed"]) == [s1]
+
+    # Yazıcı iş parçacığı hayatta; sonraki işlemler yazılır
+    s2 = app.enqueue_op(sonraki)
+    while wq["writes"][s2]["durum"] != "yazıldı" and time.monotonic() < son:
+        time.sleep(0.01)
+    assert wq["thread"].is_alive()
+    assert yazilan == [(s2, sonraki)]
+    # Başarısız işlem günlükte kalır (yeniden başlatmada tekrar denenir)
+    assert list(app._journal_pending()) == [s1]